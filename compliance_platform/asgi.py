@@ -3,6 +3,9 @@ ASGI config for compliance_platform project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve the project with an ASGI server (e.g. ``uvicorn compliance_platform.asgi:application``)
+so the notification stream can hold connections open without tying up a worker.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -46,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.PerformanceMiddleware',  # Server-Timing header and slow request log; keep first
+    'core.middleware.ReplicaRoutingMiddleware',  # Read-your-writes pinning for read replicas
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -53,6 +55,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.SystemSettingsMiddleware',  # Refreshes cached SystemSetting values
     'core.middleware.AuditLogMiddleware',  # Our custom audit logging middleware
 ]
 
@@ -60,7 +63,8 @@ ROOT_URLCONF = 'compliance_platform.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates with render timing for the Server-Timing header (core/performance.py)
+        'BACKEND': 'core.performance.InstrumentedDjangoTemplates',
         'DIRS': [
             os.path.join(BASE_DIR, 'core/templates'),
         ],
@@ -88,6 +92,22 @@ DATABASES = {
     }
 }
 
+# Read replicas (core/db_routing.py). Dashboards, exports and the database search
+# fallback read from a random alias in DATABASE_REPLICAS; everything else uses
+# 'default'. To try it locally, list copies of db.sqlite3 in the environment:
+#   DATABASE_REPLICA_FILES=replica1.sqlite3,replica2.sqlite3
+# For PostgreSQL, add the replicas to DATABASES with the same 'TEST' setting.
+for number, replica_file in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_FILES', '').split(',')), start=1):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / replica_file.strip(),
+        # Tests read the test database through the replica aliases
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['core.db_routing.ReplicaRouter']
+REPLICA_PIN_SECONDS = 10  # reads stay on the primary this long after a user writes
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -144,3 +164,80 @@ LOGOUT_REDIRECT_URL = 'login'
 ELASTICSEARCH_HOST = 'http://localhost:9200'
 ELASTICSEARCH_USERNAME = None  # Set if authentication is required
 ELASTICSEARCH_PASSWORD = None  # Set if authentication is required
+
+# Search backends, tried in order. Unavailable backends are skipped and a failing
+# backend falls through to the next one (see core/search_backends.py).
+SEARCH_BACKENDS = [
+    'core.search_backends.ElasticsearchBackend',
+    'core.search_backends.SQLiteFTSBackend',  # Only used when the database is SQLite
+    'core.search_backends.DatabaseBackend',
+]
+SEARCH_RESULT_LIMIT = 100
+SEARCH_ELASTICSEARCH_RETRY_INTERVAL = 30  # seconds Elasticsearch is skipped after it failed
+
+# Search index outbox (core/indexing.py, drained by process_search_outbox)
+SEARCH_OUTBOX_MAX_ATTEMPTS = 5  # Entries rejected this many times are dead-lettered
+SEARCH_OUTBOX_RETRY_DELAY = 30  # seconds before a rejected entry is retried; doubles per attempt
+SEARCH_OUTBOX_CLAIM_SECONDS = 300  # Entries claimed by a worker that died are retried after this
+
+# Per-process search result cache (core/search_cache.py). Entries are invalidated
+# by an index generation counter kept in the database, shared by all processes.
+SEARCH_CACHE_MAX_ENTRIES = 1000  # 0 disables the cache
+SEARCH_CACHE_TTL = 300  # seconds
+
+# Notification stream (core/notifications.py); served over ASGI
+NOTIFICATION_STREAM_HEARTBEAT = 15  # seconds between keep-alive comments
+NOTIFICATION_STREAM_RESYNC = 60  # seconds between database catch-up queries per stream
+NOTIFICATION_FAN_OUT_CHUNK_SIZE = 1000  # notifications per bulk insert when notifying departments
+NOTIFICATION_RETENTION_DAYS = 90  # read notifications older than this are removed by prune_notifications
+
+# Audit log writer
+# 'buffered' queues audit entries and writes them in batches off the request path.
+# 'sync' writes each entry inside the request; use it when strict durability is required.
+AUDIT_LOG_WRITER = 'buffered'
+AUDIT_LOG_BATCH_SIZE = 100  # Flush once this many entries are queued
+AUDIT_LOG_FLUSH_INTERVAL = 2.0  # Flush at least this often (seconds)
+AUDIT_LOG_MAX_QUEUE_SIZE = 10000  # Entries beyond this are written synchronously
+
+# Audit archive (core/audit_archive.py): archive_audit_logs moves older entries into
+# compressed, read-only NDJSON segments; exports read them alongside the database
+AUDIT_ARCHIVE_DIR = BASE_DIR / 'audit_archive'
+AUDIT_ARCHIVE_HORIZON_DAYS = 180
+AUDIT_ARCHIVE_SEGMENT_SIZE = 20000  # entries per segment file
+
+# Bulk regulation import (core/bulk_import.py, import_regulations command)
+IMPORT_CHUNK_SIZE = 1000  # rows validated and saved per transaction
+
+# Largest batch accepted by the compliance status submission endpoint (core/compliance_submissions.py)
+COMPLIANCE_SUBMISSION_MAX_ITEMS = 5000
+
+# Cached SystemSetting values (core/system_settings.py). Changes reach other workers
+# at their next request through a version counter in the database; code running
+# outside a request reloads them after this many seconds.
+SYSTEM_SETTINGS_MAX_AGE = 60
+
+# Per-request performance instrumentation (core/performance.py). Responses to admins get a
+# Server-Timing header with their SQL, Elasticsearch, template and audit log time.
+# Slower requests are logged as JSON to the 'core.performance.slow_requests' logger.
+PERFORMANCE_INSTRUMENTATION = True
+SERVER_TIMING_PUBLIC = False  # also send the Server-Timing header to non-admin users
+SLOW_REQUEST_THRESHOLD_MS = 1000
+SLOW_REQUEST_TOP_SQL = 5  # statements with the most time included in a slow log entry
+SLOW_REQUEST_EXPLAIN = True  # add the EXPLAIN plan of each of those statements
+
+# Prometheus metrics (core/metrics.py), served at /metrics to admins and to scrapers
+# that send METRICS_TOKEN as a bearer token (Authorization: Bearer <token>).
+# Each worker process writes its counters to a file in METRICS_DIR, which all workers
+# must share; clear it on deploy, before the workers start.
+METRICS_DIR = BASE_DIR / 'metrics'
+METRICS_FLUSH_INTERVAL = 5  # seconds between writes of a process's metrics file
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+# Addresses allowed without a token. Leave empty behind a reverse proxy: every
+# request then comes from the proxy's address.
+METRICS_ALLOWED_IPS = []
+
+# Runs the tests with a temporary METRICS_DIR
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
+# Prefix of the references given to new regulations saved without one (core/references.py)
+REGULATION_REFERENCE_PREFIX = 'REG'
@@ -34,11 +34,12 @@ urlpatterns = [
     path('login/', auth_views.LoginView.as_view(template_name='login.html'), name='login'),
     path('logout/', auth_views.LogoutView.as_view(next_page='login', http_method_names=['post']), name='logout'),
     
-    # Admin URLs
-    path('admin/', admin.site.urls),
+    # Admin URLs - custom pages must come before the admin site's catch-all
     path('admin/dashboard/', core_views.admin_dashboard, name='admin_dashboard'),
+    path('admin/search-cache/', core_views.search_cache_stats, name='search_cache_stats'),
     path('admin/export/audit-logs/', core_views.export_audit_logs, name='export_audit_logs'),
     path('admin/export/regulations/', core_views.export_regulations, name='export_regulations'),
+    path('admin/', admin.site.urls),
     
     # Compliance portal
     path('compliance/', core_views.compliance_dashboard, name='compliance_dashboard'),
@@ -47,11 +48,17 @@ urlpatterns = [
     path('compliance/regulations/create/', core_views.create_regulation, name='create_regulation'),
     path('compliance/regulations/<int:regulation_id>/edit/', core_views.edit_regulation, name='edit_regulation'),
     path('compliance/regulations/<int:regulation_id>/delete/', core_views.delete_regulation, name='delete_regulation'),
+    path('compliance/departments/<int:department_id>/statuses/', core_views.submit_compliance_statuses_view, name='submit_compliance_statuses'),
     
     # Notification endpoints
     path('get_notifications/', core_views.get_notifications, name='get_notifications'),
+    path('notifications/stream/', core_views.notification_stream, name='notification_stream'),
+    path('notifications/mark-read/', core_views.mark_notifications_read_view, name='mark_notifications_read'),
     path('mark_notification_read/<int:notification_id>/', core_views.mark_notification_read, name='mark_notification_read'),
     
+    # Prometheus metrics of all worker processes
+    path('metrics', core_views.metrics_view, name='metrics'),
+    
     # Root URL - redirect based on role
     path('', core_views.login_redirect_view, name='home'),
 ]
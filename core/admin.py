@@ -1,7 +1,12 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.core.exceptions import PermissionDenied
+from django.template.response import TemplateResponse
+from django.urls import path
 from import_export.admin import ImportExportModelAdmin
 from django.utils.translation import gettext_lazy as _
+from .bulk_import import import_regulations
+from .forms import RegulationImportForm
 from .models import (
     User, Department, Regulation, Article, 
     ComplianceStatus, AuditLog, Notification, 
@@ -49,6 +54,42 @@ class RegulationAdmin(ImportExportModelAdmin):
     readonly_fields = ('date_created', 'last_updated')
     inlines = [ArticleInline]
     filter_horizontal = ('assigned_departments',)
+    # Adds a "Bulk import" button; django-import-export adds its own buttons around this template
+    change_list_template = 'admin/core/regulation/change_list.html'
+    
+    def get_urls(self):
+        urls = [
+            path('bulk-import/', self.admin_site.admin_view(self.bulk_import_view), name='core_regulation_bulk_import'),
+        ]
+        return urls + super().get_urls()
+    
+    def bulk_import_view(self, request):
+        """Import large regulation files with core.bulk_import instead of row by row."""
+        if not (self.has_add_permission(request) and self.has_change_permission(request)):
+            raise PermissionDenied
+        result = None
+        form = RegulationImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            try:
+                result = import_regulations(form.cleaned_data['import_file'], form.file_format, user=request.user)
+            except ValueError as e:
+                form.add_error('import_file', str(e))
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Bulk import regulations',
+            'form': form,
+            'result': result,
+            # Long error lists are cut short on the page
+            'errors': result.errors[:200] if result else [],
+        }
+        return TemplateResponse(request, 'admin/core/regulation/bulk_import.html', context)
+
+class ArticleAdmin(admin.ModelAdmin):
+    list_display = ('reference', 'title', 'regulation', 'type', 'last_updated')
+    list_filter = ('type',)
+    search_fields = ('title', 'content', 'regulation__reference')
+    list_select_related = ('regulation',)
 
 class ComplianceStatusAdmin(admin.ModelAdmin):
     list_display = ('article', 'department', 'status', 'created_by', 'created_at')
@@ -57,10 +98,16 @@ class ComplianceStatusAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at', 'updated_at')
 
 class AuditLogAdmin(admin.ModelAdmin):
-    list_display = ('user', 'action_type', 'timestamp', 'ip_address')
-    list_filter = ('action_type', 'timestamp')
-    search_fields = ('user__username', 'action_details')
-    readonly_fields = ('user', 'action_type', 'action_details', 'timestamp', 'ip_address')
+    list_display = ('user', 'action_type', 'method', 'url_name', 'target_model', 'target_id', 'timestamp', 'ip_address')
+    list_filter = ('action_type', 'method', 'target_model', 'timestamp')
+    search_fields = ('user__username', 'action_details', 'url_name')
+    readonly_fields = (
+        'user', 'action_type', 'action_details', 'timestamp', 'ip_address',
+        'url_name', 'method', 'target_model', 'target_id', 'payload',
+    )
+    list_select_related = ('user',)
+    # Skip the unfiltered COUNT(*) on every changelist page
+    show_full_result_count = False
     
     # Disable add/edit/delete functionality
     def has_add_permission(self, request):
@@ -91,6 +138,7 @@ class SystemSettingAdmin(admin.ModelAdmin):
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(Department, DepartmentAdmin)
 admin.site.register(Regulation, RegulationAdmin)
+admin.site.register(Article, ArticleAdmin)
 admin.site.register(ComplianceStatus, ComplianceStatusAdmin)
 admin.site.register(AuditLog, AuditLogAdmin)
 admin.site.register(Notification, NotificationAdmin)
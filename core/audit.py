@@ -0,0 +1,182 @@
+"""
+Audit log writers.
+
+AuditLogMiddleware hands every entry to the writer returned by
+``get_audit_writer()``. The ``AUDIT_LOG_WRITER`` setting selects the mode:
+
+* ``'buffered'`` - entries are queued in-process and written with
+  ``bulk_create`` by a background thread once ``AUDIT_LOG_BATCH_SIZE``
+  entries are waiting or ``AUDIT_LOG_FLUSH_INTERVAL`` seconds have passed.
+  The queue is drained when the worker process exits.
+* ``'sync'`` - every entry is saved immediately, inside the request. Use this
+  when strict durability is required.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction
+from django.dispatch import receiver
+
+from .models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+
+class SyncAuditLogWriter:
+    """Writes each audit entry to the database as soon as it is recorded."""
+
+    def write(self, entry):
+        entry.save()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class BufferedAuditLogWriter:
+    """Queues audit entries and writes them in batches from a background thread."""
+
+    def __init__(self, batch_size=100, flush_interval=2.0, max_queue_size=10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, entry):
+        if self._stopped.is_set():
+            # Late entries during shutdown are written straight away
+            self._write_batch([entry])
+            return
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            # Never drop audit records - apply back-pressure to this request instead
+            self._write_batch([entry])
+            return
+        if self.queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """Write every queued entry now."""
+        with self._flush_lock:
+            while True:
+                batch = []
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    return
+                self._write_batch(batch)
+
+    def close(self, timeout=10):
+        """Stop the background thread and drain the queue."""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+        # Anything the thread did not get to is written from the calling thread
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _write_batch(self, batch):
+        try:
+            try:
+                # A savepoint, so a failed insert never breaks a surrounding transaction
+                with transaction.atomic():
+                    AuditLog.objects.bulk_create(batch)
+            except Exception:
+                # One bad entry, e.g. for a user deleted meanwhile, must not lose the rest of the batch
+                logger.warning('Failed to write %d audit log entries at once; writing them one by one', len(batch))
+                self._write_each(batch)
+        finally:
+            if threading.current_thread() is self._thread:
+                close_old_connections()
+
+    def _write_each(self, batch):
+        for entry in batch:
+            try:
+                with transaction.atomic():
+                    AuditLog.objects.bulk_create([entry])
+            except Exception:
+                logger.exception('Dropped audit log entry: %s', entry.action_details)
+
+
+def audit_target(resolver_match):
+    """
+    Return (target_model, target_id) for the object a resolved URL acts on.
+
+    Admin object pages are named '<app>_<model>_<action>' and take object_id;
+    the portal's URLs take '<model>_id'. Returns ('', None) for other URLs.
+    """
+    kwargs = resolver_match.kwargs
+    if resolver_match.namespace == 'admin' and 'object_id' in kwargs:
+        parts = (resolver_match.url_name or '').split('_')
+        model, value = (parts[1] if len(parts) >= 3 else ''), kwargs['object_id']
+    else:
+        model, value = next(((key[:-3], value) for key, value in kwargs.items() if key.endswith('_id')), ('', None))
+    try:
+        return model, int(value)
+    except (TypeError, ValueError):
+        return model, None
+
+
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+
+def get_audit_writer():
+    """Return the audit writer for this process, creating it on first use."""
+    global _writer, _writer_pid
+    # Threads do not survive fork(), so each worker process gets its own writer
+    if _writer is None or _writer_pid != os.getpid():
+        with _writer_lock:
+            if _writer is None or _writer_pid != os.getpid():
+                _writer = _create_writer()
+                _writer_pid = os.getpid()
+    return _writer
+
+
+def _create_writer():
+    mode = getattr(settings, 'AUDIT_LOG_WRITER', 'sync')
+    if mode == 'sync':
+        return SyncAuditLogWriter()
+    if mode == 'buffered':
+        return BufferedAuditLogWriter(
+            batch_size=getattr(settings, 'AUDIT_LOG_BATCH_SIZE', 100),
+            flush_interval=getattr(settings, 'AUDIT_LOG_FLUSH_INTERVAL', 2.0),
+            max_queue_size=getattr(settings, 'AUDIT_LOG_MAX_QUEUE_SIZE', 10000),
+        )
+    raise ValueError(f"Unknown AUDIT_LOG_WRITER mode: {mode!r}")
+
+
+@receiver(setting_changed)
+def reset_audit_writer(setting, **kwargs):
+    """Drain and drop the writer when an AUDIT_LOG_* setting is overridden, e.g. with override_settings."""
+    global _writer
+    if not setting.startswith('AUDIT_LOG_'):
+        return
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close()
+        _writer = None
@@ -0,0 +1,232 @@
+"""
+Cold storage for old audit log entries.
+
+The archive_audit_logs command moves AuditLog rows older than
+AUDIT_ARCHIVE_HORIZON_DAYS out of the database into segment files in
+AUDIT_ARCHIVE_DIR. A segment holds up to AUDIT_ARCHIVE_SEGMENT_SIZE entries,
+in id order, as gzipped NDJSON:
+
+    audit-<first id>-<last id>.ndjson.gz
+    audit-<first id>-<last id>.index.json
+
+The index records the segment's time range, user ids, action types and
+target models.
+Segments are written once and never modified. Readers load only the small
+index files and open a segment only when its index can match the query.
+
+iter_audit_records() queries the database and the matching segments together,
+newest first.
+"""
+import gzip
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .models import AuditLog
+
+AUDIT_ARCHIVE_DIR = Path(getattr(settings, 'AUDIT_ARCHIVE_DIR', Path(settings.BASE_DIR) / 'audit_archive'))
+AUDIT_ARCHIVE_HORIZON_DAYS = getattr(settings, 'AUDIT_ARCHIVE_HORIZON_DAYS', 180)
+AUDIT_ARCHIVE_SEGMENT_SIZE = getattr(settings, 'AUDIT_ARCHIVE_SEGMENT_SIZE', 20000)
+
+# AuditLog columns stored for every archived entry, plus the username at archive time
+ARCHIVE_FIELDS = [
+    'id', 'user_id', 'user__username', 'action_type', 'action_details', 'timestamp', 'ip_address',
+    'url_name', 'method', 'target_model', 'target_id', 'payload',
+]
+
+
+@dataclass(frozen=True)
+class AuditQuery:
+    """Filters shared by the database query and the archive reader. Bounds are datetimes; end is exclusive."""
+    start: datetime = None
+    end: datetime = None
+    user_id: int = None
+    action_type: str = None
+    target_model: str = None
+    target_id: int = None
+
+    def filter_queryset(self, logs):
+        if self.start:
+            logs = logs.filter(timestamp__gte=self.start)
+        if self.end:
+            logs = logs.filter(timestamp__lt=self.end)
+        if self.user_id:
+            logs = logs.filter(user_id=self.user_id)
+        if self.action_type:
+            logs = logs.filter(action_type=self.action_type)
+        if self.target_model:
+            logs = logs.filter(target_model=self.target_model)
+        if self.target_id:
+            logs = logs.filter(target_id=self.target_id)
+        return logs
+
+    def matches_segment(self, index):
+        """Return False if the segment index rules out every entry in the segment."""
+        if self.start and datetime.fromisoformat(index['end']) < self.start:
+            return False
+        if self.end and datetime.fromisoformat(index['start']) >= self.end:
+            return False
+        if self.user_id and self.user_id not in index['user_ids']:
+            return False
+        if self.action_type and self.action_type not in index['action_types']:
+            return False
+        # Segments written before target columns existed have no target_models
+        if self.target_model and self.target_model not in index.get('target_models', [self.target_model]):
+            return False
+        return True
+
+    def matches_record(self, record):
+        if self.start and record['timestamp'] < self.start:
+            return False
+        if self.end and record['timestamp'] >= self.end:
+            return False
+        if self.user_id and record['user_id'] != self.user_id:
+            return False
+        if self.action_type and record['action_type'] != self.action_type:
+            return False
+        if self.target_model and record.get('target_model') != self.target_model:
+            return False
+        if self.target_id and record.get('target_id') != self.target_id:
+            return False
+        return True
+
+
+def segment_name(first_id, last_id):
+    return f'audit-{first_id:012d}-{last_id:012d}'
+
+
+def list_segment_indexes(directory=None):
+    """Load every segment index in the archive, oldest segment first."""
+    directory = Path(directory or AUDIT_ARCHIVE_DIR)
+    if not directory.exists():
+        return []
+    indexes = []
+    for path in sorted(directory.glob('audit-*.index.json')):
+        with open(path, encoding='utf-8') as index_file:
+            indexes.append(json.load(index_file))
+    return indexes
+
+
+def read_segment(index, directory=None):
+    """Yield the entries of a segment in id order, with timestamps parsed."""
+    path = Path(directory or AUDIT_ARCHIVE_DIR) / index['file']
+    with gzip.open(path, 'rt', encoding='utf-8') as segment:
+        for line in segment:
+            record = json.loads(line)
+            record['timestamp'] = datetime.fromisoformat(record['timestamp'])
+            yield record
+
+
+def iter_archived_records(query, directory=None, newest_first=True):
+    """Yield archived entries matching the query, opening only the segments whose index can match."""
+    indexes = [index for index in list_segment_indexes(directory) if query.matches_segment(index)]
+    if newest_first:
+        indexes.reverse()
+    for index in indexes:
+        records = (record for record in read_segment(index, directory) if query.matches_record(record))
+        if newest_first:
+            # Segments are bounded by AUDIT_ARCHIVE_SEGMENT_SIZE, so one fits in memory
+            records = reversed(list(records))
+        yield from records
+
+
+def iter_audit_records(query, include_archive=True, chunk_size=2000):
+    """
+    Yield audit entries matching the query from the database and then the archive, newest first.
+
+    Entries are dicts with the ARCHIVE_FIELDS keys.
+    """
+    logs = query.filter_queryset(AuditLog.objects.all()).order_by('-timestamp', '-id')
+    yield from logs.values(*ARCHIVE_FIELDS).iterator(chunk_size=chunk_size)
+    if include_archive:
+        yield from iter_archived_records(query)
+
+
+def _write_immutable(path, data):
+    # Write to a temporary file and rename it into place, so readers never see a partial segment
+    temporary = path.with_name(path.name + '.tmp')
+    with open(temporary, 'wb') as output:
+        output.write(data)
+        output.flush()
+        os.fsync(output.fileno())
+    os.replace(temporary, path)
+    os.chmod(path, 0o444)
+
+
+def write_segment(records, directory=None):
+    """Write entries (in id order) as a new segment and its index. Returns the index."""
+    directory = Path(directory or AUDIT_ARCHIVE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    name = segment_name(records[0]['id'], records[-1]['id'])
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    data = gzip.compress(''.join(encoder.encode(record) + '\n' for record in records).encode('utf-8'))
+    timestamps = [record['timestamp'] for record in records]
+    index = {
+        'file': f'{name}.ndjson.gz',
+        'count': len(records),
+        'first_id': records[0]['id'],
+        'last_id': records[-1]['id'],
+        'start': min(timestamps).isoformat(),
+        'end': max(timestamps).isoformat(),
+        'user_ids': sorted({record['user_id'] for record in records if record['user_id'] is not None}),
+        'action_types': sorted({record['action_type'] for record in records}),
+        'target_models': sorted({record['target_model'] for record in records if record['target_model']}),
+        'sha256': hashlib.sha256(data).hexdigest(),
+    }
+    _write_immutable(directory / index['file'], data)
+    # The index is written last: a segment without an index is ignored and rewritten
+    _write_immutable(directory / f'{name}.index.json', json.dumps(index, indent=2).encode('utf-8'))
+    return index
+
+
+def archived_ids(indexes, first_id, last_id, directory=None):
+    """Return the ids stored in the segments whose id range overlaps [first_id, last_id]."""
+    ids = set()
+    for index in indexes:
+        if index['first_id'] <= last_id and index['last_id'] >= first_id:
+            ids.update(record['id'] for record in read_segment(index, directory))
+    return ids
+
+
+def _delete_entries(ids, chunk_size=500):
+    # Chunked to stay under the database's limit on query parameters
+    deleted = 0
+    with transaction.atomic():
+        for start in range(0, len(ids), chunk_size):
+            deleted += AuditLog.objects.filter(id__in=ids[start:start + chunk_size]).delete()[0]
+    return deleted
+
+
+def archive_audit_logs(cutoff, segment_size=AUDIT_ARCHIVE_SEGMENT_SIZE, directory=None, progress=None):
+    """
+    Move entries older than cutoff into segments. Returns (entries archived, segments written).
+
+    Each segment is written and synced before its rows are deleted, and only
+    the ids written to a segment are deleted. If a run is interrupted after a
+    segment was written, the next run finds its rows still in the database:
+    rows that are in the segment are only deleted, and any other expired rows
+    in the same id range, e.g. under a later cutoff, go into a new segment.
+    """
+    directory = Path(directory or AUDIT_ARCHIVE_DIR)
+    indexes = list_segment_indexes(directory)
+    expired = AuditLog.objects.filter(timestamp__lt=cutoff).order_by('id')
+    archived = segments = 0
+    while True:
+        records = list(expired.values(*ARCHIVE_FIELDS)[:segment_size])
+        if not records:
+            return archived, segments
+        already_archived = archived_ids(indexes, records[0]['id'], records[-1]['id'], directory)
+        new_records = [record for record in records if record['id'] not in already_archived]
+        if new_records:
+            indexes.append(write_segment(new_records, directory))
+            segments += 1
+        archived += _delete_entries([record['id'] for record in records])
+        if progress:
+            progress(archived, segments)
@@ -0,0 +1,281 @@
+"""
+View benchmarks with query-count and latency budgets.
+
+The benchmark_views command creates a throwaway test database and fills it
+with core.synthetic_data at a small scale. It drives every case in CASES
+through the test client, then grows the data to a large scale and runs the
+cases again. Each measurement records:
+
+    queries   SQL queries issued by the request
+    sql_ms    total time of those queries
+    wall_ms   time to produce the whole response, streamed content included
+    peak_kb   peak Python memory allocated while handling the request; streamed
+              chunks are dropped as they are read, so only the view's own
+              buffering counts
+
+A case fails if:
+  - its response is not 200;
+  - it issues more queries at the large scale than at the small one, beyond
+    the one query per rows_per_query rows its budget allows (batched
+    exports); or
+  - a large-scale measurement exceeds its budget in BUDGET_FILE.
+
+Both scales are stored in the budget file, so the budgets always refer to the
+same data size. Search runs on the database backends: Elasticsearch is
+switched off for the run. Audit entries are written synchronously, so their
+INSERT is part of every measurement.
+"""
+import json
+import math
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from . import elasticsearch_config
+from .models import Article, AuditLog, ComplianceStatus, Department, Notification, Regulation, User
+from .notifications import recount_unread_notifications
+from .performance import QueryTimer, RequestTimings
+from .search_cache import search_result_cache
+from .synthetic_data import LoadDataPlan, generate
+
+BUDGET_FILE = Path(__file__).with_name('benchmark_budgets.json')
+
+# Measured values are multiplied by these when budgets are rewritten, so
+# normal run-to-run noise does not fail the benchmark. Query counts get none.
+BUDGET_HEADROOM = {'sql_ms': 3, 'wall_ms': 3, 'peak_kb': 2}
+# Smallest budgets written, since timings of a few milliseconds are mostly noise
+BUDGET_FLOOR = {'sql_ms': 20, 'wall_ms': 100, 'peak_kb': 512}
+MEASUREMENTS = ('queries', 'sql_ms', 'wall_ms', 'peak_kb')
+
+
+@dataclass(frozen=True)
+class Case:
+    name: str
+    # 'admin' or 'compliance'
+    user: str
+    url_name: str
+    query: str = ''
+    # Model whose row count the case's work grows with, for batched views
+    rows_model: type = Regulation
+
+    def url(self, fixtures):
+        kwargs = {'regulation_id': fixtures['regulation_id']} if self.url_name == 'compliance_regulation_detail' else {}
+        # The query may refer to fixture ids, e.g. {department_id}
+        query = self.query.format(**fixtures)
+        return reverse(self.url_name, kwargs=kwargs) + (f'?{query}' if query else '')
+
+
+CASES = [
+    Case('admin_dashboard', 'admin', 'admin_dashboard'),
+    Case('compliance_regulations', 'compliance', 'compliance_regulations'),
+    Case(
+        'compliance_regulations_filtered', 'compliance', 'compliance_regulations',
+        'status=fully_approved&department={department_id}&issue_date_from={issue_date_from}',
+    ),
+    # The listing's search box is the title filter
+    Case('compliance_regulations_search', 'compliance', 'compliance_regulations', 'title=capital'),
+    Case('compliance_regulation_detail', 'compliance', 'compliance_regulation_detail'),
+    Case('export_regulations_csv', 'admin', 'export_regulations'),
+    Case('export_regulations_articles', 'admin', 'export_regulations', 'format=articles'),
+    Case('export_audit_logs', 'admin', 'export_audit_logs', 'archive=0', rows_model=AuditLog),
+    Case('get_notifications', 'admin', 'get_notifications', rows_model=Notification),
+]
+
+
+@dataclass
+class Measurement:
+    queries: int
+    sql_ms: float
+    wall_ms: float
+    peak_kb: float
+    status_code: int
+    rows: int
+
+
+def load_budgets(path=BUDGET_FILE):
+    with open(path, encoding='utf-8') as budget_file:
+        return json.load(budget_file)
+
+
+def write_budgets(budgets, path=BUDGET_FILE):
+    with open(path, 'w', encoding='utf-8') as budget_file:
+        json.dump(budgets, budget_file, indent=2, sort_keys=True)
+        budget_file.write('\n')
+
+
+def create_fixtures():
+    """Create the benchmark users and the admin's unread notifications. Returns ids used by the cases."""
+    admin = User.objects.create_superuser('benchmark_admin', 'benchmark_admin@example.com', None, role='admin')
+    compliance = User.objects.create_user('benchmark_compliance', role='compliance_maker')
+    departments = list(Department.objects.order_by('id')[:3])
+    compliance.departments.set(departments)
+    return {
+        'admin': admin,
+        'compliance': compliance,
+        'regulation_id': Regulation.objects.order_by('id').first().id,
+        'department_id': departments[0].id,
+        # Generated issue dates go back up to four years
+        'issue_date_from': (date.today() - timedelta(days=2 * 365)).isoformat(),
+    }
+
+
+def add_notifications(user, count):
+    regulation_ids = list(Regulation.objects.values_list('id', flat=True)[:count])
+    Notification.objects.bulk_create(
+        [
+            Notification(
+                recipient=user, title=f'Benchmark notification {number}', message='Action is required.',
+                related_regulation_id=regulation_ids[number % len(regulation_ids)] if regulation_ids else None,
+            )
+            for number in range(count)
+        ],
+        batch_size=1000,
+    )
+    recount_unread_notifications()
+
+
+# Scale key -> model counted towards it
+SCALE_MODELS = {
+    'departments': Department,
+    'users': User,
+    'regulations': Regulation,
+    'articles': Article,
+    'statuses': ComplianceStatus,
+    'audit_logs': AuditLog,
+}
+
+
+def grow(seed, scale):
+    """Generate data until the database holds roughly the counts in scale."""
+    counts = {key: max(0, scale[key] - model.objects.count()) for key, model in SCALE_MODELS.items()}
+    generate(LoadDataPlan(seed=seed, chunk_size=2000, **counts))
+
+
+def consume(response):
+    """Read a response to the end, streamed content included, without keeping the chunks."""
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+
+
+def measure(client, url, rows):
+    """Request url once, consuming streamed content, and return a Measurement."""
+    search_result_cache.clear()
+    # perf_counter timing per query; the query log rounds to whole milliseconds
+    timings = RequestTimings()
+    with connection.execute_wrapper(QueryTimer(timings, connection.alias)):
+        started = time.perf_counter()
+        response = client.get(url)
+        consume(response)
+        wall_ms = (time.perf_counter() - started) * 1000
+
+    # A second request measures memory; tracing slows Python down too much to time the first
+    search_result_cache.clear()
+    tracemalloc.start()
+    try:
+        response = client.get(url)
+        consume(response)
+        peak_kb = tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+    return Measurement(
+        queries=timings.counts['sql'], sql_ms=round(timings.durations['sql'] * 1000, 2), wall_ms=round(wall_ms, 2),
+        peak_kb=round(peak_kb, 1), status_code=response.status_code, rows=rows,
+    )
+
+
+def run_cases(fixtures, cases=CASES):
+    clients = {}
+    for role in ('admin', 'compliance'):
+        clients[role] = Client()
+        clients[role].force_login(fixtures[role])
+    results = {}
+    for case in cases:
+        client = clients[case.user]
+        url = case.url(fixtures)
+        # Warm up URL resolution, templates, sessions and the cached settings
+        client.get(url)
+        results[case.name] = measure(client, url, case.rows_model.objects.count())
+    return results
+
+
+def run_benchmarks(budgets, seed=1, cases=CASES, progress=None):
+    """
+    Run every case at the small and the large scale of budgets['scales'].
+
+    Returns {'small': {case: Measurement}, 'large': {case: Measurement}}.
+    Must run against a database that can be thrown away.
+    """
+    es = elasticsearch_config.es
+    elasticsearch_config.es = None
+    try:
+        # No background writer thread: its entries would race the generator for audit log ids
+        with override_settings(AUDIT_LOG_WRITER='sync'):
+            results = {}
+            fixtures = None
+            for scale_name in ('small', 'large'):
+                scale = budgets['scales'][scale_name]
+                if progress:
+                    progress(f'Generating the {scale_name} data set: {scale}')
+                grow(seed if scale_name == 'small' else seed + 1, scale)
+                if fixtures is None:
+                    fixtures = create_fixtures()
+                add_notifications(fixtures['admin'], scale['notifications'] - Notification.objects.count())
+                if progress:
+                    progress(f'Running {len(cases)} cases at the {scale_name} scale')
+                results[scale_name] = run_cases(fixtures, cases)
+            return results
+    finally:
+        elasticsearch_config.es = es
+
+
+def check_results(results, budgets):
+    """Return a list of failure messages; empty when every case is within budget."""
+    failures = []
+    for name, large in results['large'].items():
+        small = results['small'][name]
+        budget = budgets['views'].get(name)
+        for measurement in (small, large):
+            if measurement.status_code != 200:
+                failures.append(f'{name}: returned {measurement.status_code}')
+        rows_per_query = (budget or {}).get('rows_per_query')
+        allowed_growth = (
+            math.ceil(large.rows / rows_per_query) - math.ceil(small.rows / rows_per_query)
+            if rows_per_query else 0
+        )
+        if large.queries - small.queries > allowed_growth:
+            failures.append(
+                f'{name}: query count grows with the data, {small.queries} queries for {small.rows} rows '
+                f'but {large.queries} for {large.rows} rows'
+            )
+        if budget is None:
+            failures.append(f'{name}: no budget in {BUDGET_FILE.name}')
+            continue
+        for key in MEASUREMENTS:
+            limit = budget.get(f'max_{key}')
+            if limit is not None and getattr(large, key) > limit:
+                failures.append(f'{name}: {key} {getattr(large, key)} is over its budget of {limit}')
+    return failures
+
+
+def budgets_from_results(results, budgets):
+    """Budgets that the given results meet with BUDGET_HEADROOM to spare."""
+    views = {}
+    for name, large in results['large'].items():
+        view = dict(budgets['views'].get(name, {}))
+        view['max_queries'] = large.queries
+        for key, factor in BUDGET_HEADROOM.items():
+            view[f'max_{key}'] = max(math.ceil(getattr(large, key) * factor), BUDGET_FLOOR[key])
+        views[name] = view
+    return {**budgets, 'views': views}
+
+
+def results_as_dict(results):
+    return {scale: {name: asdict(measurement) for name, measurement in cases.items()} for scale, cases in results.items()}
@@ -0,0 +1,343 @@
+"""
+Bulk import of regulations and their articles.
+
+Files are read as a stream of rows, one row per article. The regulation
+columns are repeated on each of its article rows; a row without article
+columns only creates the regulation.
+
+    reference, name, description, type, status, issue_date, effective_date,
+    expiry_date, departments (department names separated by ';'),
+    article_reference, article_title, article_content, article_type
+
+Supported formats are CSV (with a header row), NDJSON (one object per line),
+JSON (an array of objects, read into memory) and XLSX (first sheet, header
+row; needs openpyxl). JSON objects may instead list their articles under
+"articles", with the article columns named without the prefix.
+
+Rows are validated and written IMPORT_CHUNK_SIZE at a time, each chunk in one
+transaction with bulk_create. bulk_create sends no model signals, so nothing
+is indexed row by row: the new regulations are indexed with bulk requests
+once the whole file has been imported. A row that fails validation is
+reported with its row number and the rest of the file is still imported.
+Rows for a regulation that already exists add articles to it; its own
+columns are left unchanged, and it is queued in the search index outbox in
+the chunk's transaction so its document picks up the new articles.
+"""
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+
+from . import elasticsearch_config
+from .indexing import IndexingResult, enqueue_regulation_changes, index_batch, regulations_for_indexing
+from .models import Article, Department, Regulation
+from .search_cache import bump_index_generation
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+IMPORT_CHUNK_SIZE = getattr(settings, 'IMPORT_CHUNK_SIZE', 1000)
+
+XLSX_UNAVAILABLE = 'XLSX files cannot be imported on this server because openpyxl is not installed; upload a CSV or JSON file'
+
+REGULATION_COLUMNS = [
+    'reference', 'name', 'description', 'type', 'status', 'issue_date', 'effective_date', 'expiry_date',
+]
+# Import column -> Article field
+ARTICLE_COLUMNS = {
+    'article_reference': 'reference',
+    'article_title': 'title',
+    'article_content': 'content',
+    'article_type': 'type',
+}
+DEPARTMENT_SEPARATOR = ';'
+
+FORMATS = {
+    '.csv': 'csv',
+    '.json': 'json',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+    '.xlsx': 'xlsx',
+}
+
+
+@dataclass
+class ImportRow:
+    number: int
+    values: dict
+    error: str = None
+
+
+@dataclass
+class RowError:
+    row: int
+    message: str
+
+    def __str__(self):
+        return f'Row {self.row}: {self.message}'
+
+
+@dataclass
+class ImportResult:
+    rows: int = 0
+    regulations_created: int = 0
+    articles_created: int = 0
+    errors: list = field(default_factory=list)
+    indexing: IndexingResult = field(default_factory=IndexingResult)
+
+
+def detect_format(filename):
+    """Return the import format for a file name, from its extension."""
+    suffix = Path(filename).suffix.lower()
+    if suffix not in FORMATS:
+        raise ValueError(f'Unsupported file type "{suffix}"; use one of {", ".join(sorted(FORMATS))}')
+    if FORMATS[suffix] == 'xlsx' and openpyxl is None:
+        # Rejected up front, before the file is uploaded into an import
+        raise ValueError(XLSX_UNAVAILABLE)
+    return FORMATS[suffix]
+
+
+def _text(binary_file):
+    # utf-8-sig drops the byte order mark spreadsheet programs put in front of CSV files
+    return io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
+
+
+def _flatten(number, entry):
+    """Turn a JSON object into import rows, one per entry in its "articles" list."""
+    if not isinstance(entry, dict):
+        yield ImportRow(number, {}, 'expected a JSON object')
+        return
+    articles = entry.get('articles')
+    if not articles:
+        yield ImportRow(number, entry)
+        return
+    regulation = {key: value for key, value in entry.items() if key != 'articles'}
+    for article in articles:
+        if not isinstance(article, dict):
+            yield ImportRow(number, {}, 'articles must be JSON objects')
+            continue
+        yield ImportRow(number, {**regulation, **{f'article_{key}': value for key, value in article.items()}})
+
+
+def _read_csv(binary_file):
+    # Row 1 is the header
+    for number, values in enumerate(csv.DictReader(_text(binary_file)), start=2):
+        yield ImportRow(number, values)
+
+
+def _read_ndjson(binary_file):
+    for number, line in enumerate(_text(binary_file), start=1):
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError as e:
+            yield ImportRow(number, {}, f'invalid JSON: {e}')
+            continue
+        yield from _flatten(number, entry)
+
+
+def _read_json(binary_file):
+    try:
+        entries = json.load(_text(binary_file))
+    except ValueError as e:
+        raise ValueError(f'Invalid JSON file: {e}')
+    if not isinstance(entries, list):
+        raise ValueError('A JSON import file must contain an array of objects')
+    for number, entry in enumerate(entries, start=1):
+        yield from _flatten(number, entry)
+
+
+def _read_xlsx(binary_file):
+    if openpyxl is None:
+        raise ValueError(XLSX_UNAVAILABLE)
+    # read_only streams the rows instead of loading the whole sheet
+    workbook = openpyxl.load_workbook(binary_file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(cell).strip() if cell is not None else '' for cell in next(rows, ())]
+        for number, cells in enumerate(rows, start=2):
+            if any(cell not in (None, '') for cell in cells):
+                yield ImportRow(number, dict(zip(header, cells)))
+    finally:
+        workbook.close()
+
+
+READERS = {
+    'csv': _read_csv,
+    'json': _read_json,
+    'ndjson': _read_ndjson,
+    'xlsx': _read_xlsx,
+}
+
+
+def read_rows(binary_file, file_format):
+    """Yield the ImportRows of an import file opened in binary mode."""
+    return READERS[file_format](binary_file)
+
+
+def _clean(value):
+    if isinstance(value, str):
+        value = value.strip()
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        # Spreadsheets turn references such as 12 into numbers
+        value = str(int(value)) if value == int(value) else str(value)
+    return value
+
+
+def _present(values, columns):
+    """Map the non-empty columns to field names, so that model defaults apply to the rest."""
+    fields = {}
+    for column, field_name in columns.items():
+        value = _clean(values.get(column))
+        if value not in (None, ''):
+            fields[field_name] = value
+    return fields
+
+
+def _validation_message(error):
+    if hasattr(error, 'message_dict'):
+        return '; '.join(f'{name}: {" ".join(messages)}' for name, messages in error.message_dict.items())
+    return ' '.join(error.messages)
+
+
+def import_chunk(rows, user, department_ids, result):
+    """Validate and save one chunk of rows. Returns the ids of the regulations created."""
+    references = {_clean(row.values.get('reference')) for row in rows if not row.error}
+    existing = dict(Regulation.objects.filter(reference__in=references).values_list('reference', 'id'))
+    existing_articles = set(
+        Article.objects.filter(regulation_id__in=existing.values())
+        .values_list('regulation__reference', 'reference')
+    )
+
+    new_regulations = {}  # reference -> (Regulation, department ids)
+    invalid_references = set()
+    articles = []  # (row number, regulation reference, Article)
+    valid_rows = []
+
+    for row in rows:
+        if row.error:
+            result.errors.append(RowError(row.number, row.error))
+            continue
+        reference = _clean(row.values.get('reference'))
+        if not reference:
+            result.errors.append(RowError(row.number, 'reference is required'))
+            continue
+        if reference in invalid_references:
+            result.errors.append(RowError(row.number, f'regulation {reference} is invalid'))
+            continue
+
+        if reference not in existing and reference not in new_regulations:
+            regulation = Regulation(
+                created_by=user, **_present(row.values, {column: column for column in REGULATION_COLUMNS})
+            )
+            names = [name.strip() for name in str(_clean(row.values.get('departments')) or '').split(DEPARTMENT_SEPARATOR)]
+            unknown = [name for name in names if name and name not in department_ids]
+            try:
+                # Uniqueness is checked against the database above, in one query per chunk
+                regulation.full_clean(exclude=['created_by'], validate_unique=False, validate_constraints=False)
+                if unknown:
+                    raise ValidationError({'departments': f'Unknown department {", ".join(unknown)}'})
+            except ValidationError as e:
+                invalid_references.add(reference)
+                result.errors.append(RowError(row.number, _validation_message(e)))
+                continue
+            new_regulations[reference] = (regulation, {department_ids[name] for name in names if name})
+
+        article_fields = _present(row.values, ARTICLE_COLUMNS)
+        if article_fields:
+            article = Article(**article_fields)
+            key = (reference, article.reference)
+            try:
+                article.full_clean(exclude=['regulation'], validate_unique=False, validate_constraints=False)
+                if key in existing_articles:
+                    raise ValidationError({'article_reference': f'Article {article.reference} already exists in {reference}'})
+            except ValidationError as e:
+                result.errors.append(RowError(row.number, _validation_message(e)))
+                continue
+            existing_articles.add(key)
+            articles.append((row.number, reference, article))
+        valid_rows.append(row)
+
+    try:
+        with transaction.atomic():
+            Regulation.objects.bulk_create([regulation for regulation, _ in new_regulations.values()])
+            # Not every database returns primary keys from bulk_create
+            created = dict(
+                Regulation.objects.filter(reference__in=new_regulations).values_list('reference', 'id')
+            )
+            Through = Regulation.assigned_departments.through
+            Through.objects.bulk_create([
+                Through(regulation_id=created[reference], department_id=department_id)
+                for reference, (_, departments) in new_regulations.items()
+                for department_id in departments
+            ])
+            regulation_ids = {**existing, **created}
+            for _, reference, article in articles:
+                article.regulation_id = regulation_ids[reference]
+            Article.objects.bulk_create([article for _, _, article in articles])
+            # Existing regulations are reindexed for their new articles through the outbox
+            extended = {existing[reference] for _, reference, _ in articles if reference in existing}
+            if extended:
+                enqueue_regulation_changes(extended)
+    except DatabaseError as e:
+        # e.g. a reference inserted concurrently; the chunk was rolled back as a whole
+        result.errors.extend(RowError(row.number, f'not saved: {e}') for row in valid_rows)
+        return []
+
+    result.regulations_created += len(created)
+    result.articles_created += len(articles)
+    return list(created.values())
+
+
+def index_imported_regulations(regulation_ids, batch_size=500):
+    """
+    Index newly imported regulations with bulk requests.
+
+    Batches that Elasticsearch does not accept are queued in the search index
+    outbox, so process_search_outbox retries them.
+    """
+    result = IndexingResult()
+    if elasticsearch_config.es is None:
+        # The database search backends already see the rows
+        bump_index_generation()
+        return result
+    for start in range(0, len(regulation_ids), batch_size):
+        ids = regulation_ids[start:start + batch_size]
+        indexed = index_batch(list(regulations_for_indexing().filter(pk__in=ids).order_by('pk')), None)
+        if indexed.failed:
+            enqueue_regulation_changes(ids)
+        result.add(indexed)
+    return result
+
+
+def import_regulations(binary_file, file_format, user=None, chunk_size=IMPORT_CHUNK_SIZE, reindex=True, progress=None):
+    """
+    Import regulations and articles from a file opened in binary mode.
+
+    progress, if given, is called as progress(result_so_far) after each chunk.
+    Raises ValueError if the file cannot be read at all.
+    """
+    result = ImportResult()
+    department_ids = dict(Department.objects.values_list('name', 'id'))
+    created_ids = []
+    rows = read_rows(binary_file, file_format)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        result.rows += len(chunk)
+        created_ids.extend(import_chunk(chunk, user, department_ids, result))
+        if progress:
+            progress(result)
+    if reindex and created_ids:
+        result.indexing = index_imported_regulations(created_ids)
+    return result
@@ -0,0 +1,132 @@
+"""
+Compliance matrix of a regulation: its articles (rows) against its assigned
+departments (columns), with the ComplianceStatus of every pair.
+
+The matrix is loaded with three queries whatever its size: articles,
+departments and statuses are fetched as plain value tuples, and the cells and
+running totals are kept in flat arrays rather than model instances.
+"""
+from array import array
+
+from django.utils.safestring import mark_safe
+
+from .models import ComplianceStatus
+
+STATUSES = [key for key, _ in ComplianceStatus.STATUS_CHOICES]
+STATUS_LABELS = dict(ComplianceStatus.STATUS_CHOICES)
+
+# Cell value for an article a department has not assessed yet
+NOT_ASSESSED = len(STATUSES)
+
+# Keys of the per-row/per-column summaries, in display order
+SUMMARY_KEYS = STATUSES + ['not_assessed']
+
+# Pre-rendered table cell for each code; a large matrix has tens of thousands of cells
+CELL_HTML = [f'<td class="cell cell-{key}"></td>' for key in SUMMARY_KEYS]
+
+
+def summarize(counts, total):
+    """Turn a list of counts (one per SUMMARY_KEYS entry) into counts and percentages."""
+    return {
+        'total': total,
+        'counts': dict(zip(SUMMARY_KEYS, counts)),
+        'percent': {key: round(100 * count / total, 1) if total else 0.0 for key, count in zip(SUMMARY_KEYS, counts)},
+    }
+
+
+class ComplianceMatrix:
+    """
+    Article x department grid of compliance status codes.
+
+    cells[row * len(departments) + column] holds an index into STATUSES, or
+    NOT_ASSESSED. Per-row and per-column counts for every status are kept
+    alongside, so totals and percentages need no further queries.
+    """
+
+    def __init__(self, articles, departments, statuses):
+        # articles: [(id, reference, title)], departments: [(id, name)],
+        # statuses: [(article_id, department_id, status)]
+        self.articles = articles
+        self.departments = departments
+        width = len(SUMMARY_KEYS)
+        rows, columns = len(articles), len(departments)
+
+        self.cells = array('B', [NOT_ASSESSED]) * (rows * columns)
+        self.row_counts = array('I', [0]) * (rows * width)
+        self.column_counts = array('I', [0]) * (columns * width)
+        for row in range(rows):
+            self.row_counts[row * width + NOT_ASSESSED] = columns
+        for column in range(columns):
+            self.column_counts[column * width + NOT_ASSESSED] = rows
+
+        row_index = {article[0]: row for row, article in enumerate(articles)}
+        column_index = {department[0]: column for column, department in enumerate(departments)}
+        status_index = {status: code for code, status in enumerate(STATUSES)}
+        for article_id, department_id, status in statuses:
+            row = row_index.get(article_id)
+            column = column_index.get(department_id)
+            code = status_index.get(status)
+            if row is None or column is None or code is None:
+                continue
+            self.cells[row * columns + column] = code
+            self.row_counts[row * width + NOT_ASSESSED] -= 1
+            self.row_counts[row * width + code] += 1
+            self.column_counts[column * width + NOT_ASSESSED] -= 1
+            self.column_counts[column * width + code] += 1
+
+    @classmethod
+    def for_regulation(cls, regulation):
+        """Load the matrix of a regulation with three queries."""
+        articles = list(regulation.articles.order_by('reference').values_list('id', 'reference', 'title'))
+        departments = list(regulation.assigned_departments.order_by('name').values_list('id', 'name'))
+        statuses = (
+            ComplianceStatus.objects
+            .filter(article__regulation=regulation, department__in=[department[0] for department in departments])
+            .values_list('article_id', 'department_id', 'status')
+        )
+        return cls(articles, departments, statuses.iterator(chunk_size=5000))
+
+    def status(self, row, column):
+        """Return the status key of a cell, or None if it has not been assessed."""
+        code = self.cells[row * len(self.departments) + column]
+        return None if code == NOT_ASSESSED else STATUSES[code]
+
+    def row_summary(self, row):
+        width = len(SUMMARY_KEYS)
+        return summarize(self.row_counts[row * width:(row + 1) * width], len(self.departments))
+
+    def column_summary(self, column):
+        width = len(SUMMARY_KEYS)
+        return summarize(self.column_counts[column * width:(column + 1) * width], len(self.articles))
+
+    def total_summary(self):
+        width = len(SUMMARY_KEYS)
+        totals = [sum(self.row_counts[key::width]) for key in range(width)]
+        return summarize(totals, len(self.articles) * len(self.departments))
+
+    def rows(self):
+        """
+        Yield one dict per article for templates.
+
+        cells is a list of status keys, with 'not_assessed' for empty cells.
+        cells_html is the same row already rendered as <td> elements, which
+        is much faster than looping over every cell in the template.
+        """
+        columns = len(self.departments)
+        for row, (article_id, reference, title) in enumerate(self.articles):
+            codes = self.cells[row * columns:(row + 1) * columns]
+            yield {
+                'id': article_id,
+                'reference': reference,
+                'title': title,
+                'cells': [SUMMARY_KEYS[code] for code in codes],
+                'cells_html': mark_safe(''.join([CELL_HTML[code] for code in codes])),
+                'summary': self.row_summary(row),
+            }
+
+    def columns(self):
+        """Return one dict per department for templates."""
+        return [
+            {'id': department_id, 'name': name, 'summary': self.column_summary(column)}
+            for column, (department_id, name) in enumerate(self.departments)
+        ]
@@ -0,0 +1,156 @@
+"""
+Bulk submission of a department's compliance statuses.
+
+A department reports its status on many articles at once. The submission is
+validated as a whole: one query checks that every article exists and belongs
+to a regulation the department is assigned to. Then every ComplianceStatus
+is inserted or updated with a single bulk_create(update_conflicts=True) in one
+transaction, with one audit entry for the whole batch.
+
+bulk_create sends no model signals, so the DepartmentComplianceRollup deltas
+that core.signals applies for single saves are applied here directly. The
+deltas depend on the statuses being replaced, so submissions for the same
+department take a lock on its Department row and run one after the other.
+"""
+from collections import Counter
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from .models import Article, AuditLog, ComplianceStatus, Department, Regulation
+from .rollups import apply_rollup_deltas
+
+# Largest number of statuses accepted in one submission
+COMPLIANCE_SUBMISSION_MAX_ITEMS = getattr(settings, 'COMPLIANCE_SUBMISSION_MAX_ITEMS', 5000)
+
+STATUS_VALUES = {value for value, _ in ComplianceStatus.STATUS_CHOICES}
+
+
+@dataclass
+class SubmissionResult:
+    created: int = 0
+    updated: int = 0
+    # One {'index', 'article', 'error'} dict per rejected entry; nothing is saved if any
+    errors: list = field(default_factory=list)
+
+
+def parse_entries(entries, result):
+    """Check the shape of each entry. Returns {article_id: (index, status, comments)}."""
+    statuses = {}
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            result.errors.append({'index': index, 'article': None, 'error': 'Expected an object'})
+            continue
+        article_id = entry.get('article')
+        if not isinstance(article_id, int) or isinstance(article_id, bool):
+            result.errors.append({'index': index, 'article': article_id, 'error': 'article must be an article id'})
+            continue
+        if entry.get('status') not in STATUS_VALUES:
+            result.errors.append({'index': index, 'article': article_id, 'error': f'Invalid status: {entry.get("status")}'})
+            continue
+        comments = entry.get('comments') or ''
+        if not isinstance(comments, str):
+            result.errors.append({'index': index, 'article': article_id, 'error': 'comments must be a string'})
+            continue
+        if article_id in statuses:
+            result.errors.append({'index': index, 'article': article_id, 'error': 'Article submitted more than once'})
+            continue
+        statuses[article_id] = (index, entry['status'], comments)
+    return statuses
+
+
+def submission_articles(department_id, article_ids):
+    """
+    Return {article_id: regulation_id} for the articles the department may report on.
+
+    One query: the article must exist and its regulation must have the
+    department among its assigned departments.
+    """
+    assignments = Regulation.assigned_departments.through.objects.filter(
+        regulation_id=OuterRef('regulation_id'), department_id=department_id
+    )
+    return dict(
+        Article.objects.filter(pk__in=article_ids)
+        .filter(Exists(assignments))
+        .values_list('id', 'regulation_id')
+    )
+
+
+def submit_compliance_statuses(user, department, entries):
+    """
+    Insert or update the department's status on each article in entries.
+
+    entries is a list of {'article': id, 'status': value, 'comments': text}.
+    Either every entry is saved or, when any entry is invalid, none is and
+    result.errors describes the invalid ones.
+    """
+    result = SubmissionResult()
+    if not entries:
+        result.errors.append({'index': None, 'article': None, 'error': 'No statuses submitted'})
+        return result
+    if len(entries) > COMPLIANCE_SUBMISSION_MAX_ITEMS:
+        result.errors.append({
+            'index': None, 'article': None,
+            'error': f'At most {COMPLIANCE_SUBMISSION_MAX_ITEMS} statuses can be submitted at once',
+        })
+        return result
+
+    statuses = parse_entries(entries, result)
+    regulation_ids = submission_articles(department.id, statuses)
+    for article_id, (index, _, _) in statuses.items():
+        if article_id not in regulation_ids:
+            result.errors.append({
+                'index': index, 'article': article_id,
+                'error': 'Article not found in a regulation assigned to this department',
+            })
+    if result.errors:
+        result.errors.sort(key=lambda error: error['index'])
+        return result
+
+    with transaction.atomic():
+        # Locking only the existing statuses would let two first-time submissions of
+        # the same article both count it as new; the department row covers every article
+        Department.objects.select_for_update().get(pk=department.pk)
+        previous = dict(
+            ComplianceStatus.objects
+            .filter(department=department, article_id__in=statuses)
+            .values_list('article_id', 'status')
+        )
+        ComplianceStatus.objects.bulk_create(
+            [
+                ComplianceStatus(
+                    article_id=article_id, department=department, status=status, comments=comments,
+                    created_by=user, updated_by=user,
+                )
+                for article_id, (_, status, comments) in statuses.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['article', 'department'],
+            # created_by and created_at keep their original values on existing rows
+            update_fields=['status', 'comments', 'updated_by', 'updated_at'],
+        )
+
+        deltas = Counter()
+        for article_id, (_, status, _) in statuses.items():
+            regulation_id = regulation_ids[article_id]
+            if article_id in previous:
+                deltas[(department.id, regulation_id, previous[article_id])] -= 1
+            deltas[(department.id, regulation_id, status)] += 1
+        apply_rollup_deltas(deltas)
+
+        result.updated = len(previous)
+        result.created = len(statuses) - result.updated
+        AuditLog.objects.create(
+            user=user,
+            action_type='status_change',
+            action_details=(
+                f'Submitted {len(statuses)} compliance statuses for {department.name} '
+                f'({result.created} new, {result.updated} updated)'
+            ),
+            target_model='department',
+            target_id=department.id,
+            payload={'statuses': {str(article_id): status for article_id, (_, status, _) in statuses.items()}},
+        )
+    return result
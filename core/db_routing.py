@@ -0,0 +1,183 @@
+"""
+Routing of heavy read paths to read replicas.
+
+ReplicaRouter sends every write, and by default every read, to 'default'.
+Reads go to one of the DATABASE_REPLICAS aliases only inside a designated
+read path:
+
+    @replica_reads           views: the admin dashboard and the exports,
+                             including their streamed content
+    with use_replica():      any other block, e.g. the database search
+                             fallback or a read-only management command
+
+Replicas lag behind the primary, so a user who has just written must not
+read from one. Once a request writes through the ORM, the rest of it reads
+from the primary. ReplicaRoutingMiddleware also sets a cookie that pins
+the user's following requests to the primary for REPLICA_PIN_SECONDS.
+Audit log entries and session saves do not count as writes for this: they
+happen on almost every request. Reads inside a transaction on the primary
+stay on the primary.
+
+Results read from a replica may be stale. Code that keeps results beyond
+the request, like the search result cache, wraps the reads in
+track_replica_reads() to tell whether they came from one.
+
+Replicas are plain entries in DATABASES, listed in DATABASE_REPLICAS. Each
+designated read picks one at random, so adding aliases spreads the reads.
+Migrations only run on 'default'; replicas get the schema by replication.
+"""
+import functools
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+
+DATABASE_REPLICAS = list(getattr(settings, 'DATABASE_REPLICAS', []))
+REPLICA_PIN_SECONDS = getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+REPLICA_PIN_COOKIE = 'db_primary_pin'
+
+# Models written on nearly every request; writing them does not pin reads to the primary
+PIN_EXEMPT_MODELS = {'core.auditlog', 'sessions.session'}
+
+for _alias in DATABASE_REPLICAS:
+    if _alias not in settings.DATABASES:
+        raise ImproperlyConfigured(f'DATABASE_REPLICAS lists "{_alias}", which is not in DATABASES')
+
+
+class RoutingState:
+    """Routing decisions for one request or use_replica() block."""
+
+    def __init__(self, pinned=False):
+        # Set when the user wrote recently; reads then stay on the primary
+        self.pinned = pinned
+        self.wrote = False
+        # The replica reads go to, inside a designated read path
+        self.replica = None
+
+
+_state = ContextVar('database_routing', default=None)
+# Replica aliases handed out inside the innermost track_replica_reads() block
+_replicas_read = ContextVar('replicas_read', default=None)
+
+
+def start_request(pinned=False):
+    """Begin routing for a request; pinned requests never read from a replica."""
+    state = RoutingState(pinned)
+    _state.set(state)
+    return state
+
+
+def finish_request():
+    """End routing for the current request and return its state."""
+    state = _state.get()
+    # Not ContextVar.reset(): under ASGI the middleware's hooks run in different contexts
+    _state.set(None)
+    return state
+
+
+def choose_replica():
+    return random.choice(DATABASE_REPLICAS) if DATABASE_REPLICAS else None
+
+
+@contextmanager
+def use_replica(alias=None):
+    """
+    Read from a replica inside the block (alias, or one chosen at random).
+
+    Yields the alias reads go to, or None when they stay on the primary:
+    no replica is configured, or the request is pinned or has written.
+    """
+    state = _state.get()
+    standalone = state is None
+    if standalone:
+        state = RoutingState()
+        _state.set(state)
+    previous = state.replica
+    if state.replica is None and not state.pinned and not state.wrote:
+        state.replica = alias or choose_replica()
+    replica = None if state.wrote else state.replica
+    replicas_read = _replicas_read.get()
+    if replica is not None and replicas_read is not None:
+        replicas_read.append(replica)
+    try:
+        yield replica
+    finally:
+        state.replica = previous
+        if standalone:
+            _state.set(None)
+
+
+@contextmanager
+def track_replica_reads():
+    """
+    Yield a list of the replica aliases use_replica() hands out inside the block.
+
+    An empty list means every read in the block went to the primary, so its
+    results are as fresh as the primary's.
+    """
+    replicas_read = []
+    token = _replicas_read.set(replicas_read)
+    try:
+        yield replicas_read
+    finally:
+        _replicas_read.reset(token)
+
+
+_END = object()
+
+
+def _stream_from_replica(content, alias):
+    # Each chunk is produced under the replica routing, released between chunks
+    iterator = iter(content)
+    while True:
+        with use_replica(alias):
+            chunk = next(iterator, _END)
+        if chunk is _END:
+            return
+        yield chunk
+
+
+def replica_reads(view):
+    """Decorate a read-only view so that its queries, streamed content included, may use a replica."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with use_replica() as alias:
+            response = view(request, *args, **kwargs)
+        if alias is not None and response.streaming and not response.is_async:
+            response.streaming_content = _stream_from_replica(response.streaming_content, alias)
+        return response
+    return wrapper
+
+
+class ReplicaRouter:
+    """Database router for DATABASE_ROUTERS; see the module docstring."""
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.replica is None or state.wrote:
+            return None
+        # Reads in a transaction on the primary must see its uncommitted writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None and model._meta.label_lower not in PIN_EXEMPT_MODELS:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in DATABASE_REPLICAS:
+            return False
+        return None
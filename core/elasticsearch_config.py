@@ -1,91 +1,259 @@
+import re
+
 from elasticsearch import Elasticsearch
+from elasticsearch.helpers import bulk
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
 
-try:
-    # Elasticsearch client configuration
-    es = Elasticsearch(
+from .metrics import registry as metrics
+from .performance import timed
+from .search_cache import bump_index_generation
+
+class TimedElasticsearch(Elasticsearch):
+    """Client that times its requests (core/performance.py) and counts them (core/metrics.py)."""
+
+    def perform_request(self, *args, **kwargs):
+        # Every API method, helpers.bulk and clients made with options() go through here
+        metrics.inc('compliance_elasticsearch_requests_total')
+        with timed('es'):
+            try:
+                return super().perform_request(*args, **kwargs)
+            except Exception:
+                metrics.inc('compliance_elasticsearch_failures_total')
+                raise
+
+def create_client():
+    """Create an Elasticsearch client from the project settings."""
+    return TimedElasticsearch(
         [settings.ELASTICSEARCH_HOST],
         basic_auth=(settings.ELASTICSEARCH_USERNAME, settings.ELASTICSEARCH_PASSWORD) if settings.ELASTICSEARCH_USERNAME else None
     )
+
+try:
+    # Elasticsearch client configuration
+    es = create_client()
 except (ImportError, ImproperlyConfigured):
     es = None
 
-# Index name for regulations
+def reset_client():
+    """Replace the module client, e.g. in a forked worker that must not share sockets."""
+    global es
+    if es is not None:
+        es = create_client()
+
+# Alias that search and writes go through. It points at a versioned index
+# (regulations_v<timestamp>) so the index can be rebuilt without downtime.
 REGULATION_INDEX = 'regulations'
 
+# SystemSetting key holding the versioned index being rebuilt, if any.
+# While it is set every write also goes to that index.
+REINDEX_TARGET_SETTING = 'elasticsearch_reindex_target'
+
+# Index settings while a new version is bulk loaded, and once it serves traffic
+BULK_LOAD_INDEX_SETTINGS = {'refresh_interval': '-1', 'number_of_replicas': 0}
+SERVING_INDEX_SETTINGS = {
+    'refresh_interval': '1s',
+    'number_of_replicas': getattr(settings, 'ELASTICSEARCH_REPLICAS', 1),
+}
+
 # Mapping for regulations index
 REGULATION_MAPPING = {
     'mappings': {
         'properties': {
             'id': {'type': 'integer'},
-            'reference': {'type': 'text', 'analyzer': 'standard'},
-            'name': {'type': 'text', 'analyzer': 'standard'},
+            'reference': {'type': 'text', 'analyzer': 'standard', 'fields': {'keyword': {'type': 'keyword', 'ignore_above': 256}}},
+            'name': {'type': 'text', 'analyzer': 'standard', 'fields': {'keyword': {'type': 'keyword', 'ignore_above': 256}}},
             'description': {'type': 'text', 'analyzer': 'standard'},
             'status': {'type': 'keyword'},
             'type': {'type': 'keyword'},
             'created_by': {'type': 'text', 'analyzer': 'standard'},
+            'created_by_id': {'type': 'integer'},
             'date_created': {'type': 'date'},
             'last_updated': {'type': 'date'},
-            'assigned_departments': {'type': 'text', 'analyzer': 'standard'}
+            'issue_date': {'type': 'date'},
+            'effective_date': {'type': 'date'},
+            'expiry_date': {'type': 'date'},
+            'assigned_departments': {'type': 'text', 'analyzer': 'standard'},
+            'assigned_department_ids': {'type': 'integer'}
         }
     }
 }
 
 def create_regulation_index():
-    """Create the regulations index if it doesn't exist."""
+    """Create a versioned index behind the regulations alias if neither exists."""
     if es is None:
         return
     if not es.indices.exists(index=REGULATION_INDEX):
-        es.indices.create(index=REGULATION_INDEX, body=REGULATION_MAPPING)
+        index = create_versioned_index(bulk_load=False)
+        es.indices.put_alias(index=index, name=REGULATION_INDEX)
 
-def index_regulation(regulation):
-    """Index a regulation document."""
-    if es is None:
-        return
-    doc = {
+def create_versioned_index(bulk_load=True):
+    """Create a new, empty regulations_v<timestamp> index and return its name."""
+    index = f'{REGULATION_INDEX}_v{timezone.now():%Y%m%d%H%M%S%f}'
+    body = dict(REGULATION_MAPPING)
+    body['settings'] = {'index': BULK_LOAD_INDEX_SETTINGS if bulk_load else SERVING_INDEX_SETTINGS}
+    es.indices.create(index=index, body=body)
+    return index
+
+def finish_bulk_load(index):
+    """Restore serving settings on a bulk-loaded index and make its documents searchable."""
+    es.indices.put_settings(index=index, settings={'index': SERVING_INDEX_SETTINGS})
+    es.indices.refresh(index=index)
+
+def aliased_indices():
+    """Return the names of the indices the regulations alias currently points at."""
+    if not es.indices.exists_alias(name=REGULATION_INDEX):
+        return []
+    return list(es.indices.get_alias(name=REGULATION_INDEX))
+
+def swap_regulation_alias(index):
+    """Atomically point the regulations alias at the given index."""
+    current = aliased_indices()
+    actions = [{'remove': {'index': old, 'alias': REGULATION_INDEX}} for old in current if old != index]
+    if not current and es.indices.exists(index=REGULATION_INDEX):
+        # A concrete index from before aliases were used; replace it in the same atomic step
+        actions.append({'remove_index': {'index': REGULATION_INDEX}})
+    actions.append({'add': {'index': index, 'alias': REGULATION_INDEX}})
+    es.indices.update_aliases(actions=actions)
+    bump_index_generation()
+
+def delete_old_regulation_indices(keep=1):
+    """
+    Delete superseded regulations_v* indices, keeping the newest `keep` of them.
+    
+    The index behind the alias and any index being rebuilt are never deleted.
+    Returns the names of the deleted indices.
+    """
+    protected = set(aliased_indices())
+    target = get_reindex_target()
+    if target:
+        protected.add(target)
+    versions = sorted(
+        (name for name in es.indices.get(index=f'{REGULATION_INDEX}_v*') if name not in protected),
+        reverse=True,
+    )
+    stale = versions[keep:]
+    for index in stale:
+        es.indices.delete(index=index)
+    return stale
+
+def get_reindex_target():
+    """Return the versioned index currently being rebuilt, or None."""
+    from .models import SystemSetting
+    return SystemSetting.objects.filter(setting_key=REINDEX_TARGET_SETTING).values_list('value', flat=True).first()
+
+def set_reindex_target(index):
+    """Record (or, with None, clear) the index being rebuilt so writes are dual-written to it."""
+    from .models import SystemSetting
+    if index is None:
+        SystemSetting.objects.filter(setting_key=REINDEX_TARGET_SETTING).delete()
+    else:
+        SystemSetting.objects.update_or_create(
+            setting_key=REINDEX_TARGET_SETTING,
+            defaults={'value': index, 'description': 'Elasticsearch index being rebuilt (set by recreate_elasticsearch_index)'},
+        )
+
+def write_indices():
+    """The live alias plus, during a rebuild, the index being rebuilt."""
+    target = get_reindex_target()
+    return [REGULATION_INDEX, target] if target else [REGULATION_INDEX]
+
+def regulation_document(regulation):
+    """
+    Build the search document for a regulation.
+    
+    Prefetch assigned_departments and select_related created_by when building
+    documents in bulk, otherwise each call issues its own queries.
+    """
+    departments = list(regulation.assigned_departments.all())
+    return {
         'id': regulation.id,
         'reference': regulation.reference,
         'name': regulation.name,
         'description': regulation.description,
         'status': regulation.status,
+        'type': regulation.type,
         'created_by': regulation.created_by.username if regulation.created_by else None,
+        'created_by_id': regulation.created_by_id,
         'date_created': regulation.date_created,
         'last_updated': regulation.last_updated,
-        'assigned_departments': [dept.name for dept in regulation.assigned_departments.all()]
+        'issue_date': regulation.issue_date,
+        'effective_date': regulation.effective_date,
+        'expiry_date': regulation.expiry_date,
+        'assigned_departments': [dept.name for dept in departments],
+        'assigned_department_ids': [dept.id for dept in departments]
     }
-    es.index(index=REGULATION_INDEX, id=regulation.id, body=doc)
+
+def index_regulation(regulation):
+    """Index a regulation document."""
+    if es is None:
+        return
+    doc = regulation_document(regulation)
+    for index in write_indices():
+        es.index(index=index, id=regulation.id, body=doc)
+    bump_index_generation()
+
+def bulk_index_regulations(regulations, index=None, chunk_size=500):
+    """
+    Index many regulations with a single bulk request.
+    
+    Without an explicit index the documents go to write_indices(). Returns
+    (indexed_count, errors), where errors lists the per-document failures
+    reported by Elasticsearch. Transport errors are raised.
+    """
+    if es is None:
+        return 0, []
+    indices = [index] if index else write_indices()
+    actions = (
+        {'_index': target, '_id': regulation.id, '_source': regulation_document(regulation)}
+        for regulation in regulations
+        for target in indices
+    )
+    try:
+        return bulk(es, actions, chunk_size=chunk_size, raise_on_error=False, raise_on_exception=True)
+    finally:
+        # Writes to an index that is still being built are not visible to searches yet
+        if not index:
+            bump_index_generation()
+
+def bulk_delete_regulations(regulation_ids, chunk_size=500):
+    """Remove many regulations from the index with a single bulk request. Returns (deleted, errors)."""
+    if es is None:
+        return 0, []
+    indices = write_indices()
+    actions = (
+        {'_op_type': 'delete', '_index': index, '_id': regulation_id}
+        for regulation_id in regulation_ids
+        for index in indices
+    )
+    try:
+        return bulk(es, actions, chunk_size=chunk_size, ignore_status=404, raise_on_error=False, raise_on_exception=True)
+    finally:
+        bump_index_generation()
 
 def delete_regulation_index(regulation_id):
     """Delete a regulation document from the index."""
     if es is None:
         return
-    es.delete(index=REGULATION_INDEX, id=regulation_id)
+    for index in write_indices():
+        es.options(ignore_status=404).delete(index=index, id=regulation_id)
+    bump_index_generation()
 
-def search_regulations(query, filters=None):
-    """Search regulations with optional filters."""
-    if es is None:
-        from .models import Regulation
-        # Return all regulations if Elasticsearch is not available
-        regulations = Regulation.objects.all()
-        return [{'id': reg.id, 
-                'reference': reg.reference,
-                'name': reg.name,
-                'description': reg.description,
-                'status': reg.status,
-                'created_by': reg.created_by.username if reg.created_by else None,
-                'date_created': reg.date_created,
-                'last_updated': reg.last_updated,
-                'assigned_departments': [dept.name for dept in reg.assigned_departments.all()]
-                } for reg in regulations]
+def search_regulation_index(query, filters=None, size=10):
+    """
+    Run a search against the regulations index and return the matching documents.
     
+    Errors are raised to the caller; core.search_backends decides what to fall back to.
+    """
     search_query = {
         'query': {
             'bool': {
                 'must': [],
                 'filter': []
             }
-        }
+        },
+        'size': size,
     }
 
     # Add full-text search if query is provided
@@ -110,20 +278,48 @@ def search_regulations(query, filters=None):
     if not search_query['query']['bool']['must'] and not search_query['query']['bool']['filter']:
         search_query['query'] = {'match_all': {}}
 
-    try:
-        response = es.search(index=REGULATION_INDEX, body=search_query)
-        return [hit['_source'] for hit in response['hits']['hits']]
-    except Exception as e:
-        # If there's any error with Elasticsearch, fall back to database
-        from .models import Regulation
-        regulations = Regulation.objects.all()
-        return [{'id': reg.id, 
-                'reference': reg.reference,
-                'name': reg.name,
-                'description': reg.description,
-                'status': reg.status,
-                'created_by': reg.created_by.username if reg.created_by else None,
-                'date_created': reg.date_created,
-                'last_updated': reg.last_updated,
-                'assigned_departments': [dept.name for dept in reg.assigned_departments.all()]
-                } for reg in regulations] 
\ No newline at end of file
+    response = es.search(index=REGULATION_INDEX, body=search_query)
+    return [hit['_source'] for hit in response['hits']['hits']]
+
+def page_regulation_index(filters, after=None, size=25):
+    """
+    Return one page of regulation ids and sort values, newest first.
+    
+    filters are cleaned listing filters (see search_backends.clean_regulation_filters).
+    after is the [last_updated epoch millis, id] sort value of the previous page's
+    last hit. The result is a list of (id, sort_values) tuples.
+    """
+    conditions = []
+    for param, field in (('reference', 'reference.keyword'), ('title', 'name.keyword')):
+        if filters.get(param):
+            # Escape wildcard syntax so the filter is a plain substring match, like icontains
+            value = re.sub(r'([\\*?])', r'\\\1', filters[param])
+            conditions.append({'wildcard': {field: {'value': f'*{value}*', 'case_insensitive': True}}})
+    for param, field in (('status', 'status'), ('created_by', 'created_by_id'), ('department', 'assigned_department_ids')):
+        if filters.get(param):
+            conditions.append({'term': {field: filters[param]}})
+    for field in ('issue_date', 'effective_date', 'expiry_date'):
+        bounds = {}
+        if filters.get(f'{field}_from'):
+            bounds['gte'] = filters[f'{field}_from'].isoformat()
+        if filters.get(f'{field}_to'):
+            bounds['lte'] = filters[f'{field}_to'].isoformat()
+        if bounds:
+            conditions.append({'range': {field: bounds}})
+
+    body = {
+        'query': {'bool': {'filter': conditions}},
+        # id breaks ties so the order is stable and search_after never skips or repeats a hit
+        'sort': [{'last_updated': 'desc'}, {'id': 'desc'}],
+        'size': size,
+        '_source': False,
+    }
+    if after:
+        body['search_after'] = after
+    response = es.search(index=REGULATION_INDEX, body=body)
+    return [(int(hit['_id']), hit['sort']) for hit in response['hits']['hits']]
+
+def search_regulations(query, filters=None):
+    """Search regulations with optional filters, using the configured search backends."""
+    from .search_backends import search_regulations as search_with_backends
+    return search_with_backends(query, filters)
@@ -0,0 +1,114 @@
+"""
+Helpers for streaming large exports without building them in memory.
+"""
+import csv
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+# Rows fetched per database round trip while streaming an export
+EXPORT_CHUNK_SIZE = 2000
+
+# Rows grouped into a single chunk written to the client
+EXPORT_ROWS_PER_WRITE = 500
+
+
+class Echo:
+    """A file-like object whose write() returns the value instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(header, rows, rows_per_write=EXPORT_ROWS_PER_WRITE):
+    """Yield CSV text for the header and rows, a few hundred rows at a time."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    buffer = []
+    for row in rows:
+        buffer.append(writer.writerow(row))
+        if len(buffer) >= rows_per_write:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def iter_ndjson(records, rows_per_write=EXPORT_ROWS_PER_WRITE):
+    """Yield newline-delimited JSON for the records, a few hundred at a time."""
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    buffer = []
+    for record in records:
+        buffer.append(encoder.encode(record) + '\n')
+        if len(buffer) >= rows_per_write:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def iter_gzip(chunks, level=6):
+    """Compress a stream of text chunks into a gzip stream on the fly."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 = gzip container
+    first = True
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+        if first:
+            # Push the header out straight away so the download starts immediately
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+            first = False
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def wants_gzip(request):
+    """Return True if the export was requested with ?compress=gzip."""
+    return request.GET.get('compress') == 'gzip'
+
+
+def streaming_export_response(chunks, filename, content_type, compress=False):
+    """Build a StreamingHttpResponse that downloads the chunks as an attachment."""
+    if compress:
+        response = StreamingHttpResponse(iter_gzip(chunks), content_type='application/gzip')
+        filename = f'{filename}.gz'
+    else:
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def regulation_record(regulation, include_articles=False):
+    """
+    Serialize a regulation for NDJSON exports.
+
+    Expects created_by to be select_related and assigned_departments (and
+    articles, when included) to be prefetched, so no queries are issued here.
+    """
+    record = {
+        'id': regulation.id,
+        'reference': regulation.reference,
+        'name': regulation.name,
+        'description': regulation.description,
+        'type': regulation.type,
+        'status': regulation.status,
+        'issue_date': regulation.issue_date,
+        'effective_date': regulation.effective_date,
+        'expiry_date': regulation.expiry_date,
+        'date_created': regulation.date_created,
+        'last_updated': regulation.last_updated,
+        'created_by': regulation.created_by.username if regulation.created_by else None,
+        'assigned_departments': [dept.name for dept in regulation.assigned_departments.all()],
+    }
+    if include_articles:
+        record['articles'] = [
+            {
+                'reference': article.reference,
+                'title': article.title,
+                'type': article.type,
+                'content': article.content,
+            }
+            for article in regulation.articles.all()
+        ]
+    return record
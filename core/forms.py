@@ -1,7 +1,6 @@
 from django import forms
 from .models import Regulation, Department, Article
-from django.db import models
-from datetime import datetime
+from .references import next_reference
 
 class ArticleForm(forms.ModelForm):
     class Meta:
@@ -56,24 +55,19 @@ class RegulationForm(forms.ModelForm):
         self.fields['description'].widget.attrs.update({'class': 'form-control'})
         self.fields['type'].widget.attrs.update({'class': 'form-control'})
         
-        # Generate the next reference number if this is a new regulation
+        # New regulations left without a reference get the next one from the
+        # reference sequence when they are saved (see core.references)
         if not self.instance.pk:
-            # Get the maximum reference number
-            max_ref = Regulation.objects.aggregate(max_ref=models.Max('reference'))['max_ref']
-            if max_ref:
-                # Extract the number part and increment it
-                try:
-                    ref_num = int(max_ref.split('-')[-1])
-                    next_num = ref_num + 1
-                    # Format the new reference number
-                    year = datetime.now().year
-                    self.initial['reference'] = f'REG-{year}-{next_num:03d}'
-                except (ValueError, IndexError):
-                    # If parsing fails, use a default format
-                    self.initial['reference'] = f'REG-{datetime.now().year}-001'
-            else:
-                # If no regulations exist yet, start with 001
-                self.initial['reference'] = f'REG-{datetime.now().year}-001'
+            self.fields['reference'].required = False
+            # Start empty so the placeholder shows the reference that will be assigned
+            self.initial['reference'] = self.initial.get('reference') or ''
+            self.fields['reference'].widget.attrs['placeholder'] = next_reference()
+            self.fields['reference'].help_text = (
+                'Leave blank to assign the next reference automatically, or enter a unique reference'
+            )
+        else:
+            # blank=True on the model is only for the sequence; existing regulations keep a reference
+            self.fields['reference'].required = True
 
 class RegulationEditForm(RegulationForm):
     """Form for editing existing regulations."""
@@ -83,4 +77,17 @@ class RegulationEditForm(RegulationForm):
         if self.instance and self.instance.status not in ['draft', 'rejected']:
             for field in self.fields:
                 self.fields[field].widget.attrs['readonly'] = True
-                self.fields[field].widget.attrs['disabled'] = True 
\ No newline at end of file
+                self.fields[field].widget.attrs['disabled'] = True 
+class RegulationImportForm(forms.Form):
+    """Upload form for the bulk regulation import."""
+    import_file = forms.FileField(help_text="CSV, JSON, NDJSON or XLSX file with one row per article")
+
+    def clean_import_file(self):
+        import_file = self.cleaned_data['import_file']
+        # Imported here to keep forms free of the import machinery until it is used
+        from .bulk_import import detect_format
+        try:
+            self.file_format = detect_format(import_file.name)
+        except ValueError as e:
+            raise forms.ValidationError(str(e))
+        return import_file
@@ -0,0 +1,322 @@
+"""
+Bulk indexing of regulations into Elasticsearch.
+
+Regulations are split into disjoint primary-key ranges. Each range is streamed
+in keyset-paginated batches, with creators joined and departments prefetched,
+and every batch is sent as one bulk request. Ranges can be spread over several
+worker processes. A batch that fails is retried with exponential backoff, then
+logged and counted as failed without stopping the run.
+
+Day-to-day changes go through the search index outbox instead: core.signals
+calls enqueue_regulation_changes() inside the writing transaction and the
+process_search_outbox command drains the queue with process_outbox_batch().
+"""
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from . import elasticsearch_config
+from .search_cache import bump_index_generation
+
+# Models are imported inside functions: spawned worker processes import this
+# module to unpickle their task before _init_worker() has set Django up.
+
+logger = logging.getLogger(__name__)
+
+# Search index outbox retries; see process_outbox_batch()
+OUTBOX_MAX_ATTEMPTS = getattr(settings, 'SEARCH_OUTBOX_MAX_ATTEMPTS', 5)
+OUTBOX_RETRY_DELAY = getattr(settings, 'SEARCH_OUTBOX_RETRY_DELAY', 30)
+OUTBOX_CLAIM_SECONDS = getattr(settings, 'SEARCH_OUTBOX_CLAIM_SECONDS', 300)
+
+
+@dataclass
+class IndexingResult:
+    indexed: int = 0
+    failed: int = 0
+    batches: int = 0
+
+    def add(self, other):
+        self.indexed += other.indexed
+        self.failed += other.failed
+        self.batches += other.batches
+
+
+def regulations_for_indexing():
+    """Regulations with everything regulation_document() needs loaded up front."""
+    from .models import Regulation
+    return Regulation.objects.select_related('created_by').prefetch_related('assigned_departments')
+
+
+def iter_batches(queryset, batch_size):
+    """Yield lists of objects from the queryset in pk order, using keyset pagination."""
+    queryset = queryset.order_by('pk')
+    last_pk = None
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        batch = list(page[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1].pk
+
+
+def iter_regulation_batches(start_pk, end_pk, batch_size):
+    """Yield lists of regulations with start_pk <= pk < end_pk, in pk order."""
+    return iter_batches(regulations_for_indexing().filter(pk__gte=start_pk, pk__lt=end_pk), batch_size)
+
+
+def split_pk_ranges(range_size):
+    """Split the regulation primary keys into disjoint [start, end) ranges."""
+    from .models import Regulation
+    bounds = Regulation.objects.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return []
+    return [
+        (start, min(start + range_size, bounds['high'] + 1))
+        for start in range(bounds['low'], bounds['high'] + 1, range_size)
+    ]
+
+
+def bulk_index_with_retries(batch, index, max_retries=3, backoff=1.0):
+    """
+    Send one batch as a bulk request, retrying transport failures with backoff.
+
+    Returns (indexed_count, errors) like bulk_index_regulations(); the last
+    transport error is raised once the retries are used up.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return elasticsearch_config.bulk_index_regulations(batch, index=index, chunk_size=len(batch))
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            logger.warning(
+                'Bulk request for regulations %s-%s failed (attempt %d): %s',
+                batch[0].pk, batch[-1].pk, attempt + 1, e,
+            )
+            time.sleep(backoff * 2 ** attempt)
+
+
+def index_batch(batch, index, max_retries=3, backoff=1.0):
+    """Send one batch as a bulk request; a batch that keeps failing is logged and counted as failed."""
+    try:
+        indexed, errors = bulk_index_with_retries(batch, index, max_retries=max_retries, backoff=backoff)
+    except Exception as e:
+        logger.error(
+            'Giving up on regulations %s-%s after %d attempts: %s',
+            batch[0].pk, batch[-1].pk, max_retries + 1, e,
+        )
+        return IndexingResult(failed=len(batch), batches=1)
+    for error in errors:
+        logger.error('Could not index regulation: %s', error)
+    return IndexingResult(indexed=indexed, failed=len(errors), batches=1)
+
+
+def index_pk_range(start_pk, end_pk, index, batch_size=500, max_retries=3):
+    """Index every regulation in [start_pk, end_pk)."""
+    result = IndexingResult()
+    for batch in iter_regulation_batches(start_pk, end_pk, batch_size):
+        result.add(index_batch(batch, index, max_retries=max_retries))
+    return result
+
+
+def index_changed_since(since, index, batch_size=500, max_retries=3):
+    """Index regulations updated at or after `since`, e.g. to replay writes made during a rebuild."""
+    result = IndexingResult()
+    for batch in iter_batches(regulations_for_indexing().filter(last_updated__gte=since), batch_size):
+        result.add(index_batch(batch, index, max_retries=max_retries))
+    return result
+
+
+def enqueue_regulation_changes(regulation_ids, action='index'):
+    """Queue search index changes for the regulations in the current transaction."""
+    from .models import SearchIndexOutbox
+    # The database search backends see the change as soon as it commits
+    transaction.on_commit(bump_index_generation)
+    if elasticsearch_config.es is None:
+        return
+    SearchIndexOutbox.objects.bulk_create(
+        [SearchIndexOutbox(regulation_id=regulation_id, action=action) for regulation_id in set(regulation_ids)]
+    )
+
+
+def process_outbox_batch(batch_size=500, max_retries=3):
+    """
+    Apply up to batch_size queued changes to the index.
+
+    Entries are claimed in a short transaction and the bulk requests run
+    after it has committed, so no rows stay locked while Elasticsearch is
+    called. Repeated entries for the same regulation are coalesced into a
+    single bulk operation. The database decides what the operation is:
+    regulations that still exist are (re)indexed and the rest are deleted.
+
+    Accepted entries are deleted. An entry Elasticsearch rejects is retried
+    later with backoff and dead-lettered after SEARCH_OUTBOX_MAX_ATTEMPTS
+    rejections, so one bad document cannot hold up the queue. When the
+    cluster cannot be reached at all the entries are released untouched and
+    the error is raised.
+
+    Returns (entries_processed, IndexingResult).
+    """
+    from .models import SearchIndexOutbox
+    result = IndexingResult()
+    entries = _claim_outbox_entries(batch_size)
+    if not entries:
+        return 0, result
+
+    regulation_ids = {regulation_id for _, regulation_id, _ in entries}
+    rejected = {}
+    try:
+        regulations = list(regulations_for_indexing().filter(pk__in=regulation_ids).order_by('pk'))
+        if regulations:
+            indexed, errors = bulk_index_with_retries(regulations, None, max_retries=max_retries)
+            result.add(IndexingResult(indexed=indexed, failed=len(errors), batches=1))
+            rejected.update(_errors_by_regulation(errors))
+
+        removed_ids = regulation_ids - {regulation.pk for regulation in regulations}
+        if removed_ids:
+            _, errors = elasticsearch_config.bulk_delete_regulations(removed_ids)
+            rejected.update(_errors_by_regulation(errors))
+    except Exception:
+        # Not the documents' fault; they must not use up their attempts
+        SearchIndexOutbox.objects.filter(pk__in=[entry_id for entry_id, _, _ in entries]).update(available_at=None)
+        raise
+
+    _acknowledge_outbox_entries(entries, rejected)
+    return len(entries), result
+
+
+def _claim_outbox_entries(batch_size):
+    """Claim up to batch_size entries that are due and not dead-lettered; returns (id, regulation_id, attempts) tuples."""
+    from .models import SearchIndexOutbox
+    now = timezone.now()
+    with transaction.atomic():
+        entries = SearchIndexOutbox.objects.filter(
+            Q(available_at__isnull=True) | Q(available_at__lte=now),
+            attempts__lt=OUTBOX_MAX_ATTEMPTS,
+        ).order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            # Lets several workers claim entries without waiting on each other
+            entries = entries.select_for_update(skip_locked=True)
+        entries = list(entries.values_list('id', 'regulation_id', 'attempts')[:batch_size])
+        # A worker that dies before acknowledging its entries releases them when the claim runs out
+        SearchIndexOutbox.objects.filter(pk__in=[entry_id for entry_id, _, _ in entries]).update(
+            available_at=now + timedelta(seconds=OUTBOX_CLAIM_SECONDS),
+        )
+    return entries
+
+
+def _errors_by_regulation(errors):
+    """Map the per-document errors of a bulk response to regulation ids."""
+    rejected = {}
+    for error in errors:
+        # Each error is {operation: {'_id': ..., 'status': ..., 'error': ...}}
+        details = next(iter(error.values()))
+        rejected[int(details['_id'])] = str(details.get('error', details))
+    return rejected
+
+
+def _acknowledge_outbox_entries(entries, rejected):
+    """Delete the accepted entries and schedule a retry, or dead-letter, the rejected ones."""
+    from .models import SearchIndexOutbox
+    SearchIndexOutbox.objects.filter(
+        pk__in=[entry_id for entry_id, regulation_id, _ in entries if regulation_id not in rejected]
+    ).delete()
+
+    now = timezone.now()
+    for entry_id, regulation_id, attempts in entries:
+        if regulation_id not in rejected:
+            continue
+        attempts += 1
+        if attempts >= OUTBOX_MAX_ATTEMPTS:
+            logger.error(
+                'Dead-lettering search index outbox entry %s for regulation %s after %d attempts: %s',
+                entry_id, regulation_id, attempts, rejected[regulation_id],
+            )
+        else:
+            logger.warning(
+                'Elasticsearch rejected regulation %s (attempt %d): %s',
+                regulation_id, attempts, rejected[regulation_id],
+            )
+        SearchIndexOutbox.objects.filter(pk=entry_id).update(
+            attempts=attempts,
+            last_error=rejected[regulation_id],
+            available_at=now + timedelta(seconds=OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)),
+        )
+
+
+def dead_outbox_entries():
+    """Outbox entries dead-lettered after OUTBOX_MAX_ATTEMPTS rejections."""
+    from .models import SearchIndexOutbox
+    return SearchIndexOutbox.objects.filter(attempts__gte=OUTBOX_MAX_ATTEMPTS)
+
+
+def retry_dead_outbox_entries():
+    """Make dead-lettered entries eligible again; returns how many there were."""
+    return dead_outbox_entries().update(attempts=0, available_at=None)
+
+
+def _init_worker():
+    django.setup()
+    # Forked workers must open their own database and Elasticsearch connections
+    connections.close_all()
+    elasticsearch_config.reset_client()
+
+
+def run_bulk_index(index, workers=1, batch_size=500, max_retries=3, progress=None):
+    """
+    Index all regulations into the given index.
+
+    progress, if given, is called as progress(result_so_far, elapsed_seconds)
+    each time a primary-key range finishes.
+    """
+    # Several batches per range keeps workers busy while still reporting progress often
+    ranges = split_pk_ranges(batch_size * 10)
+    total = IndexingResult()
+    started = time.monotonic()
+
+    if workers <= 1:
+        for start_pk, end_pk in ranges:
+            total.add(index_pk_range(start_pk, end_pk, index, batch_size, max_retries))
+            if progress:
+                progress(total, time.monotonic() - started)
+        return total
+
+    # Connections must not be inherited by the forked workers
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        futures = [
+            executor.submit(index_pk_range, start_pk, end_pk, index, batch_size, max_retries)
+            for start_pk, end_pk in ranges
+        ]
+        for future in as_completed(futures):
+            total.add(future.result())
+            if progress:
+                progress(total, time.monotonic() - started)
+    return total
+
+
+def add_indexing_arguments(parser):
+    """Add the bulk indexing options shared by the indexing commands."""
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes')
+    parser.add_argument('--batch-size', type=int, default=500, help='Regulations per bulk request')
+    parser.add_argument('--max-retries', type=int, default=3, help='Retries for a failed bulk request')
+
+
+def report_progress(command):
+    """Build a progress callback that writes to a management command's stdout."""
+    def progress(result, elapsed):
+        rate = result.indexed / elapsed if elapsed else 0
+        command.stdout.write(
+            f'Indexed {result.indexed} regulations ({result.failed} failed) '
+            f'in {elapsed:.1f}s - {rate:.0f} docs/s'
+        )
+    return progress
@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.audit_archive import (
+    AUDIT_ARCHIVE_DIR, AUDIT_ARCHIVE_HORIZON_DAYS, AUDIT_ARCHIVE_SEGMENT_SIZE, archive_audit_logs
+)
+from core.models import AuditLog
+
+class Command(BaseCommand):
+    help = 'Moves audit log entries older than the archive horizon into compressed NDJSON segment files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=AUDIT_ARCHIVE_HORIZON_DAYS,
+            help='Keep entries from this many days in the database',
+        )
+        parser.add_argument(
+            '--segment-size',
+            type=int,
+            default=AUDIT_ARCHIVE_SEGMENT_SIZE,
+            help='Maximum entries per segment file',
+        )
+        parser.add_argument(
+            '--dir',
+            default=str(AUDIT_ARCHIVE_DIR),
+            help='Archive directory',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only count the entries that would be archived',
+        )
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['segment_size'] < 1:
+            raise CommandError('--days must be >= 0 and --segment-size >= 1')
+
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        if options['dry_run']:
+            count = AuditLog.objects.filter(timestamp__lt=cutoff).count()
+            self.stdout.write(f'{count} audit log entries before {cutoff:%Y-%m-%d %H:%M} would be archived')
+            return
+
+        def progress(archived, segments):
+            self.stdout.write(f'Archived {archived} entries into {segments} segments')
+
+        archived, segments = archive_audit_logs(
+            cutoff, segment_size=options['segment_size'], directory=options['dir'], progress=progress
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {archived} audit log entries before {cutoff:%Y-%m-%d %H:%M} '
+            f'into {segments} new segments in {options["dir"]}'
+        ))
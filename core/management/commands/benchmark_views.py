@@ -0,0 +1,73 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from core.benchmarks import (
+    BUDGET_FILE, MEASUREMENTS, budgets_from_results, check_results, load_budgets, results_as_dict,
+    run_benchmarks, write_budgets,
+)
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the main views on a throwaway test database at two data sizes and fails if a view '
+        'is over its budget or its query count grows with the data'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--budgets', default=str(BUDGET_FILE), help='Budget file')
+        parser.add_argument('--seed', type=int, default=1, help='Seed for the generated data')
+        parser.add_argument(
+            '--scale',
+            type=float,
+            default=1.0,
+            help='Multiply both data set sizes; budgets are only meaningful at 1',
+        )
+        parser.add_argument('--output', help='Also write the measurements to this JSON file')
+        parser.add_argument(
+            '--update-budgets',
+            action='store_true',
+            help='Rewrite the budget file from this run instead of checking against it',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            budgets = load_budgets(options['budgets'])
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Cannot read the budget file: {e}')
+        if options['scale'] != 1:
+            budgets['scales'] = {
+                name: {key: int(count * options['scale']) for key, count in scale.items()}
+                for name, scale in budgets['scales'].items()
+            }
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            results = run_benchmarks(budgets, seed=options['seed'], progress=self.stdout.write)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(f'{"view":<36}' + ''.join(f'{key:>22}' for key in MEASUREMENTS))
+        for name, large in results['large'].items():
+            small = results['small'][name]
+            self.stdout.write(f'{name:<36}' + ''.join(
+                f'{f"{getattr(small, key)} -> {getattr(large, key)}":>22}' for key in MEASUREMENTS
+            ))
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(results_as_dict(results), output, indent=2)
+
+        if options['update_budgets']:
+            write_budgets(budgets_from_results(results, load_budgets(options['budgets'])), options['budgets'])
+            self.stdout.write(self.style.SUCCESS(f'Wrote new budgets to {options["budgets"]}'))
+            return
+
+        failures = check_results(results, budgets)
+        if failures:
+            for failure in failures:
+                self.stderr.write(self.style.ERROR(failure))
+            raise CommandError(f'{len(failures)} benchmark budget violations')
+        self.stdout.write(self.style.SUCCESS(f'All {len(results["large"])} views are within their budgets'))
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.synthetic_data import LOAD_TEST_PASSWORD, LoadDataPlan, generate
+
+class Command(BaseCommand):
+    help = 'Adds reproducible synthetic data at a configurable scale, for load and performance testing'
+
+    def add_arguments(self, parser):
+        defaults = LoadDataPlan()
+        parser.add_argument('--seed', type=int, default=defaults.seed, help='Random seed; the same seed gives the same data')
+        parser.add_argument('--departments', type=int, default=defaults.departments, help='Departments to create')
+        parser.add_argument('--users', type=int, default=defaults.users, help='Users to create')
+        parser.add_argument('--regulations', type=int, default=defaults.regulations, help='Regulations to create')
+        parser.add_argument('--articles', type=int, default=defaults.articles, help='Approximate number of articles to create')
+        parser.add_argument(
+            '--statuses',
+            type=int,
+            default=defaults.statuses,
+            help='Approximate number of compliance statuses to create',
+        )
+        parser.add_argument('--audit-logs', type=int, default=defaults.audit_logs, help='Audit log entries to create')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=defaults.chunk_size,
+            help='Regulations or audit log entries inserted per transaction',
+        )
+        parser.add_argument('--workers', type=int, default=1, help='Number of worker processes')
+
+    def handle(self, *args, **options):
+        plan = LoadDataPlan(
+            seed=options['seed'],
+            departments=options['departments'],
+            users=options['users'],
+            regulations=options['regulations'],
+            articles=options['articles'],
+            statuses=options['statuses'],
+            audit_logs=options['audit_logs'],
+            chunk_size=options['chunk_size'],
+        )
+        if plan.chunk_size < 1 or min(plan.departments, plan.users, plan.regulations, plan.articles,
+                                      plan.statuses, plan.audit_logs) < 0:
+            raise CommandError('Counts must be >= 0 and --chunk-size >= 1')
+        if plan.regulations and not plan.departments:
+            raise CommandError('Regulations need at least one department')
+
+        workers = options['workers']
+        if workers > 1 and connection.vendor == 'sqlite':
+            # SQLite allows one writer at a time; parallel chunks would only wait on each other
+            self.stdout.write(self.style.WARNING('SQLite cannot write in parallel; using one worker'))
+            workers = 1
+
+        def progress(result, elapsed):
+            counts = result.counts
+            self.stdout.write(
+                f'{counts["regulations"]} regulations, {counts["articles"]} articles, '
+                f'{counts["statuses"]} statuses, {counts["audit_logs"]} audit log entries in {elapsed:.0f}s'
+            )
+
+        result = generate(plan, workers=workers, progress=progress)
+        summary = ', '.join(f'{count} {name.replace("_", " ")}' for name, count in result.counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Created {summary}'))
+        self.stdout.write(
+            f'Generated users log in with the password "{LOAD_TEST_PASSWORD}". '
+            'Run index_regulations to add the regulations to Elasticsearch.'
+        )
@@ -0,0 +1,81 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.bulk_import import IMPORT_CHUNK_SIZE, detect_format, import_regulations
+from core.models import User
+
+class Command(BaseCommand):
+    help = 'Imports regulations and articles from a CSV, JSON, NDJSON or XLSX file in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import')
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'json', 'ndjson', 'xlsx'],
+            help='File format (default: from the file extension)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=IMPORT_CHUNK_SIZE,
+            help='Rows validated and saved per transaction',
+        )
+        parser.add_argument('--user', help='Username recorded as the creator of the imported regulations')
+        parser.add_argument(
+            '--no-reindex',
+            action='store_true',
+            help='Do not index the imported regulations in Elasticsearch afterwards',
+        )
+        parser.add_argument(
+            '--max-errors',
+            type=int,
+            default=100,
+            help='Maximum number of row errors to print',
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be >= 1')
+
+        user = None
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f'Unknown user: {options["user"]}')
+
+        def progress(result):
+            self.stdout.write(
+                f'{result.rows} rows read: {result.regulations_created} regulations and '
+                f'{result.articles_created} articles created, {len(result.errors)} errors'
+            )
+
+        try:
+            file_format = options['format'] or detect_format(options['path'])
+            with open(options['path'], 'rb') as import_file:
+                result = import_regulations(
+                    import_file,
+                    file_format,
+                    user=user,
+                    chunk_size=options['chunk_size'],
+                    reindex=not options['no_reindex'],
+                    progress=progress,
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for error in result.errors[:options['max_errors']]:
+            self.stderr.write(str(error))
+        if len(result.errors) > options['max_errors']:
+            self.stderr.write(f'... and {len(result.errors) - options["max_errors"]} more errors')
+
+        if result.indexing.failed:
+            self.stdout.write(self.style.WARNING(
+                f'{result.indexing.failed} regulations could not be indexed and were queued for process_search_outbox'
+            ))
+        message = (
+            f'Imported {result.regulations_created} regulations and {result.articles_created} articles '
+            f'from {result.rows} rows'
+        )
+        if result.errors:
+            self.stdout.write(self.style.WARNING(f'{message}; {len(result.errors)} rows had errors'))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
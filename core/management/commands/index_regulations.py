@@ -1,18 +1,27 @@
 from django.core.management.base import BaseCommand
-from core.models import Regulation
-from core.elasticsearch_config import index_regulation, create_regulation_index
+from core.elasticsearch_config import REGULATION_INDEX, create_regulation_index
+from core.indexing import add_indexing_arguments, report_progress, run_bulk_index
 
 class Command(BaseCommand):
     help = 'Index all regulations in Elasticsearch'
 
+    def add_arguments(self, parser):
+        add_indexing_arguments(parser)
+
     def handle(self, *args, **options):
         # Create index if it doesn't exist
         create_regulation_index()
         
-        # Index all regulations
-        regulations = Regulation.objects.all()
-        for regulation in regulations:
-            index_regulation(regulation)
-            self.stdout.write(f'Indexed regulation: {regulation.reference}')
+        # Index all regulations in bulk requests, spread over the worker processes
+        result = run_bulk_index(
+            REGULATION_INDEX,
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            max_retries=options['max_retries'],
+            progress=report_progress(self),
+        )
         
-        self.stdout.write(self.style.SUCCESS('Successfully indexed all regulations')) 
\ No newline at end of file
+        if result.failed:
+            self.stdout.write(self.style.WARNING(f'Indexed {result.indexed} regulations, {result.failed} failed'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Successfully indexed all {result.indexed} regulations'))
@@ -1,7 +1,6 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
 from core.models import Department, Regulation, Article
-from datetime import datetime, timedelta
 import random
 
 User = get_user_model()
@@ -37,49 +36,54 @@ class Command(BaseCommand):
         regulations_data = [
             {
                 'name': 'Data Protection Regulation',
+                'reference': 'REG-2024-001',
                 'description': 'Regulation for handling and protecting sensitive data',
-                'status': 'approved',
+                'status': 'fully_approved',
                 'articles': [
-                    {'title': 'Data Collection', 'content': 'Guidelines for collecting user data', 'order': 1},
-                    {'title': 'Data Storage', 'content': 'Requirements for secure data storage', 'order': 2},
-                    {'title': 'Data Access', 'content': 'Rules for accessing sensitive data', 'order': 3},
+                    {'title': 'Data Collection', 'content': 'Guidelines for collecting user data', 'reference': '1'},
+                    {'title': 'Data Storage', 'content': 'Requirements for secure data storage', 'reference': '2'},
+                    {'title': 'Data Access', 'content': 'Rules for accessing sensitive data', 'reference': '3'},
                 ]
             },
             {
                 'name': 'Workplace Safety Standards',
+                'reference': 'REG-2024-002',
                 'description': 'Standards for maintaining a safe working environment',
-                'status': 'in_progress',
+                'status': 'action_required_from_department',
                 'articles': [
-                    {'title': 'Emergency Procedures', 'content': 'Protocols for emergency situations', 'order': 1},
-                    {'title': 'Equipment Safety', 'content': 'Guidelines for safe equipment usage', 'order': 2},
+                    {'title': 'Emergency Procedures', 'content': 'Protocols for emergency situations', 'reference': '1'},
+                    {'title': 'Equipment Safety', 'content': 'Guidelines for safe equipment usage', 'reference': '2'},
                 ]
             },
             {
                 'name': 'Financial Compliance Guidelines',
+                'reference': 'REG-2024-003',
                 'description': 'Guidelines for financial reporting and compliance',
-                'status': 'pending',
+                'status': 'awaiting_compliance_review',
                 'articles': [
-                    {'title': 'Financial Reporting', 'content': 'Requirements for financial reports', 'order': 1},
-                    {'title': 'Audit Procedures', 'content': 'Process for financial audits', 'order': 2},
-                    {'title': 'Record Keeping', 'content': 'Standards for financial record keeping', 'order': 3},
+                    {'title': 'Financial Reporting', 'content': 'Requirements for financial reports', 'reference': '1'},
+                    {'title': 'Audit Procedures', 'content': 'Process for financial audits', 'reference': '2'},
+                    {'title': 'Record Keeping', 'content': 'Standards for financial record keeping', 'reference': '3'},
                 ]
             },
             {
                 'name': 'IT Security Policy',
+                'reference': 'REG-2024-004',
                 'description': 'Policies for maintaining IT security',
                 'status': 'draft',
                 'articles': [
-                    {'title': 'Password Policy', 'content': 'Requirements for password creation and management', 'order': 1},
-                    {'title': 'Network Security', 'content': 'Guidelines for network security', 'order': 2},
+                    {'title': 'Password Policy', 'content': 'Requirements for password creation and management', 'reference': '1'},
+                    {'title': 'Network Security', 'content': 'Guidelines for network security', 'reference': '2'},
                 ]
             },
             {
                 'name': 'Environmental Compliance',
+                'reference': 'REG-2024-005',
                 'description': 'Regulations for environmental protection',
-                'status': 'rejected',
+                'status': 'returned_for_department_rework',
                 'articles': [
-                    {'title': 'Waste Management', 'content': 'Procedures for waste disposal', 'order': 1},
-                    {'title': 'Energy Usage', 'content': 'Guidelines for energy conservation', 'order': 2},
+                    {'title': 'Waste Management', 'content': 'Procedures for waste disposal', 'reference': '1'},
+                    {'title': 'Energy Usage', 'content': 'Guidelines for energy conservation', 'reference': '2'},
                 ]
             }
         ]
@@ -87,13 +91,18 @@ class Command(BaseCommand):
         # Create regulations and articles
         for reg_data in regulations_data:
             # Create regulation
-            regulation = Regulation.objects.create(
-                name=reg_data['name'],
-                description=reg_data['description'],
-                status=reg_data['status'],
-                created_by=maker,
-                date_created=datetime.now() - timedelta(days=random.randint(1, 30))
+            regulation, created = Regulation.objects.get_or_create(
+                reference=reg_data['reference'],
+                defaults={
+                    'name': reg_data['name'],
+                    'description': reg_data['description'],
+                    'status': reg_data['status'],
+                    'created_by': maker,
+                }
             )
+            if not created:
+                # Already added by an earlier run
+                continue
             
             # Assign random departments
             num_depts = random.randint(1, len(departments))
@@ -105,7 +114,7 @@ class Command(BaseCommand):
                     regulation=regulation,
                     title=article_data['title'],
                     content=article_data['content'],
-                    order=article_data['order']
+                    reference=article_data['reference']
                 )
 
         self.stdout.write(self.style.SUCCESS('Successfully populated database with sample regulations and articles')) 
\ No newline at end of file
@@ -42,7 +42,7 @@ class Command(BaseCommand):
                 'name': 'Data Protection Regulation',
                 'reference': 'REG-2024-001',
                 'description': 'Regulation for handling and protecting sensitive data',
-                'status': 'approved',
+                'status': 'fully_approved',
                 'articles': [
                     {'title': 'Data Collection', 'content': 'Guidelines for collecting user data', 'type': 'regulation', 'reference': '1'},
                     {'title': 'Data Storage', 'content': 'Requirements for secure data storage', 'type': 'regulation', 'reference': '2'},
@@ -53,7 +53,7 @@ class Command(BaseCommand):
                 'name': 'Workplace Safety Standards',
                 'reference': 'REG-2024-002',
                 'description': 'Standards for maintaining a safe working environment',
-                'status': 'in_progress',
+                'status': 'action_required_from_department',
                 'articles': [
                     {'title': 'Emergency Procedures', 'content': 'Protocols for emergency situations', 'type': 'rule', 'reference': '1'},
                     {'title': 'Equipment Safety', 'content': 'Guidelines for safe equipment usage', 'type': 'rule', 'reference': '2'},
@@ -63,7 +63,7 @@ class Command(BaseCommand):
                 'name': 'Financial Compliance Guidelines',
                 'reference': 'REG-2024-003',
                 'description': 'Guidelines for financial reporting and compliance',
-                'status': 'pending',
+                'status': 'awaiting_compliance_review',
                 'articles': [
                     {'title': 'Financial Reporting', 'content': 'Requirements for financial reports', 'type': 'guideline', 'reference': '1'},
                     {'title': 'Audit Procedures', 'content': 'Process for financial audits', 'type': 'guideline', 'reference': '2'},
@@ -84,7 +84,7 @@ class Command(BaseCommand):
                 'name': 'Environmental Compliance',
                 'reference': 'REG-2024-005',
                 'description': 'Regulations for environmental protection',
-                'status': 'rejected',
+                'status': 'returned_for_department_rework',
                 'articles': [
                     {'title': 'Waste Management', 'content': 'Procedures for waste disposal', 'type': 'regulation', 'reference': '1'},
                     {'title': 'Energy Usage', 'content': 'Guidelines for energy conservation', 'type': 'regulation', 'reference': '2'},
@@ -0,0 +1,57 @@
+import time
+from django.core.management.base import BaseCommand
+from core.indexing import dead_outbox_entries, process_outbox_batch, retry_dead_outbox_entries
+from core.models import SearchIndexOutbox
+
+class Command(BaseCommand):
+    help = 'Applies queued search index changes from the search index outbox to Elasticsearch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Outbox entries processed per bulk operation')
+        parser.add_argument('--max-retries', type=int, default=3, help='Retries for a failed bulk request')
+        parser.add_argument('--loop', action='store_true', help='Keep running and poll for new entries')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to wait when the outbox is empty (with --loop)')
+        parser.add_argument('--retry-dead', action='store_true', help='Retry dead-lettered entries, e.g. after fixing their cause')
+
+    def handle(self, *args, **options):
+        if options['retry_dead']:
+            self.stdout.write(f'Retrying {retry_dead_outbox_entries()} dead-lettered outbox entries')
+
+        failures = 0
+        while True:
+            try:
+                processed, result = process_outbox_batch(
+                    batch_size=options['batch_size'],
+                    max_retries=options['max_retries'],
+                )
+            except Exception as e:
+                if not options['loop']:
+                    raise
+                # Elasticsearch could not be reached; the entries stay in the outbox
+                failures += 1
+                delay = min(options['interval'] * 2 ** failures, 60)
+                self.stdout.write(self.style.WARNING(f'Outbox batch failed, retrying in {delay:.0f}s: {e}'))
+                time.sleep(delay)
+                continue
+
+            failures = 0
+            if processed:
+                self.stdout.write(
+                    f'Processed {processed} outbox entries ({result.indexed} regulations indexed)'
+                )
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        dead = dead_outbox_entries().count()
+        waiting = SearchIndexOutbox.objects.count() - dead
+        if dead:
+            self.stdout.write(self.style.WARNING(
+                f'{dead} outbox entries were rejected too often and are dead-lettered; '
+                'see their last_error, then run with --retry-dead'
+            ))
+        if waiting:
+            self.stdout.write(f'{waiting} outbox entries are waiting to be retried')
+        if not dead and not waiting:
+            self.stdout.write(self.style.SUCCESS('Search index outbox is empty'))
@@ -0,0 +1,86 @@
+import gzip
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from core.exports import iter_ndjson
+from core.models import Notification
+from core.notifications import recount_unread_notifications
+
+# Columns written to the archive for each removed notification
+ARCHIVE_FIELDS = ['id', 'recipient_id', 'title', 'message', 'read', 'created_at', 'related_regulation_id']
+
+class Command(BaseCommand):
+    help = 'Deletes read notifications older than the retention period in batches, optionally archiving them first'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 90),
+            help='Keep read notifications created within this many days',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Notifications deleted per transaction',
+        )
+        parser.add_argument(
+            '--archive',
+            help='Append removed notifications to this gzipped NDJSON file before deleting them',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only count the notifications that would be removed',
+        )
+        parser.add_argument(
+            '--recount',
+            action='store_true',
+            help='Recompute every user\'s unread notification counter afterwards',
+        )
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['batch_size'] < 1:
+            raise CommandError('--days must be >= 0 and --batch-size >= 1')
+
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        expired = Notification.objects.filter(read=True, created_at__lt=cutoff).order_by('id')
+
+        if options['dry_run']:
+            self.stdout.write(f'{expired.count()} read notifications created before {cutoff:%Y-%m-%d} would be removed')
+            return
+
+        archive = gzip.open(options['archive'], 'at', encoding='utf-8') if options['archive'] else None
+        removed = 0
+        last_id = 0
+        try:
+            while True:
+                # Keyset pagination keeps every batch an index range scan
+                batch = list(expired.filter(id__gt=last_id).values(*ARCHIVE_FIELDS)[:options['batch_size']])
+                if not batch:
+                    break
+                last_id = batch[-1]['id']
+                if archive:
+                    for chunk in iter_ndjson(batch):
+                        archive.write(chunk)
+                    archive.flush()
+                with transaction.atomic():
+                    Notification.objects.filter(id__in=[row['id'] for row in batch], read=True).delete()
+                removed += len(batch)
+                self.stdout.write(f'Removed {removed} notifications')
+        finally:
+            if archive:
+                archive.close()
+
+        if options['recount']:
+            recount_unread_notifications()
+            self.stdout.write('Recounted unread notifications')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Removed {removed} read notifications created before {cutoff:%Y-%m-%d}'
+        ))
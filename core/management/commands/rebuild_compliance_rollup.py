@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.rollups import rebuild_compliance_rollup, verify_compliance_rollup
+
+class Command(BaseCommand):
+    help = 'Rebuilds the department compliance rollup table from ComplianceStatus and verifies it'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify-only',
+            action='store_true',
+            help='Only compare the rollup with ComplianceStatus; do not rebuild it',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rollup rows inserted per query',
+        )
+
+    def handle(self, *args, **options):
+        if not options['verify_only']:
+            written = rebuild_compliance_rollup(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt compliance rollup: {written} rows'))
+
+        mismatches = verify_compliance_rollup()
+        for (department_id, regulation_id, status), expected, actual in mismatches[:50]:
+            self.stdout.write(self.style.WARNING(
+                f'Department {department_id}, regulation {regulation_id}, {status}: '
+                f'expected {expected}, found {actual}'
+            ))
+        if mismatches:
+            raise CommandError(f'Compliance rollup does not match ComplianceStatus ({len(mismatches)} mismatches)')
+
+        self.stdout.write(self.style.SUCCESS('Compliance rollup matches ComplianceStatus'))
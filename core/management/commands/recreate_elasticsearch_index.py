@@ -1,33 +1,77 @@
-from django.core.management.base import BaseCommand
-from core.elasticsearch_config import create_regulation_index, delete_regulation_index, index_regulation
-from core.models import Regulation
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from core import elasticsearch_config
+from core.elasticsearch_config import (
+    create_versioned_index, delete_old_regulation_indices, finish_bulk_load,
+    get_reindex_target, set_reindex_target, swap_regulation_alias
+)
+from core.indexing import add_indexing_arguments, index_changed_since, report_progress, run_bulk_index
+
+# Writes this close to the start of the rebuild are replayed as well, to allow for clock skew
+REPLAY_MARGIN = timedelta(minutes=1)
 
 class Command(BaseCommand):
-    help = 'Recreates the Elasticsearch index and reindexes all regulations'
+    help = 'Rebuilds the regulations index into a new version and swaps the alias onto it without downtime'
+
+    def add_arguments(self, parser):
+        add_indexing_arguments(parser)
+        parser.add_argument(
+            '--keep',
+            type=int,
+            default=1,
+            help='Number of superseded index versions to keep for rollback',
+        )
 
     def handle(self, *args, **options):
-        # Delete existing index
-        try:
-            delete_regulation_index()
-            self.stdout.write(self.style.SUCCESS('Successfully deleted existing index'))
-        except Exception as e:
-            self.stdout.write(self.style.WARNING(f'Could not delete existing index: {e}'))
+        if elasticsearch_config.es is None:
+            raise CommandError('Elasticsearch is not configured')
+
+        in_progress = get_reindex_target()
+        if in_progress:
+            raise CommandError(
+                f'A rebuild into {in_progress} is already in progress. If it died, delete the '
+                f'"{elasticsearch_config.REINDEX_TARGET_SETTING}" system setting and try again.'
+            )
+
+        # Build into a new versioned index; the live alias keeps serving searches meanwhile
+        new_index = create_versioned_index(bulk_load=True)
+        self.stdout.write(self.style.SUCCESS(f'Created new index {new_index}'))
 
-        # Create new index with updated mapping
+        # From here on every write also goes to the new index
+        set_reindex_target(new_index)
+        started = timezone.now()
         try:
-            create_regulation_index()
-            self.stdout.write(self.style.SUCCESS('Successfully created new index'))
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f'Could not create new index: {e}'))
-            return
-
-        # Reindex all regulations
-        regulations = Regulation.objects.all()
-        for regulation in regulations:
-            try:
-                index_regulation(regulation)
-                self.stdout.write(self.style.SUCCESS(f'Successfully indexed regulation: {regulation.reference}'))
-            except Exception as e:
-                self.stdout.write(self.style.WARNING(f'Could not index regulation {regulation.reference}: {e}'))
-
-        self.stdout.write(self.style.SUCCESS('Successfully reindexed all regulations')) 
\ No newline at end of file
+            result = run_bulk_index(
+                new_index,
+                workers=options['workers'],
+                batch_size=options['batch_size'],
+                max_retries=options['max_retries'],
+                progress=report_progress(self),
+            )
+            if result.failed:
+                raise CommandError(f'{result.failed} regulations could not be indexed; keeping the current index')
+
+            # Replay anything written while the bulk load was running
+            replayed = index_changed_since(
+                started - REPLAY_MARGIN, new_index,
+                batch_size=options['batch_size'], max_retries=options['max_retries'],
+            )
+            self.stdout.write(f'Replayed {replayed.indexed} regulations changed during the rebuild')
+
+            finish_bulk_load(new_index)
+            swap_regulation_alias(new_index)
+        except BaseException:
+            set_reindex_target(None)
+            elasticsearch_config.es.options(ignore_status=404).indices.delete(index=new_index)
+            self.stdout.write(self.style.ERROR(f'Rebuild failed; deleted {new_index}'))
+            raise
+        set_reindex_target(None)
+        self.stdout.write(self.style.SUCCESS(
+            f'Swapped alias {elasticsearch_config.REGULATION_INDEX} onto {new_index} ({result.indexed} regulations)'
+        ))
+
+        for index in delete_old_regulation_indices(keep=options['keep']):
+            self.stdout.write(f'Deleted old index {index}')
+
+        self.stdout.write(self.style.SUCCESS('Successfully reindexed all regulations'))
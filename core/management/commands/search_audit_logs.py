@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.audit_archive import AuditQuery, iter_archived_records, iter_audit_records
+from core.db_routing import use_replica
+from core.exports import iter_ndjson
+
+class Command(BaseCommand):
+    help = 'Prints audit log entries from the database and the audit archive as NDJSON, newest first'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First day to include (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last day to include (YYYY-MM-DD)')
+        parser.add_argument('--user-id', type=int, help='Only entries recorded for this user')
+        parser.add_argument('--action-type', help='Only entries with this action type')
+        parser.add_argument('--target', help='Only entries for this object, as model or model:id (e.g. regulation:42)')
+        parser.add_argument(
+            '--archive-only',
+            action='store_true',
+            help='Only read the archive, not the database',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            start = timezone.make_aware(datetime.strptime(options['start'], '%Y-%m-%d')) if options['start'] else None
+            end = timezone.make_aware(datetime.strptime(options['end'], '%Y-%m-%d')) if options['end'] else None
+        except ValueError as e:
+            raise CommandError(f'Invalid date: {e}')
+
+        target_model, _, target_id = (options['target'] or '').partition(':')
+        if target_id and not target_id.isdigit():
+            raise CommandError(f'Invalid target id: {target_id}')
+
+        query = AuditQuery(
+            start=start,
+            # The end day is included
+            end=end + timedelta(days=1) if end else None,
+            user_id=options['user_id'],
+            action_type=options['action_type'],
+            target_model=target_model or None,
+            target_id=int(target_id) if target_id else None,
+        )
+        # Read-only, so a read replica can serve it
+        with use_replica():
+            records = iter_archived_records(query) if options['archive_only'] else iter_audit_records(query)
+            for chunk in iter_ndjson(records):
+                self.stdout.write(chunk, ending='')
@@ -0,0 +1,414 @@
+"""
+Prometheus metrics shared by every worker process.
+
+Each process counts in memory and writes its values to its own file in
+METRICS_DIR, at most every METRICS_FLUSH_INTERVAL seconds and when it exits.
+The /metrics endpoint adds up the files of every process and serves the
+totals in the Prometheus text format:
+
+    compliance_http_request_duration_seconds   histogram by URL name and method
+    compliance_http_responses_total            counter by URL name and status code
+    compliance_sql_queries_total               counter by URL name
+    compliance_elasticsearch_requests_total    counter
+    compliance_elasticsearch_failures_total    counter
+    compliance_search_fallbacks_total          counter by failed backend and method
+    compliance_search_cache_*_total            hits, misses and evictions
+    compliance_audit_log_queue_size            gauge, audit entries waiting to be written
+    compliance_search_cache_entries            gauge
+    compliance_search_index_outbox_rows        gauge, read from the database
+    compliance_search_index_outbox_dead_rows   gauge, dead-lettered outbox entries
+    compliance_unread_notifications            gauge, read from the database
+
+Counters of processes that have exited stay in the totals, so they never go
+down when a worker is replaced; per-process gauges only count live processes.
+A process that recorded nothing, such as most management commands, writes no
+file. When /metrics is served, the files of exited processes are merged into
+one EXITED_FILE, so the directory does not grow with every restart (not on
+platforms without fcntl, where the files are only summed). Clear METRICS_DIR
+when the service is deployed, before the workers start.
+
+Request metrics are recorded by core.middleware.PerformanceMiddleware from
+the timings of core/performance.py. Without METRICS_DIR each process serves
+only its own values.
+"""
+import atexit
+import glob
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def load_settings():
+    global METRICS_DIR, METRICS_FLUSH_INTERVAL, METRICS_TOKEN, METRICS_ALLOWED_IPS
+    METRICS_DIR = getattr(settings, 'METRICS_DIR', None)
+    METRICS_FLUSH_INTERVAL = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+    # Bearer token that lets a scraper read /metrics without logging in; empty disables it
+    METRICS_TOKEN = getattr(settings, 'METRICS_TOKEN', '')
+    # Addresses that may read /metrics without a token; behind a reverse proxy every
+    # request comes from the proxy, so only list addresses that reach the server directly
+    METRICS_ALLOWED_IPS = getattr(settings, 'METRICS_ALLOWED_IPS', [])
+
+
+load_settings()
+
+# Counters of exited processes, merged from their files
+EXITED_FILE = 'exited.json'
+COMPACT_LOCK_FILE = 'compact.lock'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Metric name -> (type, help)
+METRICS = {
+    'compliance_http_request_duration_seconds': ('histogram', 'Time to produce a response, by URL name.'),
+    'compliance_http_responses_total': ('counter', 'Responses by URL name and status code.'),
+    'compliance_sql_queries_total': ('counter', 'SQL queries run while handling requests, by URL name.'),
+    'compliance_elasticsearch_requests_total': ('counter', 'Requests sent to Elasticsearch.'),
+    'compliance_elasticsearch_failures_total': ('counter', 'Elasticsearch requests that raised an error.'),
+    'compliance_search_fallbacks_total': ('counter', 'Searches that fell through to the next search backend.'),
+    'compliance_search_cache_hits_total': ('counter', 'Search result cache hits.'),
+    'compliance_search_cache_misses_total': ('counter', 'Search result cache misses.'),
+    'compliance_search_cache_evictions_total': ('counter', 'Search result cache evictions.'),
+    'compliance_audit_log_queue_size': ('gauge', 'Audit log entries queued and not yet written.'),
+    'compliance_search_cache_entries': ('gauge', 'Entries in the search result caches.'),
+    'compliance_search_index_outbox_rows': ('gauge', 'Search index changes waiting in the outbox.'),
+    'compliance_search_index_outbox_dead_rows': ('gauge', 'Outbox entries dead-lettered after repeated rejections.'),
+    'compliance_unread_notifications': ('gauge', 'Unread notifications of all users.'),
+}
+
+
+def _labels(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _sample_line(name, labels, value):
+    if labels:
+        name += '{' + ','.join(f'{key}="{_escape(label)}"' for key, label in labels) + '}'
+    return f'{name} {_format_value(value)}'
+
+
+def _read_json(path):
+    try:
+        with open(path, encoding='utf-8') as metrics_file:
+            return json.load(metrics_file)
+    except (OSError, ValueError):
+        # Removed while it was being read, or never written
+        return None
+
+
+def _write_json(path, data):
+    # Readers must never see a half-written file; each thread writes its own temporary file
+    temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as metrics_file:
+        json.dump(data, metrics_file)
+    os.replace(temporary, path)
+
+
+def _started(path):
+    # Process files are named {pid}-{start time in ns}.json
+    try:
+        return int(os.path.basename(path).rsplit('.', 1)[0].split('-')[1])
+    except (IndexError, ValueError):
+        return 0
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MetricsRegistry:
+    """Counters and histograms of this process, and the merged view of all processes."""
+
+    def __init__(self, directory=METRICS_DIR, flush_interval=METRICS_FLUSH_INTERVAL):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pid = None
+        self._reset()
+        atexit.register(self.flush, force=True)
+
+    def _reset(self):
+        # (sample name, labels) -> value
+        self._counters = defaultdict(float)
+        self._flushed_at = time.monotonic()
+        self._pid = os.getpid()
+        self._path = self._file_path()
+
+    def _file_path(self):
+        # The start time keeps a reused process id from overwriting an exited process's counters
+        return os.path.join(self.directory, f'{self._pid}-{time.time_ns()}.json') if self.directory else None
+
+    def configure(self, directory, flush_interval):
+        """Write to another directory from now on; values recorded so far are kept."""
+        with self._lock:
+            self.directory = directory
+            self.flush_interval = flush_interval
+            self._path = self._file_path()
+
+    def _check_fork(self):
+        # A forked worker must not report the counts it inherited from its parent a second time
+        if os.getpid() != self._pid:
+            self._reset()
+
+    def inc(self, name, labels=None, amount=1):
+        with self._lock:
+            self._check_fork()
+            self._counters[(name, _labels(labels))] += amount
+
+    def observe(self, name, value, labels=None):
+        """Record value in histogram name; buckets are cumulative, as Prometheus expects."""
+        labels = _labels(labels)
+        with self._lock:
+            self._check_fork()
+            for bound in LATENCY_BUCKETS:
+                if value <= bound:
+                    self._counters[(f'{name}_bucket', labels + (('le', _format_value(bound)),))] += 1
+            self._counters[(f'{name}_bucket', labels + (('le', '+Inf'),))] += 1
+            self._counters[(f'{name}_sum', labels)] += value
+            self._counters[(f'{name}_count', labels)] += 1
+
+    def snapshot(self):
+        """Return this process's counters and gauges as JSON-serializable lists."""
+        with self._lock:
+            self._check_fork()
+            counters = [[name, list(labels), value] for (name, labels), value in self._counters.items()]
+        counters.extend([name, [], value] for name, value in process_counters().items())
+        gauges = [[name, [], value] for name, value in process_gauges().items()]
+        return {'pid': self._pid, 'counters': counters, 'gauges': gauges}
+
+    def flush(self, force=False):
+        """Write this process's values to its file, at most every flush_interval seconds unless forced."""
+        if not self.directory or (not force and time.monotonic() - self._flushed_at < self.flush_interval):
+            return
+        self._flushed_at = time.monotonic()
+        snapshot = self.snapshot()
+        if not any(value for _, _, value in snapshot['counters']):
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            _write_json(self._path, snapshot)
+        except OSError:
+            # Metrics must never fail the request that happens to flush them
+            logger.exception('Could not write metrics to %s', self._path)
+
+    def _process_files(self):
+        """Return {path: snapshot} of the other processes' files."""
+        snapshots = {}
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            if path == self._path or os.path.basename(path) == EXITED_FILE:
+                continue
+            snapshot = _read_json(path)
+            if snapshot is not None:
+                snapshots[path] = snapshot
+        return snapshots
+
+    def _live_paths(self, snapshots):
+        """Paths of the files of running processes: the newest file of each live process id."""
+        newest = {}
+        for path, snapshot in snapshots.items():
+            pid = snapshot['pid']
+            if pid not in newest or _started(path) > _started(newest[pid]):
+                newest[pid] = path
+        # Older files of a reused process id, this process's included, belong to exited processes
+        return {path for pid, path in newest.items() if pid != os.getpid() and _is_alive(pid)}
+
+    def compact(self):
+        """Merge the files of exited processes into EXITED_FILE and remove them."""
+        if not self.directory or fcntl is None:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, COMPACT_LOCK_FILE), 'a') as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # Another process is compacting
+                    return
+                self._merge_exited()
+        except OSError:
+            logger.exception('Could not compact the metrics in %s', self.directory)
+
+    def _merge_exited(self):
+        snapshots = self._process_files()
+        live = self._live_paths(snapshots)
+        exited_paths = [path for path in snapshots if path not in live]
+        if not exited_paths:
+            return
+        exited_file = os.path.join(self.directory, EXITED_FILE)
+        exited = _read_json(exited_file) or {}
+        # Files merged before but not removed, e.g. by a compaction that was interrupted
+        merged = {name for name in exited.get('merged', []) if os.path.exists(os.path.join(self.directory, name))}
+        counters = defaultdict(float)
+        for name, labels, value in exited.get('counters', []):
+            counters[(name, tuple(tuple(label) for label in labels))] += value
+        for path in exited_paths:
+            if os.path.basename(path) in merged:
+                continue
+            for name, labels, value in snapshots[path]['counters']:
+                counters[(name, tuple(tuple(label) for label in labels))] += value
+            merged.add(os.path.basename(path))
+        _write_json(exited_file, {
+            'pid': None,
+            'counters': [[name, [list(label) for label in labels], value] for (name, labels), value in counters.items()],
+            'gauges': [],
+            'merged': sorted(merged),
+        })
+        for path in exited_paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def collect(self):
+        """Return {sample name: {labels: value}} summed over every process, with the database gauges."""
+        samples = defaultdict(lambda: defaultdict(float))
+
+        def add(values):
+            for name, labels, value in values:
+                samples[name][tuple(tuple(label) for label in labels)] += value
+
+        if self.directory:
+            self.flush(force=True)
+            self.compact()
+        own = self.snapshot()
+        add(own['counters'])
+        add(own['gauges'])
+        if self.directory:
+            snapshots = self._process_files()
+            live = self._live_paths(snapshots)
+            # Read after the process files: a file merged in the meantime is then listed here
+            exited = _read_json(os.path.join(self.directory, EXITED_FILE)) or {}
+            merged = set(exited.get('merged', []))
+            for path, snapshot in snapshots.items():
+                if os.path.basename(path) in merged:
+                    continue
+                add(snapshot['counters'])
+                if path in live:
+                    add(snapshot['gauges'])
+            add(exited.get('counters', []))
+        for name, value in database_gauges().items():
+            samples[name][()] = value
+        return samples
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        samples = self.collect()
+        lines = []
+        for name, (metric_type, help_text) in METRICS.items():
+            names = [f'{name}_bucket', f'{name}_sum', f'{name}_count'] if metric_type == 'histogram' else [name]
+            if not any(samples.get(sample_name) for sample_name in names):
+                continue
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for sample_name in names:
+                for labels, value in sorted(samples.get(sample_name, {}).items(), key=_bucket_order):
+                    lines.append(_sample_line(sample_name, labels, value))
+        return '\n'.join(lines) + '\n'
+
+
+def _bucket_order(item):
+    # Buckets in increasing order of their bound, as the text format requires
+    labels = dict(item[0])
+    bound = labels.pop('le', None)
+    return (sorted(labels.items()), float('inf') if bound == '+Inf' else float(bound or 0))
+
+
+def process_counters():
+    """Counters this process keeps elsewhere, reported with their current values."""
+    from .search_cache import search_result_cache
+
+    # Not stats(): that reads the index generation from the database
+    return {
+        'compliance_search_cache_hits_total': search_result_cache.hits,
+        'compliance_search_cache_misses_total': search_result_cache.misses,
+        'compliance_search_cache_evictions_total': search_result_cache.evictions,
+    }
+
+
+def process_gauges():
+    from .audit import BufferedAuditLogWriter, _writer
+    from .search_cache import search_result_cache
+
+    return {
+        # Only look at a writer this process already has; reading must not start one
+        'compliance_audit_log_queue_size': (
+            _writer.queue.qsize() if isinstance(_writer, BufferedAuditLogWriter) else 0
+        ),
+        'compliance_search_cache_entries': len(search_result_cache._entries),
+    }
+
+
+def database_gauges():
+    """Gauges that are the same for every process, read when the metrics are served."""
+    from django.db.models import Sum
+
+    from .indexing import dead_outbox_entries
+    from .models import SearchIndexOutbox, User
+
+    return {
+        'compliance_search_index_outbox_rows': SearchIndexOutbox.objects.count(),
+        'compliance_search_index_outbox_dead_rows': dead_outbox_entries().count(),
+        'compliance_unread_notifications': (
+            User.objects.aggregate(total=Sum('unread_notification_count'))['total'] or 0
+        ),
+    }
+
+
+registry = MetricsRegistry()
+
+
+@receiver(setting_changed)
+def reload_metrics_settings(setting, **kwargs):
+    """Read the settings again when one of them is overridden, e.g. with override_settings."""
+    if setting.startswith('METRICS_'):
+        load_settings()
+        registry.configure(METRICS_DIR, METRICS_FLUSH_INTERVAL)
+
+
+def scraper_allowed(request):
+    """Whether request may read the metrics without an admin login: METRICS_TOKEN or METRICS_ALLOWED_IPS."""
+    authorization = request.headers.get('Authorization', '')
+    if METRICS_TOKEN and authorization.startswith('Bearer '):
+        return hmac.compare_digest(authorization[len('Bearer '):].encode(), METRICS_TOKEN.encode())
+    return request.META.get('REMOTE_ADDR') in METRICS_ALLOWED_IPS
+
+
+def record_request(request, response, timings):
+    """Record a finished request's latency, status and query count."""
+    match = getattr(request, 'resolver_match', None)
+    view = (match.view_name if match else None) or 'unmatched'
+    registry.observe('compliance_http_request_duration_seconds', timings.total, {'view': view, 'method': request.method})
+    registry.inc('compliance_http_responses_total', {'view': view, 'status': str(response.status_code)})
+    if timings.counts['sql']:
+        registry.inc('compliance_sql_queries_total', {'view': view}, timings.counts['sql'])
+    registry.flush()
@@ -1,7 +1,10 @@
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils import timezone
 from django.utils.deprecation import MiddlewareMixin
-from django.urls import resolve
+from . import db_routing, metrics, performance
+from .audit import audit_target, get_audit_writer
 from .models import AuditLog
-import json
+from .system_settings import system_settings
 
 class AuditLogMiddleware(MiddlewareMixin):
     """
@@ -9,8 +12,8 @@ class AuditLogMiddleware(MiddlewareMixin):
     """
     
     def __init__(self, get_response):
-        self.get_response = get_response
-        self.async_mode = False
+        # MiddlewareMixin detects whether get_response is async, so the middleware works under ASGI
+        super().__init__(get_response)
         # Exclude these URLs from logging
         self.excluded_urls = [
             '/admin/jsi18n/',
@@ -18,6 +21,8 @@ class AuditLogMiddleware(MiddlewareMixin):
             '/media/',
             '/favicon.ico',
             '/get_notifications/',
+            '/notifications/stream/',
+            '/metrics',
         ]
         # Exclude these extensions from logging
         self.excluded_extensions = ['.js', '.css', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico']
@@ -43,8 +48,8 @@ class AuditLogMiddleware(MiddlewareMixin):
         if not self._should_log(request) or not request.user.is_authenticated:
             return None
         
-        # Get URL name
-        url_name = resolve(request.path_info).url_name
+        # The request has already been resolved by the time process_view runs
+        url_name = request.resolver_match.url_name or ''
         
         # Determine action type based on request method and URL
         if 'login' in url_name:
@@ -62,28 +67,31 @@ class AuditLogMiddleware(MiddlewareMixin):
         else:
             action_type = request.method.lower()
         
-        # Collect details for the log
-        action_details = {
-            'url': request.path,
-            'method': request.method,
-            'url_name': url_name,
-        }
-        
         # Add request parameters (safely)
+        payload = {}
         if request.method == 'GET':
-            action_details['params'] = dict(request.GET.items())
+            payload['params'] = dict(request.GET.items())
         elif request.method == 'POST':
             # Only log POST data for non-sensitive forms
             if 'password' not in request.POST and 'csrfmiddlewaretoken' not in request.POST:
-                action_details['data'] = dict(request.POST.items())
+                payload['data'] = dict(request.POST.items())
+        
+        target_model, target_id = audit_target(request.resolver_match)
         
-        # Create the audit log entry
-        AuditLog.objects.create(
-            user=request.user,
-            action_type=action_type,
-            action_details=json.dumps(action_details),
-            ip_address=self.get_client_ip(request)
-        )
+        # Hand the entry to the audit writer (buffered or synchronous)
+        with performance.timed('audit'):
+            get_audit_writer().write(AuditLog(
+                user=request.user,
+                action_type=action_type,
+                action_details=f'{request.method} {request.path}',
+                timestamp=timezone.now(),
+                ip_address=self.get_client_ip(request),
+                url_name=url_name,
+                method=request.method,
+                target_model=target_model,
+                target_id=target_id,
+                payload=payload,
+            ))
         
         return None
     
@@ -93,4 +101,72 @@ class AuditLogMiddleware(MiddlewareMixin):
             ip = x_forwarded_for.split(',')[0]
         else:
             ip = request.META.get('REMOTE_ADDR')
-        return ip 
\ No newline at end of file
+        return ip 
+
+class SystemSettingsMiddleware(MiddlewareMixin):
+    """
+    Refresh the cached SystemSetting values at most once per request.
+    """
+    
+    def process_request(self, request):
+        system_settings.check()
+        return None
+
+class PerformanceMiddleware(MiddlewareMixin):
+    """
+    Time each request's SQL, Elasticsearch, template and audit log phases.
+
+    The timings are sent to admins in a Server-Timing header, and requests
+    slower than SLOW_REQUEST_THRESHOLD_MS are written to the slow request log
+    (see core/performance.py). Latency and query counts are also recorded in the
+    metrics served at /metrics (core/metrics.py). Keep this first in MIDDLEWARE so the total covers
+    the other middleware too.
+    """
+    
+    def __init__(self, get_response):
+        if not performance.PERFORMANCE_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+    
+    def process_request(self, request):
+        request._performance_timings, request._performance_wrappers = performance.start_request()
+        return None
+    
+    def process_response(self, request, response):
+        timings = getattr(request, '_performance_timings', None)
+        if timings is None:
+            return response
+        performance.finish_request(timings, request._performance_wrappers)
+        if performance.shows_server_timing(request):
+            response['Server-Timing'] = timings.server_timing()
+        if timings.total_ms >= performance.SLOW_REQUEST_THRESHOLD_MS:
+            performance.log_slow_request(request, response, timings)
+        metrics.record_request(request, response, timings)
+        return response
+
+class ReplicaRoutingMiddleware(MiddlewareMixin):
+    """
+    Keep a user's reads on the primary database for a while after they write.
+    
+    Requests that write set a short-lived cookie; while it is present, views
+    marked for replica reads use the primary too (see core/db_routing.py).
+    Not used when no replica is configured.
+    """
+    
+    def __init__(self, get_response):
+        if not db_routing.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+    
+    def process_request(self, request):
+        db_routing.start_request(pinned=db_routing.REPLICA_PIN_COOKIE in request.COOKIES)
+        return None
+    
+    def process_response(self, request, response):
+        state = db_routing.finish_request()
+        if state is not None and state.wrote:
+            response.set_cookie(
+                db_routing.REPLICA_PIN_COOKIE, '1', max_age=db_routing.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+def populate_rollup(apps, schema_editor):
+    # Get the historical models
+    ComplianceStatus = apps.get_model('core', 'ComplianceStatus')
+    DepartmentComplianceRollup = apps.get_model('core', 'DepartmentComplianceRollup')
+    
+    # Count existing statuses per department, regulation and status in one query
+    counts = (
+        ComplianceStatus.objects
+        .values('department_id', 'article__regulation_id', 'status')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    DepartmentComplianceRollup.objects.bulk_create(
+        (
+            DepartmentComplianceRollup(
+                department_id=row['department_id'],
+                regulation_id=row['article__regulation_id'],
+                status=row['status'],
+                count=row['count'],
+            )
+            for row in counts.iterator()
+        ),
+        batch_size=1000,
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_auditlog_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DepartmentComplianceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('compliant', 'Compliant'), ('partially_compliant', 'Partially Compliant'), ('non_compliant', 'Non-Compliant'), ('not_applicable', 'Not Applicable')], max_length=50)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='compliance_rollups', to='core.department')),
+                ('regulation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='compliance_rollups', to='core.regulation')),
+            ],
+            options={
+                'unique_together': {('department', 'regulation', 'status')},
+            },
+        ),
+        migrations.RunPython(populate_rollup, migrations.RunPython.noop),
+    ]
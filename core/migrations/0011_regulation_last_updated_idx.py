@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_search_index_outbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='regulation',
+            index=models.Index(fields=['-last_updated', '-id'], name='regulation_last_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:41
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+def populate_unread_counts(apps, schema_editor):
+    # Get the historical models
+    User = apps.get_model('core', 'User')
+    Notification = apps.get_model('core', 'Notification')
+    
+    # Count every user's unread notifications in a single UPDATE
+    unread = (
+        Notification.objects.filter(recipient=OuterRef('pk'), read=False)
+        .values('recipient').annotate(count=Count('id')).values('count')
+    )
+    User.objects.update(
+        unread_notification_count=Coalesce(Subquery(unread, output_field=IntegerField()), 0)
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_regulation_last_updated_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='unread_notification_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of unread notifications; maintained by core.notifications'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', 'read', '-created_at'], name='notification_unread_idx'),
+        ),
+        migrations.RunPython(populate_unread_counts, migrations.RunPython.noop),
+    ]
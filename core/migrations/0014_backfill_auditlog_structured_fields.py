@@ -0,0 +1,67 @@
+import json
+
+from django.db import migrations, transaction
+from django.urls import Resolver404, resolve
+
+BATCH_SIZE = 2000
+
+def parse_target(url):
+    # Same rules as core.audit.audit_target, applied to the logged path
+    try:
+        match = resolve(url)
+    except Resolver404:
+        return '', None
+    kwargs = match.kwargs
+    if match.namespace == 'admin' and 'object_id' in kwargs:
+        parts = (match.url_name or '').split('_')
+        model, value = (parts[1] if len(parts) >= 3 else ''), kwargs['object_id']
+    else:
+        model, value = next(((key[:-3], value) for key, value in kwargs.items() if key.endswith('_id')), ('', None))
+    try:
+        return model, int(value)
+    except (TypeError, ValueError):
+        return model, None
+
+def backfill_structured_fields(apps, schema_editor):
+    # Get the historical model
+    AuditLog = apps.get_model('core', 'AuditLog')
+
+    # Entries written by AuditLogMiddleware stored a JSON object in action_details.
+    # Walk them in primary key order, one transaction per batch, so the table is
+    # never locked for long and an interrupted run can simply be restarted.
+    entries = AuditLog.objects.filter(method='', action_details__startswith='{').order_by('id')
+    last_id = 0
+    while True:
+        batch = list(entries.filter(id__gt=last_id).only('id', 'action_details')[:BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1].id
+        updated = []
+        for entry in batch:
+            try:
+                details = json.loads(entry.action_details)
+            except ValueError:
+                continue
+            if not isinstance(details, dict) or 'method' not in details:
+                continue
+            entry.url_name = details.get('url_name') or ''
+            entry.method = details['method'][:10]
+            entry.target_model, entry.target_id = parse_target(details.get('url') or '')
+            entry.payload = {key: details[key] for key in ('params', 'data') if key in details}
+            updated.append(entry)
+        with transaction.atomic():
+            AuditLog.objects.bulk_update(
+                updated, ['url_name', 'method', 'target_model', 'target_id', 'payload'], batch_size=500
+            )
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own
+    atomic = False
+
+    dependencies = [
+        ('core', '0013_auditlog_structured_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_structured_fields, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+import re
+
+from django.db import migrations
+
+# Same format as core.references.REFERENCE_PATTERN
+REFERENCE_PATTERN = re.compile(r'^(?P<prefix>[A-Za-z]+)-(?P<year>\d{4})-(?P<number>\d+)$')
+
+def seed_reference_sequences(apps, schema_editor):
+    # Get the historical models
+    Regulation = apps.get_model('core', 'Regulation')
+    RegulationReferenceSequence = apps.get_model('core', 'RegulationReferenceSequence')
+
+    # Start every sequence after the highest number already used. The numbers are
+    # compared as integers: the string maximum of REG-2024-999 and REG-2024-1000 is the former.
+    last_values = {}
+    for reference in Regulation.objects.values_list('reference', flat=True).iterator():
+        match = REFERENCE_PATTERN.match(reference)
+        if not match:
+            continue
+        key = (match['prefix'], int(match['year']))
+        last_values[key] = max(last_values.get(key, 0), int(match['number']))
+
+    RegulationReferenceSequence.objects.bulk_create([
+        RegulationReferenceSequence(prefix=prefix, year=year, last_value=last_value)
+        for (prefix, year), last_value in last_values.items()
+    ])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_regulationreferencesequence'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_reference_sequences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_seed_regulation_reference_sequences'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchindexoutbox',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='searchindexoutbox',
+            name='available_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='searchindexoutbox',
+            name='last_error',
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_searchindexgeneration'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='regulation',
+            name='reference',
+            field=models.CharField(blank=True, help_text='Unique reference number for the regulation', max_length=50, unique=True),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 
@@ -22,6 +22,10 @@ class User(AbstractUser):
     
     role = models.CharField(max_length=50, choices=ROLE_CHOICES, default='dept_maker')
     departments = models.ManyToManyField(Department, related_name='users', blank=True)
+    unread_notification_count = models.PositiveIntegerField(
+        default=0, editable=False,
+        help_text="Number of unread notifications; maintained by core.notifications"
+    )
     
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.email})"
@@ -47,7 +51,8 @@ class Regulation(models.Model):
     ]
     
     name = models.CharField(max_length=200)
-    reference = models.CharField(max_length=50, unique=True, help_text="Unique reference number for the regulation", default='REG-2024-001')
+    # Left blank, a new regulation gets the next reference of its year's sequence (see core.references)
+    reference = models.CharField(max_length=50, unique=True, blank=True, help_text="Unique reference number for the regulation")
     description = models.TextField()
     date_created = models.DateTimeField(auto_now_add=True)
     last_updated = models.DateTimeField(auto_now=True)
@@ -59,9 +64,74 @@ class Regulation(models.Model):
     effective_date = models.DateField(null=True, blank=True, help_text="Date when the regulation becomes effective")
     expiry_date = models.DateField(null=True, blank=True, help_text="Date when the regulation expires")
     
+    class Meta:
+        indexes = [
+            # Serves the keyset-paginated regulation listing
+            models.Index(fields=['-last_updated', '-id'], name='regulation_last_updated_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.reference} - {self.name}"
 
+class RegulationReferenceSequence(models.Model):
+    """
+    The last number handed out for regulation references with a prefix and year.
+    
+    References are allocated by core.references with an atomic increment of
+    last_value, so concurrent makers never get the same number.
+    """
+    prefix = models.CharField(max_length=20)
+    year = models.PositiveIntegerField()
+    last_value = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['prefix', 'year']
+    
+    def __str__(self):
+        return f"{self.prefix}-{self.year}: {self.last_value}"
+
+class SearchIndexOutbox(models.Model):
+    """
+    A pending search index change for a regulation.
+    
+    Rows are written by core.signals in the same transaction as the change
+    that caused them and drained by the process_search_outbox command.
+    Entries that Elasticsearch rejected SEARCH_OUTBOX_MAX_ATTEMPTS times are
+    dead-lettered: they stay in the table, with the last error, but are
+    skipped until process_search_outbox --retry-dead is run.
+    """
+    ACTION_CHOICES = [
+        ('index', 'Index'),
+        ('delete', 'Delete'),
+    ]
+    
+    # Not a foreign key: delete entries must outlive the regulation
+    regulation_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES, default='index')
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # Not processed before this time: claimed by a worker, or waiting to be retried
+    available_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name_plural = 'Search index outbox'
+    
+    def __str__(self):
+        return f"{self.action} regulation {self.regulation_id}"
+
+class SearchIndexGeneration(models.Model):
+    """
+    Counter bumped whenever the search index or the data it is built from changes.
+    
+    A single row shared by every process; core.search_cache tags its cached
+    results with the value and treats results from an older one as stale.
+    """
+    value = models.BigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"Search index generation {self.value}"
+
 class Article(models.Model):
     TYPE_CHOICES = [
         ('regulation', 'Regulation'),
@@ -107,6 +177,29 @@ class ComplianceStatus(models.Model):
     
     def __str__(self):
         return f"{self.article} - {self.department} - {self.status}"
+    
+    def save(self, *args, **kwargs):
+        # Keep the row and its DepartmentComplianceRollup update (see signals) in one transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+class DepartmentComplianceRollup(models.Model):
+    """
+    Number of ComplianceStatus rows per department, regulation and status.
+    
+    Maintained incrementally by core.signals; rebuild and verify it with the
+    rebuild_compliance_rollup management command.
+    """
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='compliance_rollups')
+    regulation = models.ForeignKey(Regulation, on_delete=models.CASCADE, related_name='compliance_rollups')
+    status = models.CharField(max_length=50, choices=ComplianceStatus.STATUS_CHOICES)
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['department', 'regulation', 'status']
+    
+    def __str__(self):
+        return f"{self.department} - {self.regulation.reference} - {self.status}: {self.count}"
 
 class AuditLog(models.Model):
     ACTION_CHOICES = [
@@ -121,8 +214,23 @@ class AuditLog(models.Model):
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     action_type = models.CharField(max_length=50, choices=ACTION_CHOICES)
     action_details = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the entry is recorded, not when a buffered batch is flushed
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
+    url_name = models.CharField(max_length=200, blank=True, default='')
+    method = models.CharField(max_length=10, blank=True, default='')
+    # The object the action was performed on, e.g. ('regulation', 42)
+    target_model = models.CharField(max_length=100, blank=True, default='')
+    target_id = models.PositiveBigIntegerField(null=True, blank=True)
+    payload = models.JSONField(default=dict, blank=True, help_text="Request parameters or form data")
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['timestamp'], name='auditlog_timestamp_idx'),
+            models.Index(fields=['user', 'timestamp'], name='auditlog_user_timestamp_idx'),
+            models.Index(fields=['action_type', 'timestamp'], name='auditlog_action_timestamp_idx'),
+            models.Index(fields=['target_model', 'target_id', 'timestamp'], name='auditlog_target_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user} - {self.action_type} - {self.timestamp}"
@@ -135,8 +243,23 @@ class Notification(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     related_regulation = models.ForeignKey(Regulation, on_delete=models.SET_NULL, null=True, blank=True)
     
+    class Meta:
+        indexes = [
+            # Serves a user's unread notifications, newest first
+            models.Index(fields=['recipient', 'read', '-created_at'], name='notification_unread_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.recipient} - {self.title} - {self.created_at}"
+    
+    def save(self, *args, **kwargs):
+        # Keep the row and its recipient's unread counter update (see signals) in one transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
 
 class NotificationTemplate(models.Model):
     name = models.CharField(max_length=100)
@@ -164,3 +287,15 @@ class SystemSetting(models.Model):
     
     def __str__(self):
         return self.setting_key
+
+class SystemSettingsVersion(models.Model):
+    """
+    Counter bumped whenever a SystemSetting is saved or deleted.
+    
+    A single row shared by every process; core.system_settings reloads its
+    cached settings when the value differs from the one it loaded.
+    """
+    value = models.BigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"System settings version {self.value}"
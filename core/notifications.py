@@ -0,0 +1,320 @@
+"""
+Live notification delivery.
+
+Browsers open a Server-Sent Events stream (``notification_stream`` view)
+instead of polling ``get_notifications``. Each stream subscribes to an
+in-process pub/sub broker; creating a Notification publishes it to the
+broker once the transaction commits, and the stream forwards it to the
+recipient's open tabs. An idle stream sends a keep-alive comment every
+NOTIFICATION_STREAM_HEARTBEAT seconds and touches the database only once per
+NOTIFICATION_STREAM_RESYNC seconds, to pick up notifications created by other
+worker processes.
+
+Every event carries the notification id as its SSE id, so a reconnecting
+browser resumes from its Last-Event-ID without losing or repeating events.
+
+The stream is served by the ASGI application (compliance_platform/asgi.py).
+Under WSGI an async stream cannot be served incrementally, so the view
+answers 501 and the dashboard shows new notifications only when reloaded.
+
+Notifications for whole departments are created by fan_out_notifications():
+recipients are resolved with one join, the NotificationTemplate for the event
+is rendered once through a cache of compiled templates, and the rows are
+inserted with chunked bulk_create.
+
+Every user's unread count is kept in User.unread_notification_count, updated
+in the same transaction as the notifications it counts, so badges never have
+to count Notification rows.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.template import Context, Template
+
+from .models import Notification, NotificationTemplate, User
+
+# Seconds between keep-alive comments on an idle stream
+NOTIFICATION_STREAM_HEARTBEAT = getattr(settings, 'NOTIFICATION_STREAM_HEARTBEAT', 15)
+
+# Seconds between database catch-up queries on a stream
+NOTIFICATION_STREAM_RESYNC = getattr(settings, 'NOTIFICATION_STREAM_RESYNC', 60)
+
+# Events buffered per stream before it falls back to a catch-up query
+NOTIFICATION_STREAM_QUEUE_SIZE = 100
+
+# Maximum notifications sent by one catch-up query
+NOTIFICATION_CATCH_UP_LIMIT = 100
+
+# Rows per INSERT when fanning a notification out to many recipients
+NOTIFICATION_FAN_OUT_CHUNK_SIZE = getattr(settings, 'NOTIFICATION_FAN_OUT_CHUNK_SIZE', 1000)
+
+# NotificationTemplate.event_type values raised by the platform
+EVENT_REGULATION_ACTION_REQUIRED = 'regulation_action_required'
+
+# Subject and body used when no active NotificationTemplate exists for an event
+DEFAULT_NOTIFICATION_TEMPLATES = {
+    EVENT_REGULATION_ACTION_REQUIRED: (
+        'Action required: {{ regulation.reference }}',
+        'Regulation {{ regulation.reference }} - {{ regulation.name }} requires action from your department.',
+    ),
+}
+
+
+def notification_event(notification):
+    """Serialize a notification as the payload of a stream event."""
+    return {
+        'id': notification.id,
+        'title': notification.title,
+        'message': notification.message,
+        'created_at': notification.created_at.strftime('%Y-%m-%d %H:%M'),
+        'related_regulation_id': notification.related_regulation_id,
+    }
+
+
+class Subscription:
+    """One open stream: a bounded queue of events for a user, owned by an event loop."""
+
+    def __init__(self, user_id, loop, max_queued=NOTIFICATION_STREAM_QUEUE_SIZE):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(max_queued)
+        self.overflowed = False
+
+    def put(self, event):
+        # Runs on the subscription's event loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Events are dropped; the stream re-reads them from the database
+            self.overflowed = True
+
+
+class NotificationBroker:
+    """In-process publish/subscribe of notification events, keyed by recipient."""
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        """Register a stream for the user; must be called from its event loop."""
+        subscription = Subscription(user_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def publish(self, user_id, event):
+        """Deliver an event to the user's open streams. Safe to call from any thread."""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                # The stream's event loop has been closed
+                self.unsubscribe(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+
+broker = NotificationBroker()
+
+
+def adjust_unread_counts(deltas):
+    """Apply a Counter of {user_id: delta} to unread counters, with one UPDATE per distinct delta."""
+    users_by_delta = defaultdict(list)
+    for user_id, delta in deltas.items():
+        if delta:
+            users_by_delta[delta].append(user_id)
+    for delta, user_ids in users_by_delta.items():
+        User.objects.filter(id__in=user_ids).update(
+            unread_notification_count=Greatest(F('unread_notification_count') + delta, Value(0))
+        )
+
+
+def mark_notifications_read(user, notification_ids=None):
+    """
+    Mark the user's notifications read with a single UPDATE; all of them unless ids are given.
+
+    Returns the number of notifications that were unread.
+    """
+    with transaction.atomic():
+        notifications = Notification.objects.filter(recipient=user, read=False)
+        if notification_ids is not None:
+            notifications = notifications.filter(id__in=notification_ids)
+        # Only rows this UPDATE flips are subtracted, so concurrent requests cannot double count
+        updated = notifications.update(read=True)
+        adjust_unread_counts(Counter({user.pk: -updated}))
+    return updated
+
+
+def recount_unread_notifications():
+    """Recompute every user's unread counter from the Notification table in one UPDATE."""
+    unread = (
+        Notification.objects.filter(recipient=OuterRef('pk'), read=False)
+        .values('recipient').annotate(count=Count('id')).values('count')
+    )
+    return User.objects.update(
+        unread_notification_count=Coalesce(Subquery(unread, output_field=IntegerField()), 0)
+    )
+
+
+def publish_notifications(notifications):
+    """Publish notifications to their recipients' streams once the current transaction commits."""
+    events = [(notification.recipient_id, notification_event(notification)) for notification in notifications]
+    if not events:
+        return
+
+    def publish():
+        for user_id, event in events:
+            broker.publish(user_id, event)
+
+    transaction.on_commit(publish)
+
+
+def format_event(event):
+    """Encode an event in the text/event-stream format."""
+    return f"id: {event['id']}\nevent: notification\ndata: {json.dumps(event)}\n\n"
+
+
+async def unread_events(user_id):
+    """Load the unread notifications a fresh stream starts with, oldest first."""
+    notifications = Notification.objects.filter(recipient_id=user_id, read=False).order_by('-id')
+    return [notification_event(notification) async for notification in notifications[:NOTIFICATION_CATCH_UP_LIMIT]][::-1]
+
+
+async def events_after(user_id, last_event_id):
+    """Load the notifications created after last_event_id, oldest first."""
+    notifications = Notification.objects.filter(recipient_id=user_id, id__gt=last_event_id).order_by('id')
+    return [notification_event(notification) async for notification in notifications[:NOTIFICATION_CATCH_UP_LIMIT]]
+
+
+async def latest_notification_id(user_id):
+    notification = await Notification.objects.filter(recipient_id=user_id).order_by('-id').only('id').afirst()
+    return notification.id if notification else 0
+
+
+async def notification_event_stream(user_id, last_event_id=None):
+    """Yield text/event-stream chunks for a user until the client disconnects."""
+    # Subscribe before querying so nothing created in between is missed
+    subscription = broker.subscribe(user_id)
+    try:
+        # Ask the browser to reconnect after 5 seconds if the connection drops
+        yield 'retry: 5000\n\n'
+        if last_event_id is None:
+            # A fresh stream starts with the unread notifications
+            last_event_id = await latest_notification_id(user_id)
+            pending = await unread_events(user_id)
+            for event in pending:
+                yield format_event(event)
+            last_event_id = max([last_event_id] + [event['id'] for event in pending])
+            pending = []
+        else:
+            pending = await events_after(user_id, last_event_id)
+
+        next_resync = time.monotonic() + NOTIFICATION_STREAM_RESYNC
+        while True:
+            for event in pending:
+                # Events can arrive both from the broker and from a catch-up query
+                if event['id'] > last_event_id:
+                    last_event_id = event['id']
+                    yield format_event(event)
+
+            try:
+                pending = [await asyncio.wait_for(subscription.queue.get(), NOTIFICATION_STREAM_HEARTBEAT)]
+            except asyncio.TimeoutError:
+                pending = []
+
+            if subscription.overflowed or time.monotonic() >= next_resync:
+                subscription.overflowed = False
+                next_resync = time.monotonic() + NOTIFICATION_STREAM_RESYNC
+                pending = await events_after(user_id, last_event_id)
+            elif not pending:
+                yield ': keep-alive\n\n'
+    finally:
+        broker.unsubscribe(subscription)
+
+
+@lru_cache(maxsize=256)
+def compile_template(source):
+    """Compile template source once; edited templates have new source and get a new entry."""
+    return Template(source)
+
+
+def render_template(source, context):
+    # Notifications are escaped when they are displayed, not when they are stored
+    return compile_template(source).render(Context(context, autoescape=False))
+
+
+def get_notification_template(event_type):
+    """Return the (subject, body) source for an event: the first active template, or the default."""
+    template = (
+        NotificationTemplate.objects.filter(event_type=event_type, active=True)
+        .order_by('id').values_list('subject', 'body').first()
+    )
+    return template or DEFAULT_NOTIFICATION_TEMPLATES[event_type]
+
+
+def regulation_recipient_ids(regulation):
+    """Ids of the active users in any department assigned to the regulation, resolved with one join."""
+    return (
+        User.objects.filter(is_active=True, departments__assigned_regulations=regulation)
+        .values_list('id', flat=True).distinct().order_by('id')
+    )
+
+
+def fan_out_notifications(regulation, event_type, recipient_ids=None, chunk_size=NOTIFICATION_FAN_OUT_CHUNK_SIZE):
+    """
+    Notify every recipient about an event on a regulation. Returns the number of notifications created.
+
+    recipient_ids defaults to the users of the regulation's assigned departments.
+    The template gets the regulation in its context and is rendered once for
+    all recipients.
+    """
+    subject, body = get_notification_template(event_type)
+    context = {'regulation': regulation}
+    title = render_template(subject, context)[:Notification._meta.get_field('title').max_length]
+    message = render_template(body, context)
+    if recipient_ids is None:
+        recipient_ids = regulation_recipient_ids(regulation).iterator(chunk_size=chunk_size)
+
+    created = 0
+    chunk = []
+    with transaction.atomic():
+        for recipient_id in recipient_ids:
+            chunk.append(Notification(
+                recipient_id=recipient_id, title=title, message=message, related_regulation=regulation,
+            ))
+            if len(chunk) >= chunk_size:
+                created += _create_notifications(chunk)
+                chunk = []
+        if chunk:
+            created += _create_notifications(chunk)
+    return created
+
+
+def _create_notifications(notifications):
+    # bulk_create does not send post_save, so count and publish here; rows whose id the
+    # database does not return are picked up by the streams' catch-up queries
+    notifications = Notification.objects.bulk_create(notifications)
+    adjust_unread_counts(Counter(notification.recipient_id for notification in notifications if not notification.read))
+    publish_notifications([notification for notification in notifications if notification.pk])
+    return len(notifications)
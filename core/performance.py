@@ -0,0 +1,267 @@
+"""
+Per-request performance instrumentation.
+
+core.middleware.PerformanceMiddleware times each request and the phases it
+spends its time in:
+
+    sql    queries on every database connection (connection.execute_wrapper)
+    es     Elasticsearch requests (elasticsearch_config.TimedElasticsearch)
+    tpl    template rendering (InstrumentedDjangoTemplates, the template backend)
+    audit  handing the request's audit entry to the audit writer
+
+The totals are sent back in a Server-Timing header, which browser developer
+tools show next to the request. The header only goes to admins unless
+SERVER_TIMING_PUBLIC is set, since it shows how long the backends take. Phases can overlap: a query run while a
+template renders counts towards both sql and tpl, and the insert of a
+synchronous audit writer towards both sql and audit.
+
+The settings are read again when they change, e.g. with override_settings.
+
+Requests slower than SLOW_REQUEST_THRESHOLD_MS are written to the
+'core.performance.slow_requests' logger as one JSON object per line, with
+the SLOW_REQUEST_TOP_SQL statements that took the most time and their EXPLAIN
+plans. EXPLAIN only plans a statement; it does not run it again.
+
+The cost for a request under the threshold is a few timer reads per query,
+Elasticsearch request and template, so the instrumentation stays on in
+production. Content of streaming responses is produced after the middleware
+has finished and is not included.
+"""
+import json
+import logging
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import DatabaseError, connections
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates
+
+
+def load_settings():
+    global PERFORMANCE_INSTRUMENTATION, SERVER_TIMING_PUBLIC
+    global SLOW_REQUEST_THRESHOLD_MS, SLOW_REQUEST_TOP_SQL, SLOW_REQUEST_EXPLAIN
+    PERFORMANCE_INSTRUMENTATION = getattr(settings, 'PERFORMANCE_INSTRUMENTATION', True)
+    # Send the Server-Timing header to every user, not only to admins
+    SERVER_TIMING_PUBLIC = getattr(settings, 'SERVER_TIMING_PUBLIC', False)
+    SLOW_REQUEST_THRESHOLD_MS = getattr(settings, 'SLOW_REQUEST_THRESHOLD_MS', 1000)
+    SLOW_REQUEST_TOP_SQL = getattr(settings, 'SLOW_REQUEST_TOP_SQL', 5)
+    SLOW_REQUEST_EXPLAIN = getattr(settings, 'SLOW_REQUEST_EXPLAIN', True)
+
+
+load_settings()
+
+
+@receiver(setting_changed)
+def reload_performance_settings(setting, **kwargs):
+    """Read the settings again when one of them is overridden, e.g. with override_settings."""
+    if setting in ('PERFORMANCE_INSTRUMENTATION', 'SERVER_TIMING_PUBLIC') or setting.startswith('SLOW_REQUEST_'):
+        load_settings()
+
+# Statements kept per request for the slow log; later ones are timed but not kept
+MAX_RECORDED_QUERIES = 1000
+
+# Server-Timing metric -> description
+PHASES = {
+    'sql': 'SQL',
+    'es': 'Elasticsearch',
+    'tpl': 'Templates',
+    'audit': 'Audit log',
+}
+
+slow_request_logger = logging.getLogger('core.performance.slow_requests')
+
+# Timings of the request being handled, for code that has no access to the request
+_current_timings = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """Time spent in each phase of one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = None
+        self.durations = defaultdict(float)
+        self.counts = defaultdict(int)
+        # (duration, database alias, sql, params) of the first MAX_RECORDED_QUERIES queries
+        self.queries = []
+
+    def add(self, phase, duration):
+        self.durations[phase] += duration
+        self.counts[phase] += 1
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+    @property
+    def total_ms(self):
+        return self.total * 1000
+
+    def server_timing(self):
+        """Return the Server-Timing header value."""
+        metrics = []
+        for phase, description in PHASES.items():
+            if phase == 'sql' or self.counts[phase]:
+                metrics.append(
+                    f'{phase};dur={self.durations[phase] * 1000:.1f};desc="{description} ({self.counts[phase]})"'
+                )
+        metrics.append(f'total;dur={self.total_ms:.1f}')
+        return ', '.join(metrics)
+
+    def top_queries(self, limit):
+        """Group the recorded queries by statement; return the limit groups with the most time."""
+        groups = {}
+        for duration, alias, sql, params in self.queries:
+            group = groups.get((alias, sql))
+            if group is None:
+                groups[(alias, sql)] = group = {
+                    'alias': alias, 'sql': sql, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'params': params,
+                }
+            group['count'] += 1
+            group['total_ms'] += duration * 1000
+            if duration * 1000 > group['max_ms']:
+                # EXPLAIN the slowest run of the statement
+                group['max_ms'] = duration * 1000
+                group['params'] = params
+        return sorted(groups.values(), key=lambda group: group['total_ms'], reverse=True)[:limit]
+
+
+@contextmanager
+def timed(phase):
+    """Add the time spent in the block to phase of the current request, if there is one."""
+    timings = _current_timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - started)
+
+
+class QueryTimer:
+    """connection.execute_wrapper that records each query's duration."""
+
+    def __init__(self, timings, alias):
+        self.timings = timings
+        self.alias = alias
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.timings.add('sql', duration)
+            if len(self.timings.queries) < MAX_RECORDED_QUERIES:
+                # executemany parameter lists can be huge and cannot be explained as one statement
+                self.timings.queries.append((duration, self.alias, sql, None if many else params))
+
+
+def start_request():
+    """Start timing a request. Returns (timings, query wrappers to pass to finish_request)."""
+    timings = RequestTimings()
+    _current_timings.set(timings)
+    wrappers = ExitStack()
+    for alias in connections:
+        wrappers.enter_context(connections[alias].execute_wrapper(QueryTimer(timings, alias)))
+    return timings, wrappers
+
+
+def finish_request(timings, wrappers):
+    """Stop timing the request started with start_request."""
+    wrappers.close()
+    # Not ContextVar.reset(): under ASGI the middleware's hooks run in different contexts
+    _current_timings.set(None)
+    timings.finish()
+
+
+def explain(alias, sql, params):
+    """Return the database's plan for a SELECT statement as a list of lines, or None."""
+    if params is None or not sql.lstrip()[:6].upper().startswith(('SELECT', 'WITH')):
+        return None
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+            return [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+    except DatabaseError as e:
+        return [f'EXPLAIN failed: {e}']
+
+
+def shows_server_timing(request):
+    """Whether the response to request gets the Server-Timing header."""
+    if SERVER_TIMING_PUBLIC:
+        return True
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_authenticated and (user.is_superuser or user.role == 'admin')
+
+
+def slow_request_record(request, response, timings, top_sql=None, with_explain=None):
+    """Build the slow log entry for a finished request."""
+    top_sql = SLOW_REQUEST_TOP_SQL if top_sql is None else top_sql
+    with_explain = SLOW_REQUEST_EXPLAIN if with_explain is None else with_explain
+    user = getattr(request, 'user', None)
+    match = getattr(request, 'resolver_match', None)
+    queries = []
+    for group in timings.top_queries(top_sql):
+        entry = {
+            'sql': group['sql'],
+            'database': group['alias'],
+            'count': group['count'],
+            'total_ms': round(group['total_ms'], 2),
+            'max_ms': round(group['max_ms'], 2),
+        }
+        if with_explain:
+            entry['explain'] = explain(group['alias'], group['sql'], group['params'])
+        queries.append(entry)
+    return {
+        'method': request.method,
+        'path': request.path,
+        'view': match.view_name if match else None,
+        'status': response.status_code,
+        'user_id': user.pk if user is not None and user.is_authenticated else None,
+        'total_ms': round(timings.total_ms, 2),
+        'phases': {
+            phase: {'ms': round(timings.durations[phase] * 1000, 2), 'count': timings.counts[phase]}
+            for phase in PHASES
+        },
+        'top_sql': queries,
+    }
+
+
+def log_slow_request(request, response, timings):
+    slow_request_logger.warning(json.dumps(slow_request_record(request, response, timings), default=str))
+
+
+class TimedTemplate:
+    """Template wrapper that adds the time spent rendering to the tpl phase."""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        with timed('tpl'):
+            return self.template.render(context, request)
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """
+    The Django template backend with render timing.
+
+    Only templates loaded through the backend are wrapped, so templates that
+    are included or extended are part of their parent's time, not added twice.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
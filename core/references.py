@@ -0,0 +1,81 @@
+"""
+Allocation of regulation references.
+
+New regulations get references such as REG-2026-007: a prefix, the year and
+a number that starts again at 1 every year. The last number used for each
+prefix and year is kept in RegulationReferenceSequence:
+
+    next_reference()      the reference the next allocation will most likely
+                          return, for showing on the create form (one indexed read)
+    allocate_reference()  takes the next number with an atomic increment
+
+The increment locks the sequence row until the surrounding transaction
+commits, so concurrent makers are handed out different numbers. A number
+whose reference was already entered by hand is skipped.
+"""
+import re
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Regulation, RegulationReferenceSequence
+
+REGULATION_REFERENCE_PREFIX = getattr(settings, 'REGULATION_REFERENCE_PREFIX', 'REG')
+
+# prefix-year-number, as written by format_reference
+REFERENCE_PATTERN = re.compile(r'^(?P<prefix>[A-Za-z]+)-(?P<year>\d{4})-(?P<number>\d+)$')
+
+
+def format_reference(prefix, year, number):
+    # At least three digits, so the first 999 references sort in order
+    return f'{prefix}-{year}-{number:03d}'
+
+
+def parse_reference(reference):
+    """Return (prefix, year, number) for a reference written by format_reference, or None."""
+    match = REFERENCE_PATTERN.match(reference or '')
+    if not match:
+        return None
+    return match['prefix'], int(match['year']), int(match['number'])
+
+
+def next_reference(prefix=REGULATION_REFERENCE_PREFIX, year=None):
+    """
+    Return the reference the next allocation is expected to hand out.
+
+    Nothing is reserved: another maker may take it first, so the form only
+    shows it and the reference is allocated when the regulation is saved.
+    """
+    year = year or timezone.localdate().year
+    last_value = (
+        RegulationReferenceSequence.objects.filter(prefix=prefix, year=year)
+        .values_list('last_value', flat=True)
+        .first()
+    )
+    return format_reference(prefix, year, (last_value or 0) + 1)
+
+
+def _increment(prefix, year):
+    rows = RegulationReferenceSequence.objects.filter(prefix=prefix, year=year)
+    if not rows.update(last_value=F('last_value') + 1):
+        sequence, created = RegulationReferenceSequence.objects.get_or_create(
+            prefix=prefix, year=year, defaults={'last_value': 1}
+        )
+        if created:
+            return 1
+        # Another transaction created the row between our update and insert
+        rows.update(last_value=F('last_value') + 1)
+    return rows.values_list('last_value', flat=True).get()
+
+
+def allocate_reference(prefix=REGULATION_REFERENCE_PREFIX, year=None):
+    """Take the next reference for prefix and year (default: this year)."""
+    year = year or timezone.localdate().year
+    with transaction.atomic():
+        while True:
+            reference = format_reference(prefix, year, _increment(prefix, year))
+            # References can also be typed in by hand; skip numbers that are already taken
+            if not Regulation.objects.filter(reference=reference).exists():
+                return reference
@@ -0,0 +1,96 @@
+"""
+Maintenance of the DepartmentComplianceRollup table.
+
+The rollup stores how many ComplianceStatus rows exist per department,
+regulation and status, so dashboards can read compliance totals with a single
+query instead of counting ComplianceStatus rows per department.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Article, ComplianceStatus, DepartmentComplianceRollup
+
+
+def rollup_key(compliance_status):
+    """Return the (department_id, regulation_id, status) key for a ComplianceStatus."""
+    if ComplianceStatus.article.is_cached(compliance_status):
+        regulation_id = compliance_status.article.regulation_id
+    else:
+        regulation_id = (
+            Article.objects.filter(pk=compliance_status.article_id)
+            .values_list('regulation_id', flat=True)
+            .first()
+        )
+    return (compliance_status.department_id, regulation_id, compliance_status.status)
+
+
+def apply_rollup_delta(department_id, regulation_id, status, delta):
+    """Add delta to the rollup count for one department, regulation and status."""
+    if not delta or regulation_id is None:
+        return
+    rows = DepartmentComplianceRollup.objects.filter(
+        department_id=department_id, regulation_id=regulation_id, status=status
+    )
+    if rows.update(count=F('count') + delta) or delta < 0:
+        return
+    rollup, created = DepartmentComplianceRollup.objects.get_or_create(
+        department_id=department_id, regulation_id=regulation_id, status=status,
+        defaults={'count': delta},
+    )
+    if not created:
+        # Another transaction created the row between our update and insert
+        rows.update(count=F('count') + delta)
+
+
+def apply_rollup_deltas(deltas):
+    """Apply a Counter of {(department_id, regulation_id, status): delta}."""
+    for (department_id, regulation_id, status), delta in deltas.items():
+        apply_rollup_delta(department_id, regulation_id, status, delta)
+
+
+def expected_rollup_counts():
+    """Count ComplianceStatus rows per rollup key straight from the source table."""
+    counts = (
+        ComplianceStatus.objects
+        .values_list('department_id', 'article__regulation_id', 'status')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    return Counter({(dept_id, reg_id, status): count for dept_id, reg_id, status, count in counts.iterator()})
+
+
+def current_rollup_counts():
+    """Return the rollup table as a Counter, ignoring rows whose count is zero."""
+    rows = DepartmentComplianceRollup.objects.filter(count__gt=0).values_list(
+        'department_id', 'regulation_id', 'status', 'count'
+    )
+    return Counter({(dept_id, reg_id, status): count for dept_id, reg_id, status, count in rows.iterator()})
+
+
+def verify_compliance_rollup():
+    """
+    Compare the rollup with the source table.
+
+    Returns a list of (key, expected, actual) tuples for every key that differs.
+    """
+    expected = expected_rollup_counts()
+    actual = current_rollup_counts()
+    return [
+        (key, expected.get(key, 0), actual.get(key, 0))
+        for key in sorted(set(expected) | set(actual), key=str)
+        if expected.get(key, 0) != actual.get(key, 0)
+    ]
+
+
+def rebuild_compliance_rollup(batch_size=1000):
+    """Recompute the whole rollup table from ComplianceStatus. Returns the number of rows written."""
+    with transaction.atomic():
+        DepartmentComplianceRollup.objects.all().delete()
+        rollups = [
+            DepartmentComplianceRollup(department_id=dept_id, regulation_id=reg_id, status=status, count=count)
+            for (dept_id, reg_id, status), count in expected_rollup_counts().items()
+        ]
+        DepartmentComplianceRollup.objects.bulk_create(rollups, batch_size=batch_size)
+    return len(rollups)
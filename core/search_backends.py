@@ -0,0 +1,482 @@
+"""
+Pluggable regulation search backends.
+
+``search_regulations()`` tries each backend listed in the ``SEARCH_BACKENDS``
+setting in order, skipping backends that are unavailable (e.g. Elasticsearch
+is not configured, or the database is not SQLite) and falling through to the
+next one when a search fails.
+
+Every backend returns a list of regulation documents shaped like
+``elasticsearch_config.regulation_document()``.
+
+``page_regulations()`` lists regulations for the compliance views the same
+way. Pages are ordered by (last_updated, id), newest first, and paginated with
+an opaque keyset cursor rather than an offset, so every page costs the same
+however deep into the catalogue it is.
+"""
+import base64
+import json
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import Exists, OuterRef, Q
+from django.utils.module_loading import import_string
+
+from . import elasticsearch_config
+from .db_routing import use_replica
+from .metrics import registry as metrics
+from .models import Article, Regulation
+from .search_cache import normalize_filters, normalize_query, search_result_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEARCH_BACKENDS = [
+    'core.search_backends.ElasticsearchBackend',
+    'core.search_backends.SQLiteFTSBackend',
+    'core.search_backends.DatabaseBackend',
+]
+
+# Maximum number of results returned by a search
+SEARCH_RESULT_LIMIT = getattr(settings, 'SEARCH_RESULT_LIMIT', 100)
+
+# Once Elasticsearch has failed, searches skip it for this long before it is pinged again
+ELASTICSEARCH_RETRY_INTERVAL = getattr(settings, 'SEARCH_ELASTICSEARCH_RETRY_INTERVAL', 30)
+ELASTICSEARCH_PING_TIMEOUT = 1  # seconds
+
+# Search filters understood by the database backends, mapped to ORM lookups
+DATABASE_FILTER_LOOKUPS = {
+    'status': 'status',
+    'type': 'type',
+    'created_by': 'created_by__username',
+    'assigned_departments': 'assigned_departments__name',
+}
+
+
+def apply_search_filters(regulations, filters):
+    """Apply search filters (as passed to search_regulations) to a Regulation queryset."""
+    for field, value in (filters or {}).items():
+        if not value:
+            continue
+        if field not in DATABASE_FILTER_LOOKUPS:
+            raise ValueError(f'Unsupported search filter: {field}')
+        if field == 'assigned_departments':
+            # Filter through a subquery so a regulation is never returned twice
+            regulations = regulations.filter(
+                id__in=Regulation.objects.filter(assigned_departments__name=value).values('id')
+            )
+        else:
+            regulations = regulations.filter(**{DATABASE_FILTER_LOOKUPS[field]: value})
+    return regulations
+
+
+# Query parameters understood by the regulation listing and export views
+REGULATION_FILTER_PARAMS = [
+    'reference', 'title', 'status', 'created_by', 'department',
+    'issue_date_from', 'issue_date_to',
+    'effective_date_from', 'effective_date_to',
+    'expiry_date_from', 'expiry_date_to',
+]
+
+# Regulations shown per page of the compliance regulation list
+REGULATION_PAGE_SIZE = getattr(settings, 'REGULATION_PAGE_SIZE', 50)
+
+
+def clean_regulation_filters(filters):
+    """
+    Normalise regulation listing filters, dropping empty or malformed values.
+
+    Ids become ints and date bounds become dates, so every backend receives
+    values it can use as-is.
+    """
+    cleaned = {}
+    for param in REGULATION_FILTER_PARAMS:
+        value = (filters or {}).get(param)
+        if not value:
+            continue
+        try:
+            if param in ('created_by', 'department'):
+                value = int(value)
+            elif param.endswith(('_from', '_to')):
+                value = date.fromisoformat(value) if isinstance(value, str) else value
+        except ValueError:
+            continue
+        cleaned[param] = value
+    return cleaned
+
+
+def filter_regulations(regulations, filters):
+    """Apply the regulation filter parameters to a queryset."""
+    filters = clean_regulation_filters(filters)
+    if filters.get('reference'):
+        regulations = regulations.filter(reference__icontains=filters['reference'])
+    if filters.get('title'):
+        regulations = regulations.filter(name__icontains=filters['title'])
+    if filters.get('status'):
+        regulations = regulations.filter(status=filters['status'])
+    if filters.get('created_by'):
+        regulations = regulations.filter(created_by_id=filters['created_by'])
+    if filters.get('department'):
+        # Filter through a subquery so a regulation is never returned twice
+        regulations = regulations.filter(
+            id__in=Regulation.assigned_departments.through.objects
+            .filter(department_id=filters['department']).values('regulation_id')
+        )
+
+    # Date range filters
+    for field_name in ('issue_date', 'effective_date', 'expiry_date'):
+        if filters.get(f'{field_name}_from'):
+            regulations = regulations.filter(**{f'{field_name}__gte': filters[f'{field_name}_from']})
+        if filters.get(f'{field_name}_to'):
+            regulations = regulations.filter(**{f'{field_name}__lte': filters[f'{field_name}_to']})
+    return regulations
+
+
+@dataclass
+class RegulationPage:
+    """One page of a regulation listing: ids in display order and the cursor of the next page."""
+    ids: list = field(default_factory=list)
+    next_cursor: str = None
+
+
+def encode_cursor(last_updated, regulation_id):
+    """Build the opaque cursor pointing just after the given row."""
+    payload = json.dumps([last_updated.astimezone(dt_timezone.utc).isoformat(), regulation_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (last_updated, regulation_id) from a cursor, or None if it is missing or invalid."""
+    if not cursor:
+        return None
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        last_updated, regulation_id = json.loads(payload)
+        return datetime.fromisoformat(last_updated), int(regulation_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def hydrate_regulations(regulation_ids):
+    """Load regulations as search documents, in the given order, with a constant number of queries."""
+    regulations = (
+        Regulation.objects.filter(id__in=regulation_ids)
+        .select_related('created_by')
+        .prefetch_related('assigned_departments')
+        .in_bulk()
+    )
+    return [
+        elasticsearch_config.regulation_document(regulations[regulation_id])
+        for regulation_id in regulation_ids
+        if regulation_id in regulations
+    ]
+
+
+class BaseSearchBackend:
+    """Interface implemented by regulation search backends."""
+
+    def is_available(self):
+        """Return False if the backend cannot be used in this deployment."""
+        return True
+
+    def report_failure(self, error):
+        """Called after a call on the backend failed and the search fell back to the next one."""
+
+    def search(self, query, filters=None, limit=SEARCH_RESULT_LIMIT):
+        """Return up to `limit` regulation documents matching the query and filters, best match first."""
+        raise NotImplementedError
+
+    def page(self, filters=None, after=None, size=REGULATION_PAGE_SIZE):
+        """
+        Return a RegulationPage of regulations matching the listing filters.
+
+        The default implementation runs a keyset query on (last_updated, id),
+        which the regulation_last_updated_idx index serves directly.
+        """
+        regulations = filter_regulations(Regulation.objects.all(), filters)
+        position = decode_cursor(after)
+        if position:
+            last_updated, regulation_id = position
+            regulations = regulations.filter(
+                Q(last_updated__lt=last_updated) | Q(last_updated=last_updated, id__lt=regulation_id)
+            )
+        # One extra row tells us whether there is a next page
+        rows = list(regulations.order_by('-last_updated', '-id').values_list('id', 'last_updated')[:size + 1])
+        next_cursor = encode_cursor(rows[size - 1][1], rows[size - 1][0]) if len(rows) > size else None
+        return RegulationPage([regulation_id for regulation_id, _ in rows[:size]], next_cursor)
+
+
+class ElasticsearchBackend(BaseSearchBackend):
+    """
+    Searches the Elasticsearch regulations index.
+
+    The cluster's health is remembered for the whole process: after a failure
+    it is skipped for ELASTICSEARCH_RETRY_INTERVAL seconds and then pinged
+    before it is used again, so an outage costs one cheap ping per interval
+    instead of a failed request on every search.
+    """
+
+    # None until the cluster has been pinged once
+    healthy = None
+    # time.monotonic() before which an unhealthy cluster is not pinged again
+    retry_at = 0.0
+
+    def is_available(self):
+        if elasticsearch_config.es is None:
+            return False
+        cls = ElasticsearchBackend
+        if cls.healthy is None or (not cls.healthy and time.monotonic() >= cls.retry_at):
+            if elasticsearch_config.es.options(request_timeout=ELASTICSEARCH_PING_TIMEOUT, max_retries=0).ping():
+                cls.healthy = True
+            else:
+                self.report_failure('ping failed')
+        return cls.healthy
+
+    def report_failure(self, error):
+        cls = ElasticsearchBackend
+        if cls.healthy is not False:
+            logger.warning(
+                'Elasticsearch is unavailable (%s); searches use the next backend for at least %ds',
+                error, ELASTICSEARCH_RETRY_INTERVAL,
+            )
+        cls.healthy = False
+        cls.retry_at = time.monotonic() + ELASTICSEARCH_RETRY_INTERVAL
+
+    def search(self, query, filters=None, limit=SEARCH_RESULT_LIMIT):
+        return elasticsearch_config.search_regulation_index(query, filters, size=limit)
+
+    def page(self, filters=None, after=None, size=REGULATION_PAGE_SIZE):
+        position = decode_cursor(after)
+        search_after = None
+        if position:
+            last_updated, regulation_id = position
+            search_after = [int(last_updated.timestamp() * 1000), regulation_id]
+        hits = elasticsearch_config.page_regulation_index(
+            clean_regulation_filters(filters), after=search_after, size=size + 1
+        )
+        next_cursor = None
+        if len(hits) > size:
+            millis, regulation_id = hits[size - 1][1]
+            next_cursor = encode_cursor(datetime.fromtimestamp(millis / 1000, tz=dt_timezone.utc), regulation_id)
+        return RegulationPage([regulation_id for regulation_id, _ in hits[:size]], next_cursor)
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """
+    Ranked full-text search over an SQLite FTS5 table.
+
+    core_regulation_fts holds one row per regulation (rowid = regulation id)
+    with its reference, name, description and the text of its articles. It is
+    kept up to date by triggers on core_regulation and core_article, which
+    install() (re)creates after every migrate.
+    """
+
+    table = 'core_regulation_fts'
+
+    # bm25 weights for the reference, name, description and articles columns
+    column_weights = (10.0, 5.0, 1.0, 0.5)
+
+    triggers = {
+        'core_regulation_fts_insert': """
+            CREATE TRIGGER IF NOT EXISTS core_regulation_fts_insert AFTER INSERT ON core_regulation BEGIN
+                INSERT INTO core_regulation_fts (rowid, reference, name, description, articles)
+                VALUES (new.id, new.reference, new.name, new.description,
+                        (SELECT group_concat(title || ' ' || content, ' ') FROM core_article WHERE regulation_id = new.id));
+            END
+        """,
+        'core_regulation_fts_update': """
+            CREATE TRIGGER IF NOT EXISTS core_regulation_fts_update AFTER UPDATE OF reference, name, description ON core_regulation BEGIN
+                UPDATE core_regulation_fts
+                SET reference = new.reference, name = new.name, description = new.description
+                WHERE rowid = new.id;
+            END
+        """,
+        'core_regulation_fts_delete': """
+            CREATE TRIGGER IF NOT EXISTS core_regulation_fts_delete AFTER DELETE ON core_regulation BEGIN
+                DELETE FROM core_regulation_fts WHERE rowid = old.id;
+            END
+        """,
+        'core_article_fts_insert': """
+            CREATE TRIGGER IF NOT EXISTS core_article_fts_insert AFTER INSERT ON core_article BEGIN
+                UPDATE core_regulation_fts
+                SET articles = (SELECT group_concat(title || ' ' || content, ' ') FROM core_article WHERE regulation_id = new.regulation_id)
+                WHERE rowid = new.regulation_id;
+            END
+        """,
+        'core_article_fts_update': """
+            CREATE TRIGGER IF NOT EXISTS core_article_fts_update AFTER UPDATE OF title, content, regulation_id ON core_article BEGIN
+                UPDATE core_regulation_fts
+                SET articles = (SELECT group_concat(title || ' ' || content, ' ') FROM core_article WHERE regulation_id = old.regulation_id)
+                WHERE rowid = old.regulation_id;
+                UPDATE core_regulation_fts
+                SET articles = (SELECT group_concat(title || ' ' || content, ' ') FROM core_article WHERE regulation_id = new.regulation_id)
+                WHERE rowid = new.regulation_id;
+            END
+        """,
+        'core_article_fts_delete': """
+            CREATE TRIGGER IF NOT EXISTS core_article_fts_delete AFTER DELETE ON core_article BEGIN
+                UPDATE core_regulation_fts
+                SET articles = (SELECT group_concat(title || ' ' || content, ' ') FROM core_article WHERE regulation_id = old.regulation_id)
+                WHERE rowid = old.regulation_id;
+            END
+        """,
+    }
+
+    def __init__(self, using=None):
+        self.connection = connection if using is None else connections[using]
+
+    def is_available(self):
+        return self.connection.vendor == 'sqlite'
+
+    def install(self):
+        """Create the FTS table and its triggers if they are missing, filling a new table from the data."""
+        with self.connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [self.table])
+            created = cursor.fetchone() is None
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} "
+                "USING fts5(reference, name, description, articles, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+            # Django rebuilds SQLite tables for some schema changes, which drops their triggers
+            for sql in self.triggers.values():
+                cursor.execute(sql)
+        if created:
+            self.rebuild()
+
+    def drop_triggers(self):
+        """Drop the maintenance triggers, e.g. before a large bulk load followed by rebuild()."""
+        with self.connection.cursor() as cursor:
+            for name in self.triggers:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+    def rebuild(self):
+        """Refill the FTS table from core_regulation and core_article."""
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(f"""
+                INSERT INTO {self.table} (rowid, reference, name, description, articles)
+                SELECT r.id, r.reference, r.name, r.description, a.text
+                FROM core_regulation r
+                LEFT JOIN (
+                    SELECT regulation_id, group_concat(title || ' ' || content, ' ') AS text
+                    FROM core_article GROUP BY regulation_id
+                ) a ON a.regulation_id = r.id
+            """)
+
+    @staticmethod
+    def match_expression(query):
+        """
+        Turn free text into an FTS5 query: every word must match, as a prefix.
+
+        Words are quoted so user input can never be parsed as FTS5 syntax.
+        """
+        words = re.findall(r'\w+', query or '')
+        return ' '.join(f'"{word}"*' for word in words)
+
+    def matching_ids(self, query, regulations=None, limit=SEARCH_RESULT_LIMIT):
+        """
+        Return the ids of regulations matching the query, best match first.
+
+        If a Regulation queryset is given, only its rows are considered.
+        """
+        weights = ', '.join(str(weight) for weight in self.column_weights)
+        sql = f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s'
+        params = [self.match_expression(query)]
+        if regulations is not None:
+            subquery, subquery_params = regulations.values('id').query.sql_with_params()
+            sql += f' AND rowid IN ({subquery})'
+            params.extend(subquery_params)
+        sql += f' ORDER BY bm25({self.table}, {weights}) LIMIT %s'
+        params.append(limit)
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def search(self, query, filters=None, limit=SEARCH_RESULT_LIMIT):
+        regulations = apply_search_filters(Regulation.objects.all(), filters)
+        if not self.match_expression(query):
+            return hydrate_regulations(list(regulations.order_by('-last_updated').values_list('id', flat=True)[:limit]))
+        return hydrate_regulations(self.matching_ids(query, regulations if filters else None, limit))
+
+
+class DatabaseBackend(BaseSearchBackend):
+    """Unranked substring search with plain ORM queries; works on any database."""
+
+    def search(self, query, filters=None, limit=SEARCH_RESULT_LIMIT):
+        regulations = apply_search_filters(Regulation.objects.all(), filters)
+        for word in (query or '').split():
+            regulations = regulations.filter(
+                Q(reference__icontains=word)
+                | Q(name__icontains=word)
+                | Q(description__icontains=word)
+                | Exists(Article.objects.filter(regulation=OuterRef('pk'), content__icontains=word))
+            )
+        # The substring scan is the heaviest search path; run it on a read replica when there is one.
+        # search_result_cache does not keep results read from a replica, which may lag.
+        with use_replica():
+            return hydrate_regulations(list(regulations.order_by('-last_updated').values_list('id', flat=True)[:limit]))
+
+
+def get_search_backends():
+    """Instantiate the backends listed in settings.SEARCH_BACKENDS."""
+    return [import_string(path)() for path in getattr(settings, 'SEARCH_BACKENDS', DEFAULT_SEARCH_BACKENDS)]
+
+
+# Backends whose last call failed; their traceback has been logged once already
+_failing_backends = set()
+
+
+def _call_backends(method, *args, **kwargs):
+    """Call a method on the first available backend that succeeds."""
+    backends = [backend for backend in get_search_backends() if backend.is_available()]
+    for backend in backends[:-1]:
+        name = type(backend).__name__
+        try:
+            result = getattr(backend, method)(*args, **kwargs)
+        except Exception as e:
+            if name in _failing_backends:
+                logger.warning('%s %s failed; falling back: %s', name, method, e)
+            else:
+                _failing_backends.add(name)
+                logger.exception('%s %s failed; falling back', name, method)
+            metrics.inc('compliance_search_fallbacks_total', {'backend': name, 'method': method})
+            backend.report_failure(e)
+            continue
+        _failing_backends.discard(name)
+        return result
+    if not backends:
+        raise RuntimeError('No search backend is available')
+    return getattr(backends[-1], method)(*args, **kwargs)
+
+
+def search_regulations(query, filters=None, limit=SEARCH_RESULT_LIMIT):
+    """
+    Search regulations with the first available backend that succeeds.
+
+    Results are cached (see core.search_cache) and must not be modified.
+    """
+    key = ('search', normalize_query(query), normalize_filters(filters), limit)
+    return search_result_cache.get_or_call(key, lambda: _call_backends('search', query, filters, limit=limit))
+
+
+def page_regulations(filters=None, after=None, size=REGULATION_PAGE_SIZE):
+    """
+    List one page of regulations with the first available backend that succeeds.
+
+    Pages are cached (see core.search_cache) and must not be modified.
+    """
+    key = ('page', normalize_filters(clean_regulation_filters(filters)), after or '', size)
+    return search_result_cache.get_or_call(key, lambda: _call_backends('page', filters, after=after, size=size))
+
+
+def install_search_backends(using='default'):
+    """Set up the database structures needed by the configured backends (run after migrate)."""
+    for backend in get_search_backends():
+        if isinstance(backend, SQLiteFTSBackend):
+            backend = type(backend)(using=using)
+            if backend.is_available():
+                backend.install()
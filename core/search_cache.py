@@ -0,0 +1,129 @@
+"""
+In-process cache of regulation search results.
+
+search_regulations() and page_regulations() keep their results in an LRU
+cache with a TTL, keyed by the normalised query, filters and page. Every
+entry remembers the index generation it was computed under: a counter in the
+SearchIndexGeneration table, so all worker processes share it, that is bumped
+whenever the search index or the data it is built from changes. An entry from
+an older generation is treated as a miss. Reading the counter costs one
+primary-key query per lookup, far less than the search it saves.
+
+Only results read from the primary are cached. A result the database search
+fallback read from a replica is returned but not kept: the replica may lag
+behind the generation read from the primary.
+
+The cache is sized with SEARCH_CACHE_MAX_ENTRIES (0 disables it) and
+SEARCH_CACHE_TTL seconds. Its hit/miss counters are returned by stats().
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F
+
+# Models are imported inside functions: core.indexing imports this module in
+# worker processes before Django is set up.
+
+# Primary key of the only SearchIndexGeneration row
+GENERATION_ROW_ID = 1
+
+
+def _generation_rows():
+    from .models import SearchIndexGeneration
+    # Always the primary: a lagging replica would hand out an old generation
+    return SearchIndexGeneration.objects.using(DEFAULT_DB_ALIAS).filter(pk=GENERATION_ROW_ID)
+
+
+def get_index_generation():
+    """Return the current search index generation."""
+    return _generation_rows().values_list('value', flat=True).first() or 0
+
+
+def bump_index_generation():
+    """Invalidate every cached search result, in all processes."""
+    rows = _generation_rows()
+    if not rows.update(value=F('value') + 1):
+        # First bump on this database
+        rows.model.objects.using(DEFAULT_DB_ALIAS).get_or_create(pk=GENERATION_ROW_ID)
+        rows.update(value=F('value') + 1)
+    return get_index_generation()
+
+
+def normalize_query(query):
+    """Lower-case the query and collapse whitespace so equivalent searches share an entry."""
+    return ' '.join((query or '').lower().split())
+
+
+def normalize_filters(filters):
+    """Turn a filter dict into a hashable, order-independent key, ignoring empty values."""
+    return tuple(sorted((key, str(value)) for key, value in (filters or {}).items() if value))
+
+
+class SearchResultCache:
+    """A thread-safe LRU cache whose entries expire after ttl seconds or when the index generation changes."""
+
+    def __init__(self, max_entries=1000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_call(self, key, compute):
+        """Return the cached value for key, or call compute() and cache its result."""
+        if self.max_entries <= 0:
+            return compute()
+        generation = get_index_generation()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == generation and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        from .db_routing import track_replica_reads
+        with track_replica_reads() as replicas_read:
+            value = compute()
+        if replicas_read:
+            # A lagging replica may not have the rows of the current generation
+            # yet; caching its result would serve it to everyone, the writer too
+            return value
+        with self._lock:
+            self._entries[key] = (generation, now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return the cache counters, e.g. to decide on SEARCH_CACHE_MAX_ENTRIES."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'generation': get_index_generation(),
+            }
+
+
+search_result_cache = SearchResultCache(
+    max_entries=getattr(settings, 'SEARCH_CACHE_MAX_ENTRIES', 1000),
+    ttl=getattr(settings, 'SEARCH_CACHE_TTL', 300),
+)
@@ -1,14 +1,150 @@
-from django.db.models.signals import post_save, post_delete
+from collections import Counter
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed, post_migrate
+from django.db import transaction
 from django.dispatch import receiver
-from .models import Regulation
-from .elasticsearch_config import index_regulation, delete_regulation_index
+from .models import Regulation, Article, Department, ComplianceStatus, Notification, SystemSetting
+from .indexing import enqueue_regulation_changes
+from .references import allocate_reference
+from .notifications import (
+    EVENT_REGULATION_ACTION_REQUIRED, adjust_unread_counts, fan_out_notifications, publish_notifications
+)
+from .rollups import rollup_key, apply_rollup_deltas
+from .search_backends import install_search_backends
+from .system_settings import settings_changed
+
+# Search index changes are queued in the search index outbox as part of the
+# writing transaction; the process_search_outbox command applies them.
+
+@receiver(post_save, sender=Regulation)
+def index_regulation_on_save(sender, instance, raw=False, **kwargs):
+    """Queue a regulation for indexing when it is created or updated."""
+    if not raw:
+        enqueue_regulation_changes([instance.id])
+
+@receiver(pre_save, sender=Regulation)
+def assign_regulation_reference(sender, instance, raw=False, **kwargs):
+    """Give a new regulation saved without a reference the next one from its year's sequence."""
+    if not instance.reference and not instance.pk and not raw:
+        instance.reference = allocate_reference()
+
+@receiver(pre_save, sender=Regulation)
+def remember_previous_regulation_status(sender, instance, raw=False, **kwargs):
+    """Remember the status a regulation had before it is saved."""
+    instance._previous_status = None
+    if instance.pk and not raw:
+        instance._previous_status = Regulation.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
 
 @receiver(post_save, sender=Regulation)
-def index_regulation_on_save(sender, instance, **kwargs):
-    """Index a regulation when it is created or updated."""
-    index_regulation(instance)
+def notify_departments_on_action_required(sender, instance, raw=False, **kwargs):
+    """Notify the assigned departments' users when a regulation starts requiring their action."""
+    if raw or instance.status != 'action_required_from_department':
+        return
+    if getattr(instance, '_previous_status', None) == instance.status:
+        return
+    # After commit, so departments assigned by the same form save are included
+    transaction.on_commit(lambda: fan_out_notifications(instance, EVENT_REGULATION_ACTION_REQUIRED))
 
 @receiver(post_delete, sender=Regulation)
 def delete_regulation_on_delete(sender, instance, **kwargs):
-    """Delete a regulation from the index when it is deleted from the database."""
-    delete_regulation_index(instance.id) 
\ No newline at end of file
+    """Queue a regulation for removal from the index when it is deleted from the database."""
+    enqueue_regulation_changes([instance.id], action='delete')
+
+@receiver(m2m_changed, sender=Regulation.assigned_departments.through)
+def index_regulation_on_departments_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Queue regulations whose assigned departments changed."""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            enqueue_regulation_changes([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        # department.assigned_regulations.add(...) / remove(...)
+        enqueue_regulation_changes(pk_set)
+    elif action == 'pre_clear':
+        # department.assigned_regulations.clear() does not report which regulations it touches
+        enqueue_regulation_changes(instance.assigned_regulations.values_list('id', flat=True))
+
+@receiver(post_save, sender=Article)
+@receiver(post_delete, sender=Article)
+def index_regulation_on_article_change(sender, instance, raw=False, **kwargs):
+    """Queue the parent regulation when one of its articles changes."""
+    if not raw:
+        enqueue_regulation_changes([instance.regulation_id])
+
+@receiver(post_save, sender=Department)
+def index_regulations_on_department_change(sender, instance, created, raw=False, **kwargs):
+    """Queue the regulations assigned to a department, since documents embed its name."""
+    if not created and not raw:
+        enqueue_regulation_changes(instance.assigned_regulations.values_list('id', flat=True))
+
+@receiver(pre_save, sender=ComplianceStatus)
+def remember_previous_compliance_status(sender, instance, raw=False, **kwargs):
+    """Remember the rollup key a ComplianceStatus had before it is saved."""
+    instance._previous_rollup_key = None
+    if instance.pk and not raw:
+        instance._previous_rollup_key = (
+            ComplianceStatus.objects.filter(pk=instance.pk)
+            .values_list('department_id', 'article__regulation_id', 'status')
+            .first()
+        )
+
+@receiver(post_save, sender=ComplianceStatus)
+def update_rollup_on_compliance_status_save(sender, instance, raw=False, **kwargs):
+    """Move the status between DepartmentComplianceRollup counts."""
+    if raw:
+        return
+    deltas = Counter()
+    previous_key = getattr(instance, '_previous_rollup_key', None)
+    if previous_key:
+        deltas[previous_key] -= 1
+    deltas[rollup_key(instance)] += 1
+    apply_rollup_deltas(deltas)
+
+@receiver(pre_delete, sender=ComplianceStatus)
+def remember_deleted_compliance_status(sender, instance, **kwargs):
+    """Capture the rollup key while the article row still exists."""
+    instance._previous_rollup_key = rollup_key(instance)
+
+@receiver(post_delete, sender=ComplianceStatus)
+def update_rollup_on_compliance_status_delete(sender, instance, **kwargs):
+    """Remove a deleted status from the DepartmentComplianceRollup counts."""
+    previous_key = getattr(instance, '_previous_rollup_key', None) or rollup_key(instance)
+    apply_rollup_deltas(Counter({previous_key: -1}))
+
+@receiver(pre_save, sender=Notification)
+def remember_previous_notification_read(sender, instance, raw=False, **kwargs):
+    """Remember whether a notification was read before it is saved."""
+    instance._previous_read = None
+    if instance.pk and not raw:
+        instance._previous_read = Notification.objects.filter(pk=instance.pk).values_list('read', flat=True).first()
+
+@receiver(post_save, sender=Notification)
+def publish_notification_on_create(sender, instance, created, raw=False, **kwargs):
+    """Push new notifications to the recipient's open notification streams."""
+    if created and not raw:
+        publish_notifications([instance])
+
+@receiver(post_save, sender=Notification)
+def update_unread_count_on_notification_save(sender, instance, created, raw=False, **kwargs):
+    """Keep the recipient's unread counter in step with a saved notification."""
+    if raw:
+        return
+    was_unread = not created and getattr(instance, '_previous_read', None) is False
+    delta = (not instance.read) - was_unread
+    adjust_unread_counts(Counter({instance.recipient_id: delta}))
+
+@receiver(post_delete, sender=Notification)
+def update_unread_count_on_notification_delete(sender, instance, **kwargs):
+    """Remove a deleted unread notification from the recipient's counter."""
+    if not instance.read:
+        adjust_unread_counts(Counter({instance.recipient_id: -1}))
+
+@receiver(post_save, sender=SystemSetting)
+@receiver(post_delete, sender=SystemSetting)
+def invalidate_system_settings(sender, instance, **kwargs):
+    """Make every process reload its cached settings once the change is committed."""
+    transaction.on_commit(settings_changed)
+
+@receiver(post_migrate)
+def install_search_backends_after_migrate(sender, using, **kwargs):
+    """(Re)create database search structures, such as the SQLite FTS table and its triggers."""
+    if sender.name == 'core':
+        install_search_backends(using=using)
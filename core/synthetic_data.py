@@ -0,0 +1,423 @@
+"""
+Synthetic data for load testing.
+
+generate() adds departments, users, regulations with their articles and
+department assignments, compliance statuses and audit log entries at a
+configurable scale. For example:
+
+    manage.py generate_load_data --regulations 100000 --articles 2000000 \\
+        --departments 50 --statuses 5000000 --audit-logs 20000000 --workers 8
+
+Output depends only on the seed and the scale. Each chunk draws from its own
+random generator seeded with (seed, kind, chunk number), and primary keys are
+assigned up front from the current maximum ids. So chunks can be inserted by
+any number of worker processes, in any order, with the same result. Only
+compliance statuses and department assignments, which nothing refers to,
+get their ids from the database.
+
+Rows are written with bulk_create and no model signals, so the derived data
+is rebuilt once at the end. This covers the compliance rollup, the SQLite
+full-text table (its triggers are dropped for the load) and, on PostgreSQL,
+the primary key sequences. Elasticsearch is not touched: run index_regulations
+afterwards.
+"""
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Article, AuditLog, ComplianceStatus, Department, Regulation, User
+from .rollups import rebuild_compliance_rollup
+from .search_backends import SQLiteFTSBackend
+from .search_cache import bump_index_generation
+
+# Password of every generated user
+LOAD_TEST_PASSWORD = 'loadtest'
+
+WORDS = (
+    'capital adequacy liquidity reporting disclosure governance risk credit market operational '
+    'conduct consumer protection anti money laundering sanctions fraud outsourcing cloud cyber '
+    'resilience data privacy retention record keeping audit internal control remuneration '
+    'whistleblowing complaints product approval suitability custody settlement payments '
+    'licensing capital buffer stress testing recovery resolution exposure concentration '
+    'collateral valuation provisioning accounting tax climate environmental social'
+).split()
+DEPARTMENT_NAMES = (
+    'Finance', 'HR', 'IT', 'Legal', 'Operations', 'Marketing', 'Sales', 'R&D', 'Compliance',
+    'Risk Management', 'Treasury', 'Internal Audit', 'Procurement', 'Retail Banking', 'Payments',
+)
+
+# Weights roughly matching a production database: most regulations are done, a few are in flight
+REGULATION_STATUS_WEIGHTS = {
+    'draft': 5,
+    'awaiting_compliance_review': 5,
+    'reviewed_by_compliance': 5,
+    'action_required_from_department': 10,
+    'department_response_submitted': 5,
+    'returned_for_department_rework': 3,
+    'awaiting_final_compliance_approval': 5,
+    'fully_approved': 62,
+}
+COMPLIANCE_STATUS_WEIGHTS = {
+    'compliant': 60,
+    'partially_compliant': 20,
+    'non_compliant': 10,
+    'not_applicable': 10,
+}
+USER_ROLE_WEIGHTS = {
+    'admin': 1,
+    'compliance_maker': 5,
+    'compliance_checker': 4,
+    'dept_maker': 60,
+    'dept_checker': 30,
+}
+# (action_type, method, url_name, target_model, weight) of generated audit entries
+AUDIT_ACTIONS = (
+    ('get', 'GET', 'compliance_regulations', '', 30),
+    ('get', 'GET', 'compliance_regulation_detail', 'regulation', 35),
+    ('get', 'GET', 'compliance_dashboard', '', 15),
+    ('update', 'POST', 'edit_regulation', 'regulation', 6),
+    ('create', 'POST', 'create_regulation', '', 2),
+    ('status_change', 'POST', 'submit_compliance_statuses', 'department', 8),
+    ('login', 'POST', 'login', '', 3),
+    ('logout', 'POST', 'logout', '', 1),
+)
+
+# How far back generated timestamps go
+HISTORY_DAYS = 3 * 365
+
+
+@dataclass
+class LoadDataPlan:
+    seed: int = 1
+    departments: int = 50
+    users: int = 500
+    regulations: int = 100000
+    articles: int = 2000000
+    statuses: int = 5000000
+    audit_logs: int = 20000000
+    # Regulations or audit entries per chunk; one chunk is one transaction
+    chunk_size: int = 5000
+    # First primary keys to use, filled in by generate()
+    first_ids: dict = field(default_factory=dict)
+
+
+@dataclass
+class LoadDataResult:
+    counts: Counter = field(default_factory=Counter)
+
+    def add(self, counts):
+        self.counts.update(counts)
+
+
+def chunk_random(plan, kind, number):
+    """Random generator for one chunk; the same plan always produces the same data."""
+    return random.Random(f'{plan.seed}:{kind}:{number}')
+
+
+def weighted(rng, weights, k=1):
+    return rng.choices(list(weights), weights=list(weights.values()), k=k)
+
+
+def sentence(rng, words=12):
+    return ' '.join(rng.choices(WORDS, k=words)).capitalize() + '.'
+
+
+def random_moment(rng, now):
+    return now - timedelta(seconds=rng.randrange(HISTORY_DAYS * 86400))
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """
+    Let bulk_create keep the given created/updated timestamps.
+
+    auto_now and auto_now_add would stamp every generated row with the load
+    time, which hides the date skew real data has. Only use this in processes
+    that do nothing but generate data.
+    """
+    saved = []
+    for model in models:
+        for model_field in model._meta.concrete_fields:
+            if getattr(model_field, 'auto_now', False) or getattr(model_field, 'auto_now_add', False):
+                saved.append((model_field, model_field.auto_now, model_field.auto_now_add))
+                model_field.auto_now = model_field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for model_field, auto_now, auto_now_add in saved:
+            model_field.auto_now, model_field.auto_now_add = auto_now, auto_now_add
+
+
+def article_counts(plan):
+    """Number of articles for each generated regulation, averaging plan.articles / plan.regulations."""
+    if not plan.regulations:
+        return []
+    mean = plan.articles / plan.regulations
+    rng = chunk_random(plan, 'article-counts', 0)
+    if mean < 1:
+        return [int(rng.random() < mean) for _ in range(plan.regulations)]
+    # Uniform between 1 and 2 * mean - 1, so long regulations sit next to short ones
+    high = max(1, round(2 * mean - 1))
+    return [rng.randint(1, high) for _ in range(plan.regulations)]
+
+
+def status_probability(plan, counts):
+    """Chance that a department has reported on an article of a regulation assigned to it."""
+    # Regulations are assigned between 1 and 5 departments (3 on average)
+    pairs = sum(counts) * min(3, plan.departments)
+    return min(1.0, plan.statuses / pairs) if pairs else 0.0
+
+
+def generate_departments(plan, now):
+    rng = chunk_random(plan, 'departments', 0)
+    first_id = plan.first_ids['department']
+    departments = [
+        Department(
+            id=first_id + number,
+            name=f'{DEPARTMENT_NAMES[number % len(DEPARTMENT_NAMES)]} {first_id + number}',
+            description=sentence(rng),
+            created_at=random_moment(rng, now),
+            updated_at=now,
+        )
+        for number in range(plan.departments)
+    ]
+    with explicit_timestamps(Department):
+        Department.objects.bulk_create(departments)
+    return len(departments)
+
+
+def generate_users(plan, now):
+    rng = chunk_random(plan, 'users', 0)
+    first_id = plan.first_ids['user']
+    first_department = plan.first_ids['department']
+    # Hashing is slow by design, so every user shares one hash
+    password = make_password(LOAD_TEST_PASSWORD)
+    users = []
+    memberships = []
+    for number in range(plan.users):
+        user_id = first_id + number
+        role = weighted(rng, USER_ROLE_WEIGHTS)[0]
+        users.append(User(
+            id=user_id,
+            username=f'load_user_{user_id}',
+            email=f'load_user_{user_id}@example.com',
+            first_name=rng.choice(WORDS).capitalize(),
+            last_name=rng.choice(WORDS).capitalize(),
+            password=password,
+            role=role,
+            is_staff=role == 'admin',
+            date_joined=random_moment(rng, now),
+        ))
+        if role.startswith('dept_') and plan.departments:
+            memberships.append(User.departments.through(
+                user_id=user_id, department_id=first_department + rng.randrange(plan.departments)
+            ))
+    User.objects.bulk_create(users)
+    User.departments.through.objects.bulk_create(memberships)
+    return len(users)
+
+
+def generate_regulation_chunk(plan, number, first_index, counts, first_article_id, status_chance):
+    """
+    Insert regulations first_index .. first_index + len(counts) - 1 of the plan with their
+    department assignments, articles and compliance statuses. Returns the row counts.
+    """
+    rng = chunk_random(plan, 'regulations', number)
+    now = timezone.now()
+    first_regulation_id = plan.first_ids['regulation']
+    department_ids = range(plan.first_ids['department'], plan.first_ids['department'] + plan.departments)
+    user_ids = range(plan.first_ids['user'], plan.first_ids['user'] + plan.users)
+    Assignment = Regulation.assigned_departments.through
+
+    regulations, assignments, articles, statuses = [], [], [], []
+    article_id = first_article_id
+    for offset, article_count in enumerate(counts):
+        regulation_id = first_regulation_id + first_index + offset
+        created = random_moment(rng, now)
+        issued = created.date() - timedelta(days=rng.randrange(365))
+        regulations.append(Regulation(
+            id=regulation_id,
+            name=' '.join(rng.choices(WORDS, k=rng.randint(3, 7))).title(),
+            reference=f'LOAD-{regulation_id:08d}',
+            description=' '.join(sentence(rng) for _ in range(rng.randint(2, 6))),
+            date_created=created,
+            last_updated=created + (now - created) * rng.random(),
+            status=weighted(rng, REGULATION_STATUS_WEIGHTS)[0],
+            type=rng.choice(Regulation.TYPE_CHOICES)[0],
+            created_by_id=rng.choice(user_ids) if user_ids else None,
+            issue_date=issued,
+            effective_date=issued + timedelta(days=rng.randrange(180)),
+            expiry_date=issued + timedelta(days=rng.randrange(365, 3650)) if rng.random() < 0.3 else None,
+        ))
+        assigned = rng.sample(department_ids, min(len(department_ids), rng.randint(1, 5)))
+        assignments.extend(Assignment(regulation_id=regulation_id, department_id=dept_id) for dept_id in assigned)
+        for article_number in range(1, article_count + 1):
+            articles.append(Article(
+                id=article_id,
+                regulation_id=regulation_id,
+                title=' '.join(rng.choices(WORDS, k=rng.randint(2, 5))).capitalize(),
+                content=' '.join(sentence(rng, rng.randint(8, 30)) for _ in range(rng.randint(1, 4))),
+                type=rng.choice(Article.TYPE_CHOICES)[0],
+                reference=str(article_number),
+                date_created=created,
+                last_updated=created,
+            ))
+            for dept_id in assigned:
+                if rng.random() < status_chance:
+                    reported = created + (now - created) * rng.random()
+                    statuses.append(ComplianceStatus(
+                        article_id=article_id,
+                        department_id=dept_id,
+                        status=weighted(rng, COMPLIANCE_STATUS_WEIGHTS)[0],
+                        comments=sentence(rng) if rng.random() < 0.2 else '',
+                        created_by_id=rng.choice(user_ids) if user_ids else None,
+                        updated_by_id=rng.choice(user_ids) if user_ids else None,
+                        created_at=reported,
+                        updated_at=reported,
+                    ))
+            article_id += 1
+
+    with explicit_timestamps(Regulation, Article, ComplianceStatus), transaction.atomic():
+        Regulation.objects.bulk_create(regulations)
+        Assignment.objects.bulk_create(assignments)
+        Article.objects.bulk_create(articles)
+        ComplianceStatus.objects.bulk_create(statuses)
+    return Counter(
+        regulations=len(regulations), assignments=len(assignments),
+        articles=len(articles), statuses=len(statuses),
+    )
+
+
+def generate_audit_chunk(plan, number, first_index, count):
+    """Insert count audit log entries spread over the last HISTORY_DAYS. Returns the row counts."""
+    rng = chunk_random(plan, 'audit', number)
+    first_id = plan.first_ids['auditlog'] + first_index
+    now = timezone.now()
+    user_ids = range(plan.first_ids['user'], plan.first_ids['user'] + plan.users)
+    department_ids = range(plan.first_ids['department'], plan.first_ids['department'] + plan.departments)
+    regulation_ids = range(plan.first_ids['regulation'], plan.first_ids['regulation'] + plan.regulations)
+    actions = {action[:4]: action[4] for action in AUDIT_ACTIONS}
+    targets = {'regulation': regulation_ids, 'department': department_ids}
+
+    entries = []
+    for offset, (action_type, method, url_name, target_model) in enumerate(weighted(rng, actions, k=count)):
+        target_ids = targets.get(target_model)
+        target_id = rng.choice(target_ids) if target_ids else None
+        path = f'/{url_name.replace("_", "/")}/' + (f'{target_id}/' if target_id else '')
+        entries.append(AuditLog(
+            id=first_id + offset,
+            user_id=rng.choice(user_ids) if user_ids else None,
+            action_type=action_type,
+            action_details=f'{method} {path}',
+            timestamp=random_moment(rng, now),
+            ip_address=f'10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}',
+            url_name=url_name,
+            method=method,
+            target_model=target_model if target_id else '',
+            target_id=target_id,
+            payload={'params': {}} if method == 'GET' else {'data': {'status': rng.choice(WORDS)}},
+        ))
+    with transaction.atomic():
+        AuditLog.objects.bulk_create(entries)
+    return Counter(audit_logs=len(entries))
+
+
+def next_ids():
+    """First free primary key of each model whose ids the generator assigns."""
+    return {
+        name: (model.objects.aggregate(high=Max('pk'))['high'] or 0) + 1
+        for name, model in (
+            ('department', Department), ('user', User), ('regulation', Regulation), ('article', Article),
+            ('auditlog', AuditLog),
+        )
+    }
+
+
+def reset_sequences():
+    """Move the primary key sequences past the explicitly assigned ids (a no-op on SQLite)."""
+    statements = connection.ops.sequence_reset_sql(no_style(), [Department, User, Regulation, Article, AuditLog])
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def _init_worker():
+    django.setup()
+    # Forked workers must open their own database connections
+    connections.close_all()
+
+
+def run_chunks(tasks, workers, progress, result, started):
+    """Run (function, args) tasks in this process or in a pool of worker processes."""
+    if workers <= 1:
+        for function, args in tasks:
+            result.add(function(*args))
+            if progress:
+                progress(result, time.monotonic() - started)
+        return
+    # Connections must not be inherited by the forked workers
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        futures = [executor.submit(function, *args) for function, args in tasks]
+        for future in as_completed(futures):
+            result.add(future.result())
+            if progress:
+                progress(result, time.monotonic() - started)
+
+
+def generate(plan, workers=1, progress=None):
+    """
+    Generate the data described by plan.
+
+    progress, if given, is called as progress(result_so_far, elapsed_seconds)
+    after each chunk.
+    """
+    result = LoadDataResult()
+    started = time.monotonic()
+    now = timezone.now()
+    plan.first_ids = next_ids()
+    fts = SQLiteFTSBackend()
+
+    result.add(Counter(departments=generate_departments(plan, now), users=generate_users(plan, now)))
+
+    counts = article_counts(plan)
+    status_chance = status_probability(plan, counts)
+    tasks = []
+    first_article_id = plan.first_ids['article']
+    for number, first_index in enumerate(range(0, plan.regulations, plan.chunk_size)):
+        chunk_counts = counts[first_index:first_index + plan.chunk_size]
+        tasks.append((
+            generate_regulation_chunk,
+            (plan, number, first_index, chunk_counts, first_article_id, status_chance),
+        ))
+        first_article_id += sum(chunk_counts)
+    tasks.extend(
+        (generate_audit_chunk, (plan, number, first, min(plan.chunk_size, plan.audit_logs - first)))
+        for number, first in enumerate(range(0, plan.audit_logs, plan.chunk_size))
+    )
+
+    if fts.is_available():
+        # Re-filling the table once is far cheaper than a trigger per inserted row
+        fts.drop_triggers()
+    try:
+        run_chunks(tasks, workers, progress, result, started)
+    finally:
+        if fts.is_available():
+            fts.install()
+            fts.rebuild()
+
+    reset_sequences()
+    rebuild_compliance_rollup()
+    bump_index_generation()
+    return result
@@ -0,0 +1,147 @@
+"""
+Cached, typed access to SystemSetting values.
+
+Every process keeps all SystemSetting rows in memory, so reading a setting
+is a dictionary lookup:
+
+    from core.system_settings import system_settings
+    system_settings.get_int('reminder_days', 7)
+    system_settings.compliance_cycle()
+
+Cross-process invalidation uses a version counter in the SystemSettingsVersion
+table, shared by every worker process. Saving or deleting a SystemSetting
+bumps it once the transaction commits. core.middleware.SystemSettingsMiddleware
+compares the counter with the loaded version once per request, a primary-key
+query, and reloads every row in a single query when they differ.
+
+Loaded values are also reloaded after SYSTEM_SETTINGS_MAX_AGE seconds. This
+bounds the delay for code running outside a request, such as management
+commands and background threads, which never check the counter themselves.
+"""
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F
+
+from .models import SystemSetting, SystemSettingsVersion
+
+# Primary key of the only SystemSettingsVersion row
+VERSION_ROW_ID = 1
+SYSTEM_SETTINGS_MAX_AGE = getattr(settings, 'SYSTEM_SETTINGS_MAX_AGE', 60)
+
+COMPLIANCE_CYCLE_SETTING = 'compliance_cycle'
+DEFAULT_COMPLIANCE_CYCLE = 'quarterly'
+
+TRUE_VALUES = {'1', 'true', 'yes', 'on'}
+FALSE_VALUES = {'0', 'false', 'no', 'off'}
+
+
+def _version_rows():
+    # Always the primary: a lagging replica would hand out an old version
+    return SystemSettingsVersion.objects.using(DEFAULT_DB_ALIAS).filter(pk=VERSION_ROW_ID)
+
+
+def get_settings_version():
+    """Return the current settings version."""
+    return _version_rows().values_list('value', flat=True).first() or 0
+
+
+def bump_settings_version():
+    """Tell every process that its cached settings are stale."""
+    rows = _version_rows()
+    if not rows.update(value=F('value') + 1):
+        # First bump on this database
+        SystemSettingsVersion.objects.using(DEFAULT_DB_ALIAS).get_or_create(pk=VERSION_ROW_ID)
+        rows.update(value=F('value') + 1)
+    return get_settings_version()
+
+
+class SystemSettings:
+    """In-process copy of the SystemSetting table with typed getters."""
+
+    def __init__(self, max_age=SYSTEM_SETTINGS_MAX_AGE):
+        self.max_age = max_age
+        self._values = None
+        self._version = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self, version):
+        values = dict(SystemSetting.objects.values_list('setting_key', 'value'))
+        # Replace the whole dict at once so concurrent readers never see a partial load
+        self._values, self._version, self._loaded_at = values, version, time.monotonic()
+
+    def check(self):
+        """Reload the settings if another process changed them or they are older than max_age."""
+        version = get_settings_version()
+        if version == self._version and time.monotonic() - self._loaded_at < self.max_age:
+            return
+        with self._lock:
+            if version != self._version or time.monotonic() - self._loaded_at >= self.max_age:
+                self._load(version)
+
+    def invalidate(self):
+        """Drop the loaded values; the next read reloads them."""
+        self._version = None
+        self._loaded_at = 0.0
+
+    def all(self):
+        """Return a dict of every setting key and its raw value."""
+        if self._values is None or time.monotonic() - self._loaded_at >= self.max_age:
+            self.check()
+        return self._values
+
+    def get(self, key, default=None):
+        return self.all().get(key, default)
+
+    def get_int(self, key, default=None):
+        try:
+            return int(self.get(key))
+        except (TypeError, ValueError):
+            return default
+
+    def get_float(self, key, default=None):
+        try:
+            return float(self.get(key))
+        except (TypeError, ValueError):
+            return default
+
+    def get_bool(self, key, default=False):
+        value = (self.get(key) or '').strip().lower()
+        if value in TRUE_VALUES:
+            return True
+        if value in FALSE_VALUES:
+            return False
+        return default
+
+    def get_list(self, key, default=None):
+        """Return a comma-separated value as a list of stripped, non-empty items."""
+        value = self.get(key)
+        if value is None:
+            return default if default is not None else []
+        return [item.strip() for item in value.split(',') if item.strip()]
+
+    def get_json(self, key, default=None):
+        try:
+            return json.loads(self.get(key))
+        except (TypeError, ValueError):
+            return default
+
+    def compliance_cycle(self):
+        """Return the configured compliance cycle, one of SystemSetting.COMPLIANCE_CYCLE_CHOICES."""
+        value = self.get(COMPLIANCE_CYCLE_SETTING)
+        if value in dict(SystemSetting.COMPLIANCE_CYCLE_CHOICES):
+            return value
+        return DEFAULT_COMPLIANCE_CYCLE
+
+
+system_settings = SystemSettings()
+
+
+def settings_changed():
+    """Invalidate the settings in this process now and in every other process at their next check."""
+    bump_settings_version()
+    system_settings.invalidate()
@@ -0,0 +1,23 @@
+import tempfile
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from . import metrics
+
+
+class TestRunner(DiscoverRunner):
+    """The default test runner, with a throwaway METRICS_DIR so the suite leaves no metrics files behind."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._metrics_dir = tempfile.TemporaryDirectory(prefix='metrics-')
+        self._metrics_settings = override_settings(METRICS_DIR=self._metrics_dir.name)
+        self._metrics_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._metrics_settings.disable()
+        # The exit flush must not write the suite's counters to the project's METRICS_DIR
+        metrics.registry.configure(None, metrics.METRICS_FLUSH_INTERVAL)
+        self._metrics_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,121 @@
+import json
+from importlib import import_module
+from io import StringIO
+
+from django.apps import apps
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from core.audit import BufferedAuditLogWriter, SyncAuditLogWriter, get_audit_writer
+from core.models import AuditLog, Regulation, User
+
+
+class BufferedAuditLogWriterTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('auditor', password='pw', role='admin')
+        # A long interval keeps the background thread out of the way; the tests flush by hand
+        self.writer = BufferedAuditLogWriter(batch_size=100, flush_interval=60)
+        self.addCleanup(self.writer.close)
+
+    def entry(self, details, user_id=None):
+        return AuditLog(user_id=user_id or self.user.id, action_type='get', action_details=details)
+
+    def test_entries_are_written_on_flush(self):
+        for number in range(3):
+            self.writer.write(self.entry(f'GET /{number}/'))
+        self.assertEqual(AuditLog.objects.count(), 0)
+
+        self.writer.flush()
+
+        self.assertEqual(
+            sorted(AuditLog.objects.values_list('action_details', flat=True)), ['GET /0/', 'GET /1/', 'GET /2/']
+        )
+
+    def test_failing_entry_only_drops_itself(self):
+        batch = [self.entry('GET /before/'), self.entry('GET /orphan/', user_id=999999), self.entry('GET /after/')]
+
+        with self.assertLogs('core.audit', level='WARNING'):
+            self.writer._write_batch(batch)
+
+        self.assertEqual(
+            sorted(AuditLog.objects.values_list('action_details', flat=True)), ['GET /after/', 'GET /before/']
+        )
+
+    def test_close_drains_the_queue(self):
+        self.writer.write(self.entry('GET /queued/'))
+
+        self.writer.close()
+
+        self.assertTrue(AuditLog.objects.filter(action_details='GET /queued/').exists())
+
+
+class AuditLogWriterSettingTests(TestCase):
+    @override_settings(AUDIT_LOG_WRITER='sync')
+    def test_sync_writer_saves_immediately(self):
+        user = User.objects.create_user('auditor', password='pw', role='admin')
+        writer = get_audit_writer()
+        self.assertIsInstance(writer, SyncAuditLogWriter)
+
+        writer.write(AuditLog(user=user, action_type='get', action_details='GET /now/'))
+
+        self.assertTrue(AuditLog.objects.filter(action_details='GET /now/').exists())
+
+
+@override_settings(
+    AUDIT_LOG_WRITER='sync', AUDIT_ARCHIVE_DIR='/nonexistent/audit_archive',
+    SEARCH_BACKENDS=['core.search_backends.DatabaseBackend'],
+)
+class StructuredAuditLogTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('auditor', password='pw', role='compliance_maker')
+        self.client.force_login(self.user)
+
+    def test_middleware_records_structured_entry(self):
+        # Polling endpoints are not audited
+        self.client.get(reverse('get_notifications'))
+        self.client.get(reverse('compliance_regulations'), {'status': 'draft'})
+
+        entry = AuditLog.objects.get()
+        self.assertEqual(entry.action_details, 'GET /compliance/regulations/')
+        self.assertEqual(entry.method, 'GET')
+        self.assertEqual(entry.url_name, 'compliance_regulations')
+        self.assertEqual(entry.payload, {'params': {'status': 'draft'}})
+
+    def test_target_is_taken_from_the_url(self):
+        regulation = Regulation.objects.create(name='Capital', reference='REG-2026-001', description='Rules')
+
+        self.client.get(reverse('compliance_regulation_detail', args=[regulation.pk]))
+
+        entry = AuditLog.objects.get()
+        self.assertEqual((entry.target_model, entry.target_id), ('regulation', regulation.pk))
+
+    def test_search_command_filters_by_target(self):
+        AuditLog.objects.create(user=self.user, action_type='get', action_details='a', target_model='regulation', target_id=1)
+        AuditLog.objects.create(user=self.user, action_type='get', action_details='b', target_model='regulation', target_id=2)
+        out = StringIO()
+
+        call_command('search_audit_logs', target='regulation:2', stdout=out)
+
+        self.assertEqual([json.loads(line)['action_details'] for line in out.getvalue().splitlines()], ['b'])
+
+
+class AuditLogBackfillTests(TestCase):
+    def test_json_details_are_split_into_columns(self):
+        user = User.objects.create(username='auditor', role='admin')
+        legacy = AuditLog.objects.create(user=user, action_type='update', action_details=json.dumps({
+            'url': '/compliance/regulations/7/edit/', 'method': 'POST',
+            'url_name': 'edit_regulation', 'data': {'name': 'Capital'},
+        }))
+        plain = AuditLog.objects.create(user=user, action_type='login', action_details='User auditor logged in')
+        migration = import_module('core.migrations.0014_backfill_auditlog_structured_fields')
+
+        migration.backfill_structured_fields(apps, None)
+
+        legacy.refresh_from_db()
+        self.assertEqual(
+            (legacy.method, legacy.url_name, legacy.target_model, legacy.target_id, legacy.payload),
+            ('POST', 'edit_regulation', 'regulation', 7, {'data': {'name': 'Capital'}}),
+        )
+        plain.refresh_from_db()
+        self.assertEqual(plain.method, '')
@@ -0,0 +1,76 @@
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from core.audit_archive import (
+    ARCHIVE_FIELDS, AuditQuery, archive_audit_logs, iter_archived_records, list_segment_indexes, write_segment
+)
+from core.models import AuditLog, User
+
+
+class AuditArchiveTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.user = User.objects.create(username='auditor', role='admin')
+        self.now = timezone.now()
+        self.cutoff = self.now - timedelta(days=180)
+
+    def log(self, details, days_ago, action_type='get'):
+        entry = AuditLog.objects.create(user=self.user, action_type=action_type, action_details=details)
+        AuditLog.objects.filter(pk=entry.pk).update(timestamp=self.now - timedelta(days=days_ago))
+        return entry.pk
+
+    def archived(self, query=AuditQuery()):
+        return [record['action_details'] for record in iter_archived_records(query, self.directory, newest_first=False)]
+
+    def test_old_entries_move_into_segments(self):
+        for number in range(5):
+            self.log(f'old {number}', days_ago=200)
+        self.log('recent', days_ago=1)
+
+        self.assertEqual(archive_audit_logs(self.cutoff, segment_size=2, directory=self.directory), (5, 3))
+
+        self.assertEqual(list(AuditLog.objects.values_list('action_details', flat=True)), ['recent'])
+        self.assertEqual(self.archived(), [f'old {number}' for number in range(5)])
+        self.assertEqual([index['count'] for index in list_segment_indexes(self.directory)], [2, 2, 1])
+
+    def test_resume_deletes_only_rows_in_the_segment(self):
+        first = self.log('first', days_ago=200)
+        # Not expired when the interrupted run wrote its segment
+        self.log('late', days_ago=170)
+        last = self.log('last', days_ago=200)
+        records = list(AuditLog.objects.filter(pk__in=[first, last]).order_by('id').values(*ARCHIVE_FIELDS))
+        write_segment(records, self.directory)
+
+        archived, segments = archive_audit_logs(self.now - timedelta(days=150), directory=self.directory)
+
+        self.assertEqual((archived, segments), (3, 1))
+        self.assertFalse(AuditLog.objects.exists())
+        self.assertEqual(sorted(self.archived()), ['first', 'last', 'late'])
+
+    def test_segments_are_skipped_by_their_index(self):
+        self.log('viewed', days_ago=200)
+        archive_audit_logs(self.cutoff, directory=self.directory)
+        self.log('created', days_ago=190, action_type='create')
+        archive_audit_logs(self.cutoff, directory=self.directory)
+
+        indexes = list_segment_indexes(self.directory)
+        query = AuditQuery(action_type='create')
+        self.assertEqual([query.matches_segment(index) for index in indexes], [False, True])
+        self.assertEqual(self.archived(query), ['created'])
+        self.assertEqual(self.archived(AuditQuery(user_id=self.user.pk + 1)), [])
+
+    def test_command_dry_run(self):
+        self.log('old', days_ago=200)
+        out = StringIO()
+
+        call_command('archive_audit_logs', dry_run=True, dir=self.directory, stdout=out)
+
+        self.assertIn('1 audit log entries', out.getvalue())
+        self.assertEqual(AuditLog.objects.count(), 1)
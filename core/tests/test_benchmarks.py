@@ -0,0 +1,120 @@
+from urllib.parse import parse_qs, urlsplit
+
+from django.http import StreamingHttpResponse
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.benchmarks import CASES, Measurement, budgets_from_results, check_results, measure, run_cases
+from core.models import Department, Regulation, User
+from core.search_backends import REGULATION_FILTER_PARAMS
+from core.search_cache import search_result_cache
+
+FIXTURES = {'regulation_id': 1, 'department_id': 2, 'issue_date_from': '2025-01-01'}
+
+
+def measurement(queries=5, rows=100, status_code=200, **values):
+    return Measurement(
+        queries=queries, sql_ms=values.get('sql_ms', 1.0), wall_ms=values.get('wall_ms', 10.0),
+        peak_kb=values.get('peak_kb', 100.0), status_code=status_code, rows=rows,
+    )
+
+
+class BenchmarkCaseTests(SimpleTestCase):
+    def test_listing_cases_only_use_honoured_parameters(self):
+        for case in CASES:
+            if case.url_name != 'compliance_regulations':
+                continue
+            params = parse_qs(urlsplit(case.url(FIXTURES)).query)
+            with self.subTest(case=case.name):
+                self.assertLessEqual(set(params), set(REGULATION_FILTER_PARAMS))
+
+    def test_fixture_ids_are_filled_in(self):
+        case = next(case for case in CASES if case.name == 'compliance_regulations_filtered')
+
+        params = parse_qs(urlsplit(case.url(FIXTURES)).query)
+
+        self.assertEqual(params['department'], ['2'])
+        self.assertEqual(params['issue_date_from'], ['2025-01-01'])
+
+
+class BudgetCheckTests(SimpleTestCase):
+    budgets = {'views': {
+        'listing': {'max_queries': 7, 'max_wall_ms': 100},
+        'export': {'max_queries': 6, 'rows_per_query': 100},
+    }}
+
+    def test_results_within_budget_pass(self):
+        results = {
+            'small': {'listing': measurement(), 'export': measurement(queries=4, rows=100)},
+            'large': {'listing': measurement(), 'export': measurement(queries=6, rows=300)},
+        }
+
+        self.assertEqual(check_results(results, self.budgets), [])
+
+    def test_query_growth_fails(self):
+        results = {'small': {'listing': measurement(queries=5)}, 'large': {'listing': measurement(queries=6)}}
+
+        failures = check_results(results, self.budgets)
+
+        self.assertEqual(len(failures), 1)
+        self.assertIn('query count grows', failures[0])
+
+    def test_over_budget_and_errors_fail(self):
+        results = {
+            'small': {'listing': measurement(), 'unknown': measurement()},
+            'large': {'listing': measurement(wall_ms=150, status_code=500), 'unknown': measurement()},
+        }
+
+        failures = check_results(results, self.budgets)
+
+        self.assertIn('listing: returned 500', failures)
+        self.assertIn('listing: wall_ms 150 is over its budget of 100', failures)
+        self.assertIn('unknown: no budget in benchmark_budgets.json', failures)
+
+    def test_new_budgets_keep_rows_per_query_and_headroom(self):
+        results = {'large': {'export': measurement(queries=6, wall_ms=400, sql_ms=1)}}
+
+        views = budgets_from_results(results, self.budgets)['views']
+
+        self.assertEqual(views['export'], {
+            'max_queries': 6, 'rows_per_query': 100, 'max_wall_ms': 1200, 'max_sql_ms': 20, 'max_peak_kb': 512,
+        })
+
+
+@override_settings(AUDIT_LOG_WRITER='sync', SEARCH_BACKENDS=['core.search_backends.DatabaseBackend'])
+class BenchmarkRunTests(TestCase):
+    def test_listing_cases_return_ok(self):
+        department = Department.objects.create(name='Risk')
+        regulation = Regulation.objects.create(name='Capital buffers', reference='REG-2026-001', description='Rules')
+        regulation.assigned_departments.set([department])
+        compliance = User.objects.create(username='compliance', role='compliance_maker')
+        fixtures = {
+            'admin': User.objects.create(username='admin', role='admin', is_staff=True, is_superuser=True),
+            'compliance': compliance,
+            'regulation_id': regulation.id,
+            'department_id': department.id,
+            'issue_date_from': '2020-01-01',
+        }
+        cases = [case for case in CASES if case.url_name == 'compliance_regulations']
+        self.addCleanup(search_result_cache.clear)
+
+        results = run_cases(fixtures, cases)
+
+        self.assertTrue(all(result.queries and result.sql_ms > 0 for result in results.values()))
+        self.assertEqual({name: result.status_code for name, result in results.items()}, dict.fromkeys(
+            [case.name for case in cases], 200
+        ))
+
+
+class StreamingClient:
+    """Stands in for the test client, streaming 10 MB in 100 KB chunks."""
+
+    def get(self, url):
+        return StreamingHttpResponse(b'x' * 100_000 for _ in range(100))
+
+
+class MeasureTests(SimpleTestCase):
+    def test_streamed_chunks_do_not_count_towards_peak_memory(self):
+        result = measure(StreamingClient(), '/', rows=0)
+
+        self.assertEqual((result.status_code, result.queries), (200, 0))
+        self.assertLess(result.peak_kb, 1024)
@@ -0,0 +1,115 @@
+import io
+import json
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+
+from core.bulk_import import detect_format, import_regulations
+from core.forms import RegulationImportForm
+from core import elasticsearch_config
+from core.models import Article, Department, Regulation, SearchIndexOutbox
+
+CSV_HEADER = 'reference,name,description,status,departments,article_reference,article_title,article_content\n'
+
+
+def run_import(text, file_format='csv', **kwargs):
+    return import_regulations(io.BytesIO(text.encode('utf-8')), file_format, reindex=False, **kwargs)
+
+
+class BulkImportTests(TestCase):
+    def setUp(self):
+        self.risk = Department.objects.create(name='Risk')
+        self.finance = Department.objects.create(name='Finance')
+
+    def test_csv_rows_create_regulations_and_articles(self):
+        result = run_import(
+            CSV_HEADER
+            + 'REG-2026-001,Capital,Rules,draft,Risk;Finance,1,Scope,Applies to banks\n'
+            + 'REG-2026-001,Capital,Rules,draft,Risk;Finance,2,Limits,Ten percent\n'
+            + 'REG-2026-002,Liquidity,Buffers,draft,,,,\n'
+        )
+
+        self.assertEqual((result.rows, result.regulations_created, result.articles_created), (3, 2, 2))
+        self.assertEqual(result.errors, [])
+        capital = Regulation.objects.get(reference='REG-2026-001')
+        self.assertEqual(set(capital.assigned_departments.values_list('name', flat=True)), {'Risk', 'Finance'})
+        self.assertEqual(list(capital.articles.order_by('reference').values_list('title', flat=True)), ['Scope', 'Limits'])
+
+    def test_invalid_rows_are_reported_and_the_rest_imported(self):
+        result = run_import(
+            CSV_HEADER
+            + ',No reference,Rules,draft,,,,\n'
+            + 'REG-2026-001,Capital,Rules,draft,Audit,1,Scope,Text\n'
+            + 'REG-2026-001,Capital,Rules,draft,Audit,2,Limits,Text\n'
+            + 'REG-2026-002,Liquidity,Buffers,draft,Risk,1,Scope,Text\n'
+        )
+
+        self.assertEqual([str(error) for error in result.errors], [
+            'Row 2: reference is required',
+            'Row 3: departments: Unknown department Audit',
+            'Row 4: regulation REG-2026-001 is invalid',
+        ])
+        self.assertEqual(list(Regulation.objects.values_list('reference', flat=True)), ['REG-2026-002'])
+
+    def test_rows_for_an_existing_regulation_add_articles(self):
+        regulation = Regulation.objects.create(name='Capital', reference='REG-2026-001', description='Rules')
+        Article.objects.create(regulation=regulation, reference='1', title='Scope', content='Text')
+
+        result = run_import(
+            CSV_HEADER
+            + 'REG-2026-001,Renamed,Rules,draft,,1,Scope,Text\n'
+            + 'REG-2026-001,Renamed,Rules,draft,,2,Limits,Text\n'
+        )
+
+        self.assertEqual((result.regulations_created, result.articles_created), (0, 1))
+        self.assertEqual(str(result.errors[0]), 'Row 2: article_reference: Article 1 already exists in REG-2026-001')
+        self.assertEqual(Regulation.objects.get().name, 'Capital')
+
+    @mock.patch.object(elasticsearch_config, 'es')
+    def test_existing_regulations_with_new_articles_are_queued_for_indexing(self, es):
+        regulation = Regulation.objects.create(name='Capital', reference='REG-2026-001', description='Rules')
+        SearchIndexOutbox.objects.all().delete()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            run_import(
+                CSV_HEADER
+                + 'REG-2026-001,Capital,Rules,draft,,2,Limits,Text\n'
+                + 'REG-2026-002,Liquidity,Rules,draft,,1,Scope,Text\n'
+            )
+
+        self.assertEqual(list(SearchIndexOutbox.objects.values_list('regulation_id', 'action')), [(regulation.pk, 'index')])
+
+    def test_json_articles_list(self):
+        document = [{
+            'reference': 'REG-2026-001', 'name': 'Capital', 'description': 'Rules',
+            'articles': [{'reference': '1', 'title': 'Scope', 'content': 'Text'}],
+        }]
+
+        result = run_import(json.dumps(document), 'json')
+
+        self.assertEqual((result.regulations_created, result.articles_created), (1, 1))
+
+    def test_file_formats(self):
+        self.assertEqual(detect_format('rules.CSV'), 'csv')
+        self.assertEqual(detect_format('rules.jsonl'), 'ndjson')
+        with self.assertRaises(ValueError):
+            detect_format('rules.xml')
+
+
+class RegulationImportFormTests(TestCase):
+    def form(self, name):
+        return RegulationImportForm(files={'import_file': SimpleUploadedFile(name, b'data')})
+
+    def test_known_format_is_accepted(self):
+        form = self.form('rules.ndjson')
+
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.file_format, 'ndjson')
+
+    def test_unknown_format_is_rejected(self):
+        self.assertIn('Unsupported file type', self.form('rules.txt').errors['import_file'][0])
+
+    @mock.patch('core.bulk_import.openpyxl', None)
+    def test_xlsx_is_rejected_without_openpyxl(self):
+        self.assertIn('openpyxl is not installed', self.form('rules.xlsx').errors['import_file'][0])
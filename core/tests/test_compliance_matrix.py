@@ -0,0 +1,83 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.compliance_matrix import ComplianceMatrix
+from core.models import Article, ComplianceStatus, Department, Regulation, User
+
+
+class ComplianceMatrixTests(TestCase):
+    def setUp(self):
+        self.regulation = Regulation.objects.create(name='Capital', reference='REG-2026-001', description='Rules')
+        self.finance = Department.objects.create(name='Finance')
+        self.risk = Department.objects.create(name='Risk')
+        self.regulation.assigned_departments.set([self.risk, self.finance])
+        self.first = Article.objects.create(regulation=self.regulation, reference='1', title='Scope', content='C')
+        self.second = Article.objects.create(regulation=self.regulation, reference='2', title='Limits', content='C')
+        ComplianceStatus.objects.create(article=self.first, department=self.finance, status='compliant')
+        ComplianceStatus.objects.create(article=self.first, department=self.risk, status='non_compliant')
+        ComplianceStatus.objects.create(article=self.second, department=self.finance, status='compliant')
+
+    def test_cells_follow_article_and_department_order(self):
+        matrix = ComplianceMatrix.for_regulation(self.regulation)
+
+        self.assertEqual([row['cells'] for row in matrix.rows()], [
+            ['compliant', 'non_compliant'],
+            ['compliant', 'not_assessed'],
+        ])
+        self.assertEqual([column['name'] for column in matrix.columns()], ['Finance', 'Risk'])
+        self.assertEqual(matrix.status(1, 1), None)
+
+    def test_summaries(self):
+        matrix = ComplianceMatrix.for_regulation(self.regulation)
+
+        finance, risk = matrix.columns()
+        self.assertEqual(finance['summary']['counts']['compliant'], 2)
+        self.assertEqual(risk['summary']['percent']['not_assessed'], 50.0)
+        total = matrix.total_summary()
+        self.assertEqual(total['total'], 4)
+        self.assertEqual(total['counts']['compliant'], 2)
+        self.assertEqual(total['percent']['non_compliant'], 25.0)
+
+    def test_statuses_of_unassigned_departments_are_ignored(self):
+        audit = Department.objects.create(name='Audit')
+        ComplianceStatus.objects.create(article=self.second, department=audit, status='compliant')
+
+        matrix = ComplianceMatrix.for_regulation(self.regulation)
+
+        self.assertEqual(matrix.total_summary()['counts']['compliant'], 2)
+
+    def test_rendered_cells_match_the_statuses(self):
+        row = next(ComplianceMatrix.for_regulation(self.regulation).rows())
+
+        self.assertEqual(row['cells_html'], '<td class="cell cell-compliant"></td><td class="cell cell-non_compliant"></td>')
+
+    def test_empty_regulation(self):
+        regulation = Regulation.objects.create(name='Empty', reference='REG-2026-002', description='Rules')
+
+        matrix = ComplianceMatrix.for_regulation(regulation)
+
+        self.assertEqual(list(matrix.rows()), [])
+        self.assertEqual(matrix.total_summary()['percent']['compliant'], 0.0)
+
+    def test_query_count_does_not_grow_with_the_matrix(self):
+        for number in range(3, 30):
+            Article.objects.create(regulation=self.regulation, reference=str(number), title='T', content='C')
+
+        with self.assertNumQueries(3):
+            matrix = ComplianceMatrix.for_regulation(self.regulation)
+            list(matrix.rows())
+
+
+@override_settings(AUDIT_LOG_WRITER='sync')
+class RegulationDetailViewTests(TestCase):
+    def test_detail_page_shows_the_matrix(self):
+        regulation = Regulation.objects.create(name='Capital', reference='REG-2026-001', description='Rules')
+        regulation.assigned_departments.add(Department.objects.create(name='Risk'))
+        Article.objects.create(regulation=regulation, reference='1', title='Scope', content='C')
+        self.client.force_login(User.objects.create_user('maker', password='pw', role='compliance_maker'))
+
+        response = self.client.get(reverse('compliance_regulation_detail', args=[regulation.pk]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'cell-not_assessed')
+        self.assertEqual(response.context['total']['total'], 1)
@@ -0,0 +1,103 @@
+import json
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.compliance_submissions import submit_compliance_statuses
+from core.models import Article, ComplianceStatus, Department, Regulation, User
+from core.rollups import current_rollup_counts, verify_compliance_rollup
+
+
+class ComplianceSubmissionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='dept', role='dept_maker')
+        self.department = Department.objects.create(name='Risk')
+        self.regulation = Regulation.objects.create(name='Capital', reference='REG-2026-001', description='Rules')
+        self.regulation.assigned_departments.add(self.department)
+        self.articles = [
+            Article.objects.create(regulation=self.regulation, reference=str(number), title='T', content='C')
+            for number in range(1, 4)
+        ]
+
+    def submit(self, *statuses):
+        entries = [{'article': article.pk, 'status': status} for article, status in zip(self.articles, statuses)]
+        return submit_compliance_statuses(self.user, self.department, entries)
+
+    def counts(self):
+        return {status: count for (_, _, status), count in current_rollup_counts().items()}
+
+    def test_first_submission_creates_statuses_and_counts(self):
+        result = self.submit('compliant', 'compliant', 'non_compliant')
+
+        self.assertEqual((result.created, result.updated, result.errors), (3, 0, []))
+        self.assertEqual(self.counts(), {'compliant': 2, 'non_compliant': 1})
+        self.assertEqual(verify_compliance_rollup(), [])
+
+    def test_resubmission_moves_counts(self):
+        self.submit('compliant', 'compliant')
+
+        result = self.submit('non_compliant', 'compliant', 'partially_compliant')
+
+        self.assertEqual((result.created, result.updated), (1, 2))
+        self.assertEqual(self.counts(), {'compliant': 1, 'non_compliant': 1, 'partially_compliant': 1})
+        self.assertEqual(verify_compliance_rollup(), [])
+
+    def test_any_invalid_entry_rejects_the_whole_submission(self):
+        other = Regulation.objects.create(name='Other', reference='REG-2026-002', description='Rules')
+        foreign = Article.objects.create(regulation=other, reference='1', title='T', content='C')
+
+        result = submit_compliance_statuses(self.user, self.department, [
+            {'article': self.articles[0].pk, 'status': 'compliant'},
+            {'article': foreign.pk, 'status': 'compliant'},
+            {'article': self.articles[1].pk, 'status': 'unknown'},
+            {'article': self.articles[0].pk, 'status': 'compliant'},
+        ])
+
+        self.assertEqual([error['index'] for error in result.errors], [1, 2, 3])
+        self.assertFalse(ComplianceStatus.objects.exists())
+
+    def test_department_is_locked_before_previous_statuses_are_read(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.submit('compliant')
+
+        tables = [
+            table for query in queries.captured_queries
+            for table in ('"core_department"', '"core_compliancestatus"')
+            if query['sql'].startswith('SELECT') and f'FROM {table}' in query['sql']
+        ]
+        self.assertEqual(tables[:2], ['"core_department"', '"core_compliancestatus"'])
+
+
+@override_settings(AUDIT_LOG_WRITER='sync')
+class SubmissionViewTests(TestCase):
+    def setUp(self):
+        self.department = Department.objects.create(name='Risk')
+        regulation = Regulation.objects.create(name='Capital', reference='REG-2026-001', description='Rules')
+        regulation.assigned_departments.add(self.department)
+        self.article = Article.objects.create(regulation=regulation, reference='1', title='T', content='C')
+        self.user = User.objects.create_user('dept', password='pw', role='dept_maker')
+        self.client.force_login(self.user)
+        self.url = reverse('submit_compliance_statuses', args=[self.department.pk])
+
+    def post(self, body):
+        return self.client.post(self.url, json.dumps(body), content_type='application/json')
+
+    def test_members_only(self):
+        response = self.post({'statuses': [{'article': self.article.pk, 'status': 'compliant'}]})
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_member_submits(self):
+        self.user.departments.add(self.department)
+
+        response = self.post({'statuses': [{'article': self.article.pk, 'status': 'compliant'}]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(ComplianceStatus.objects.filter(department=self.department, status='compliant').exists())
+
+    def test_malformed_body(self):
+        self.user.departments.add(self.department)
+
+        self.assertEqual(self.post({'items': []}).status_code, 400)
@@ -0,0 +1,118 @@
+from unittest import mock
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from core import db_routing
+from core.db_routing import ReplicaRouter, replica_reads, use_replica
+from core.middleware import ReplicaRoutingMiddleware
+from core.models import AuditLog, Regulation
+
+router = ReplicaRouter()
+
+
+def current_replica():
+    state = db_routing._state.get()
+    return state.replica if state else None
+
+
+@mock.patch.object(db_routing, 'DATABASE_REPLICAS', ['replica'])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.addCleanup(db_routing.finish_request)
+
+    def test_reads_use_the_primary_outside_a_read_path(self):
+        db_routing.start_request()
+
+        self.assertIsNone(router.db_for_read(Regulation))
+        self.assertEqual(router.db_for_write(Regulation), 'default')
+
+    def test_reads_use_a_replica_inside_a_read_path(self):
+        with use_replica() as alias:
+            self.assertEqual(alias, 'replica')
+            self.assertEqual(router.db_for_read(Regulation), 'replica')
+
+        self.assertIsNone(router.db_for_read(Regulation))
+
+    def test_writing_moves_the_rest_of_the_request_to_the_primary(self):
+        db_routing.start_request()
+
+        with use_replica():
+            router.db_for_write(Regulation)
+            self.assertIsNone(router.db_for_read(Regulation))
+        with use_replica() as alias:
+            self.assertIsNone(alias)
+
+    def test_audit_entries_do_not_count_as_writes(self):
+        db_routing.start_request()
+
+        with use_replica():
+            router.db_for_write(AuditLog)
+            self.assertEqual(router.db_for_read(Regulation), 'replica')
+
+    def test_pinned_requests_stay_on_the_primary(self):
+        db_routing.start_request(pinned=True)
+
+        with use_replica() as alias:
+            self.assertIsNone(alias)
+            self.assertIsNone(router.db_for_read(Regulation))
+
+    def test_reads_in_a_transaction_stay_on_the_primary(self):
+        with use_replica(), mock.patch.object(db_routing.connections['default'], 'in_atomic_block', True):
+            self.assertEqual(router.db_for_read(Regulation), 'default')
+
+    def test_migrations_skip_replicas(self):
+        self.assertFalse(router.allow_migrate('replica', 'core'))
+        self.assertIsNone(router.allow_migrate('default', 'core'))
+
+    def test_relations_between_primary_and_replica_rows(self):
+        primary, replica, other = Regulation(), Regulation(), Regulation()
+        primary._state.db, replica._state.db, other._state.db = 'default', 'replica', 'archive'
+
+        self.assertTrue(router.allow_relation(primary, replica))
+        self.assertIsNone(router.allow_relation(primary, other))
+
+
+@mock.patch.object(db_routing, 'DATABASE_REPLICAS', ['replica'])
+class ReplicaReadsTests(SimpleTestCase):
+    def test_streamed_content_is_read_from_the_replica(self):
+        @replica_reads
+        def view(request):
+            return StreamingHttpResponse(current_replica() for _ in range(3))
+
+        response = view(RequestFactory().get('/'))
+
+        self.assertIsNone(current_replica())
+        self.assertEqual(list(response.streaming_content), [b'replica'] * 3)
+        self.assertIsNone(current_replica())
+
+    def test_middleware_pins_users_who_wrote(self):
+        def view(request):
+            router.db_for_write(Regulation)
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(view)(RequestFactory().get('/'))
+
+        self.assertIn(db_routing.REPLICA_PIN_COOKIE, response.cookies)
+        self.assertEqual(response.cookies[db_routing.REPLICA_PIN_COOKIE]['max-age'], db_routing.REPLICA_PIN_SECONDS)
+
+    def test_middleware_does_not_pin_readers(self):
+        def view(request):
+            with use_replica() as alias:
+                self.assertEqual(alias, 'replica')
+            router.db_for_write(AuditLog)
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(view)(RequestFactory().get('/'))
+
+        self.assertNotIn(db_routing.REPLICA_PIN_COOKIE, response.cookies)
+
+    def test_pin_cookie_keeps_reads_on_the_primary(self):
+        def view(request):
+            with use_replica() as alias:
+                return HttpResponse(str(alias))
+
+        request = RequestFactory().get('/')
+        request.COOKIES[db_routing.REPLICA_PIN_COOKIE] = '1'
+
+        self.assertEqual(ReplicaRoutingMiddleware(view)(request).content, b'None')
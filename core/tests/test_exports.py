@@ -0,0 +1,125 @@
+import csv
+import gzip
+import io
+import json
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Article, AuditLog, Department, Regulation, User
+
+
+def streamed_text(response):
+    return b''.join(response.streaming_content).decode('utf-8')
+
+
+@override_settings(AUDIT_LOG_WRITER='sync', AUDIT_ARCHIVE_DIR='/nonexistent/audit_archive')
+class AuditLogExportTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw', role='admin')
+        self.maker = User.objects.create_user('maker', password='pw', role='compliance_maker')
+        now = timezone.now()
+        AuditLog.objects.bulk_create([
+            AuditLog(user=self.maker, action_type='create', action_details='older', timestamp=now - timedelta(days=2)),
+            AuditLog(user=self.admin, action_type='update', action_details='newer', timestamp=now - timedelta(days=1)),
+        ])
+        self.client.force_login(self.admin)
+
+    def export(self, **params):
+        response = self.client.get(reverse('export_audit_logs'), {'archive': '0', **params})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response
+
+    def test_rows_are_streamed_newest_first(self):
+        rows = list(csv.reader(io.StringIO(streamed_text(self.export()))))
+
+        self.assertEqual(rows[0][:3], ['User', 'Action Type', 'Action Details'])
+        # The export request itself is audited first
+        self.assertEqual([row[2] for row in rows[1:]], ['GET /admin/export/audit-logs/', 'newer', 'older'])
+
+    def test_user_filter(self):
+        rows = list(csv.reader(io.StringIO(streamed_text(self.export(user_id=self.maker.id)))))
+
+        self.assertEqual([row[2] for row in rows[1:]], ['older'])
+
+    def test_gzip_download(self):
+        response = self.export(compress='gzip')
+
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('older', gzip.decompress(b''.join(response.streaming_content)).decode('utf-8'))
+
+    def test_query_count_does_not_grow_with_rows(self):
+        AuditLog.objects.bulk_create(
+            [AuditLog(user=self.maker, action_type='get', action_details=f'GET /{n}/') for n in range(300)]
+        )
+        # Settings version, session and user lookups, the audit entry, then one query for the rows
+        with self.assertNumQueries(5):
+            streamed_text(self.export())
+
+
+@override_settings(AUDIT_LOG_WRITER='sync')
+class RegulationExportTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw', role='admin')
+        self.risk = Department.objects.create(name='Risk')
+        self.finance = Department.objects.create(name='Finance')
+        for number in range(3):
+            regulation = Regulation.objects.create(
+                name=f'Regulation {number}', reference=f'REG-2026-{number + 1:03d}', description='Rules',
+                status='draft' if number else 'fully_approved', created_by=self.admin,
+            )
+            regulation.assigned_departments.set([self.risk, self.finance])
+            Article.objects.create(regulation=regulation, reference='1', title='Scope', content='Applies to banks')
+        self.client.force_login(self.admin)
+
+    def export(self, **params):
+        response = self.client.get(reverse('export_regulations'), params)
+        self.assertEqual(response.status_code, 200)
+        return streamed_text(response)
+
+    def test_csv(self):
+        rows = list(csv.reader(io.StringIO(self.export())))
+
+        self.assertEqual(rows[0][0], 'Name')
+        self.assertEqual([row[0] for row in rows[1:]], ['Regulation 0', 'Regulation 1', 'Regulation 2'])
+        self.assertEqual(sorted(rows[1][6].split(', ')), ['Finance', 'Risk'])
+
+    def test_ndjson_with_articles(self):
+        records = [json.loads(line) for line in self.export(format='articles').splitlines()]
+
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[0]['reference'], 'REG-2026-001')
+        self.assertEqual(records[0]['articles'], [
+            {'reference': '1', 'title': 'Scope', 'type': 'regulation', 'content': 'Applies to banks'}
+        ])
+
+    def test_filters_apply(self):
+        records = [json.loads(line) for line in self.export(format='ndjson', status='fully_approved').splitlines()]
+
+        self.assertEqual([record['name'] for record in records], ['Regulation 0'])
+
+    def test_unknown_format_is_rejected(self):
+        response = self.client.get(reverse('export_regulations'), {'format': 'xml'})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.export(format='articles')
+            return len(queries)
+
+        before = count_queries()
+        for number in range(3, 20):
+            regulation = Regulation.objects.create(
+                name=f'Regulation {number}', reference=f'REG-2026-{number + 1:03d}', description='Rules'
+            )
+            regulation.assigned_departments.set([self.risk])
+            Article.objects.create(regulation=regulation, reference='1', title='Scope', content='Text')
+
+        self.assertEqual(count_queries(), before)
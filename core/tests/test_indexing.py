@@ -0,0 +1,166 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from core import elasticsearch_config
+from core.elasticsearch_config import (
+    delete_old_regulation_indices, get_reindex_target, set_reindex_target, swap_regulation_alias, write_indices
+)
+from core.indexing import IndexingResult, index_batch, iter_batches, run_bulk_index, split_pk_ranges
+from core.models import Regulation
+
+
+def create_regulations(count):
+    return [
+        Regulation.objects.create(name=f'Regulation {number}', reference=f'REG-2026-{number:03d}', description='Rules')
+        for number in range(1, count + 1)
+    ]
+
+
+class BulkIndexingTests(TestCase):
+    def setUp(self):
+        self.regulations = create_regulations(7)
+
+    def test_pk_ranges_cover_every_regulation_once(self):
+        ranges = split_pk_ranges(3)
+
+        covered = [pk for start, end in ranges for pk in range(start, end)]
+        self.assertEqual(covered, list(range(self.regulations[0].pk, self.regulations[-1].pk + 1)))
+        self.assertEqual(len(ranges), 3)
+
+    def test_no_ranges_without_regulations(self):
+        Regulation.objects.all().delete()
+
+        self.assertEqual(split_pk_ranges(3), [])
+
+    def test_batches_follow_pk_order(self):
+        batches = list(iter_batches(Regulation.objects.all(), 3))
+
+        self.assertEqual([len(batch) for batch in batches], [3, 3, 1])
+        self.assertEqual([r.pk for batch in batches for r in batch], [r.pk for r in self.regulations])
+
+    @mock.patch('core.indexing.time.sleep')
+    @mock.patch('core.elasticsearch_config.bulk_index_regulations')
+    def test_failed_batch_is_retried(self, bulk_index, sleep):
+        bulk_index.side_effect = [ConnectionError('down'), (7, [])]
+
+        with self.assertLogs('core.indexing', level='WARNING'):
+            result = index_batch(self.regulations, 'regulations_v1', max_retries=3, backoff=1.0)
+
+        self.assertEqual((result.indexed, result.failed, result.batches), (7, 0, 1))
+        sleep.assert_called_once_with(1.0)
+
+    @mock.patch('core.indexing.time.sleep')
+    @mock.patch('core.elasticsearch_config.bulk_index_regulations', side_effect=ConnectionError('down'))
+    def test_batch_counts_as_failed_after_the_last_retry(self, bulk_index, sleep):
+        with self.assertLogs('core.indexing', level='ERROR'):
+            result = index_batch(self.regulations, 'regulations_v1', max_retries=2, backoff=1.0)
+
+        self.assertEqual((result.indexed, result.failed), (0, 7))
+        self.assertEqual(bulk_index.call_count, 3)
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [1.0, 2.0])
+
+    @mock.patch('core.elasticsearch_config.bulk_index_regulations')
+    def test_document_errors_are_counted(self, bulk_index):
+        bulk_index.return_value = (6, [{'index': {'_id': self.regulations[0].pk, 'error': 'mapper_parsing_exception'}}])
+
+        with self.assertLogs('core.indexing', level='ERROR'):
+            result = index_batch(self.regulations, 'regulations_v1')
+
+        self.assertEqual((result.indexed, result.failed), (6, 1))
+
+    @mock.patch('core.elasticsearch_config.bulk_index_regulations')
+    def test_run_bulk_index_sends_every_regulation(self, bulk_index):
+        bulk_index.side_effect = lambda batch, index, chunk_size: (len(batch), [])
+        progress = mock.Mock()
+
+        result = run_bulk_index('regulations_v1', workers=1, batch_size=2, progress=progress)
+
+        self.assertEqual((result.indexed, result.failed, result.batches), (7, 0, 4))
+        sent = [r.pk for call in bulk_index.call_args_list for r in call.args[0]]
+        self.assertEqual(sent, [r.pk for r in self.regulations])
+        self.assertEqual({call.kwargs['index'] for call in bulk_index.call_args_list}, {'regulations_v1'})
+        progress.assert_called_once()
+
+
+class VersionedIndexTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(elasticsearch_config, 'es')
+        self.es = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_swap_moves_the_alias_in_one_request(self):
+        self.es.indices.exists_alias.return_value = True
+        self.es.indices.get_alias.return_value = {'regulations_v1': {}}
+
+        swap_regulation_alias('regulations_v2')
+
+        self.es.indices.update_aliases.assert_called_once_with(actions=[
+            {'remove': {'index': 'regulations_v1', 'alias': 'regulations'}},
+            {'add': {'index': 'regulations_v2', 'alias': 'regulations'}},
+        ])
+
+    def test_swap_replaces_a_concrete_index(self):
+        self.es.indices.exists_alias.return_value = False
+        self.es.indices.exists.return_value = True
+
+        swap_regulation_alias('regulations_v2')
+
+        self.es.indices.update_aliases.assert_called_once_with(actions=[
+            {'remove_index': {'index': 'regulations'}},
+            {'add': {'index': 'regulations_v2', 'alias': 'regulations'}},
+        ])
+
+    def test_old_versions_are_deleted_except_live_and_rebuilding(self):
+        self.es.indices.exists_alias.return_value = True
+        self.es.indices.get_alias.return_value = {'regulations_v3': {}}
+        self.es.indices.get.return_value = dict.fromkeys(
+            ['regulations_v1', 'regulations_v2', 'regulations_v3', 'regulations_v4']
+        )
+        set_reindex_target('regulations_v4')
+
+        deleted = delete_old_regulation_indices(keep=1)
+
+        self.assertEqual(deleted, ['regulations_v1'])
+        self.es.indices.delete.assert_called_once_with(index='regulations_v1')
+
+    def test_writes_go_to_the_rebuild_target(self):
+        self.assertEqual(write_indices(), ['regulations'])
+
+        set_reindex_target('regulations_v2')
+        self.assertEqual(write_indices(), ['regulations', 'regulations_v2'])
+
+        set_reindex_target(None)
+        self.assertEqual(write_indices(), ['regulations'])
+
+    @mock.patch('core.management.commands.recreate_elasticsearch_index.run_bulk_index')
+    def test_rebuild_swaps_the_alias(self, run):
+        run.return_value = IndexingResult(indexed=3, batches=1)
+        self.es.indices.exists_alias.return_value = True
+        self.es.indices.get_alias.return_value = {'regulations_v1': {}}
+        self.es.indices.get.return_value = {'regulations_v1': {}}
+
+        call_command('recreate_elasticsearch_index', stdout=StringIO())
+
+        new_index = run.call_args.args[0]
+        self.assertTrue(new_index.startswith('regulations_v'))
+        self.assertEqual(
+            self.es.indices.update_aliases.call_args.kwargs['actions'][-1],
+            {'add': {'index': new_index, 'alias': 'regulations'}},
+        )
+        self.assertIsNone(get_reindex_target())
+
+    @mock.patch('core.management.commands.recreate_elasticsearch_index.run_bulk_index')
+    def test_failed_rebuild_keeps_the_current_index(self, run):
+        run.return_value = IndexingResult(indexed=2, failed=1, batches=1)
+
+        with self.assertRaises(CommandError):
+            call_command('recreate_elasticsearch_index', stdout=StringIO())
+
+        new_index = run.call_args.args[0]
+        self.es.indices.update_aliases.assert_not_called()
+        self.es.options.return_value.indices.delete.assert_called_once_with(index=new_index)
+        self.assertIsNone(get_reindex_target())
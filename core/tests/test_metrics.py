@@ -0,0 +1,133 @@
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core import metrics
+from core.metrics import EXITED_FILE, MetricsRegistry
+from core.models import User
+from core.search_cache import search_result_cache
+
+LIVE_PIDS = {101}
+
+
+def write_process_file(directory, pid, started, counters=(), gauges=()):
+    path = os.path.join(directory, f'{pid}-{started}.json')
+    with open(path, 'w', encoding='utf-8') as metrics_file:
+        json.dump({'pid': pid, 'counters': list(counters), 'gauges': list(gauges)}, metrics_file)
+    return path
+
+
+def responses(count):
+    return ['compliance_http_responses_total', [['status', '200'], ['view', 'home']], count]
+
+
+@mock.patch('core.metrics._is_alive', lambda pid: pid in LIVE_PIDS)
+# The search cache counters of this process depend on the tests that ran before
+@mock.patch('core.metrics.process_counters', dict)
+class MetricsFileTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.registry = MetricsRegistry(directory=self.directory)
+        # The registry's exit hook must not write into the removed directory
+        self.addCleanup(setattr, self.registry, 'directory', None)
+        search_result_cache.clear()
+
+    def files(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith('.json'))
+
+    def total(self, name, labels=(('status', '200'), ('view', 'home'))):
+        return self.registry.collect()[name].get(labels, 0)
+
+    def test_process_without_values_writes_no_file(self):
+        self.registry.flush(force=True)
+
+        self.assertEqual(self.files(), [])
+
+    def test_recorded_values_are_written(self):
+        self.registry.inc('compliance_http_responses_total', {'view': 'home', 'status': '200'})
+
+        self.registry.flush(force=True)
+
+        self.assertEqual(self.files(), [os.path.basename(self.registry._path)])
+
+    def test_exited_processes_are_merged_into_one_file(self):
+        write_process_file(self.directory, 201, 1, [responses(2)])
+        write_process_file(self.directory, 202, 1, [responses(3)])
+        self.registry.inc('compliance_http_responses_total', {'view': 'home', 'status': '200'})
+
+        self.assertEqual(self.total('compliance_http_responses_total'), 6)
+        self.assertEqual(self.files(), sorted([EXITED_FILE, os.path.basename(self.registry._path)]))
+
+        write_process_file(self.directory, 203, 1, [responses(4)])
+
+        self.assertEqual(self.total('compliance_http_responses_total'), 10)
+        self.assertNotIn('203-1.json', self.files())
+
+    def test_gauges_only_come_from_live_processes(self):
+        queue = ['compliance_audit_log_queue_size', [], 3]
+        write_process_file(self.directory, 101, 2, [responses(1)], [queue])
+        # An exited process whose id was reused, and one whose id was not
+        write_process_file(self.directory, 101, 1, [responses(1)], [queue])
+        write_process_file(self.directory, 202, 1, [responses(1)], [queue])
+
+        samples = self.registry.collect()
+
+        self.assertEqual(samples['compliance_audit_log_queue_size'][()], 3)
+        self.assertEqual(samples['compliance_http_responses_total'][(('status', '200'), ('view', 'home'))], 3)
+        self.assertEqual(self.files(), sorted(['101-2.json', EXITED_FILE]))
+
+    def test_files_already_merged_are_not_counted_twice(self):
+        path = write_process_file(self.directory, 202, 1, [responses(2)])
+        with open(os.path.join(self.directory, EXITED_FILE), 'w', encoding='utf-8') as exited:
+            # A compaction that stopped before it removed the file it merged
+            json.dump({'pid': None, 'counters': [responses(2)], 'gauges': [], 'merged': ['202-1.json']}, exited)
+
+        with mock.patch('core.metrics.fcntl', None):
+            self.assertEqual(self.total('compliance_http_responses_total'), 2)
+        self.assertTrue(os.path.exists(path))
+
+        self.assertEqual(self.total('compliance_http_responses_total'), 2)
+        self.assertFalse(os.path.exists(path))
+
+
+class MetricsSettingsTests(SimpleTestCase):
+    def test_overridden_directory_is_used(self):
+        previous = metrics.registry.directory
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            self.assertEqual(metrics.registry.directory, directory)
+            self.assertEqual(os.path.dirname(metrics.registry._path), directory)
+
+        self.assertEqual(metrics.registry.directory, previous)
+
+
+@override_settings(AUDIT_LOG_WRITER='sync')
+class MetricsViewTests(TestCase):
+    def test_anonymous_requests_are_refused_even_from_loopback(self):
+        # Behind a reverse proxy every request comes from 127.0.0.1
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+    def test_admins_can_read_the_metrics(self):
+        self.client.force_login(User.objects.create(username='admin', role='admin'))
+
+        response = self.client.get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('# TYPE compliance_unread_notifications gauge', response.content.decode())
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_scrapers_authenticate_with_the_token(self):
+        url = reverse('metrics')
+
+        self.assertEqual(self.client.get(url, headers={'Authorization': 'Bearer s3cret'}).status_code, 200)
+        self.assertEqual(self.client.get(url, headers={'Authorization': 'Bearer wrong'}).status_code, 403)
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.5'])
+    def test_allowed_addresses_are_opt_in(self):
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.5').status_code, 200)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import threading
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+
+from core.models import Notification, User
+from core.notifications import broker, format_event, notification_event, notification_event_stream
+
+
+def event_id(chunk):
+    return int(chunk.split('\n')[0][len('id: '):])
+
+
+class NotificationStreamTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('maker', password='pw', role='compliance_maker')
+        self.notifications = [
+            Notification.objects.create(recipient=self.user, title=f'Notice {number}', message='Body')
+            for number in range(3)
+        ]
+        Notification.objects.filter(pk=self.notifications[0].pk).update(read=True)
+
+    async def open_stream(self, last_event_id=None):
+        stream = notification_event_stream(self.user.pk, last_event_id)
+        self.assertEqual(await anext(stream), 'retry: 5000\n\n')
+        return stream
+
+    async def test_fresh_stream_starts_with_unread_notifications(self):
+        stream = await self.open_stream()
+        try:
+            chunks = [await anext(stream) for _ in range(2)]
+        finally:
+            await stream.aclose()
+
+        self.assertEqual([event_id(chunk) for chunk in chunks], [n.pk for n in self.notifications[1:]])
+
+    async def test_reconnect_resumes_after_last_event_id(self):
+        stream = await self.open_stream(last_event_id=self.notifications[0].pk)
+        try:
+            chunks = [await anext(stream) for _ in range(2)]
+        finally:
+            await stream.aclose()
+
+        # Read or not, everything after the last event the browser saw is sent
+        self.assertEqual([event_id(chunk) for chunk in chunks], [n.pk for n in self.notifications[1:]])
+
+    async def test_published_events_are_forwarded_once(self):
+        stream = await self.open_stream(last_event_id=self.notifications[-1].pk)
+        try:
+            pending = asyncio.ensure_future(anext(stream))
+            await asyncio.sleep(0)
+            event = {'id': self.notifications[-1].pk + 1, 'title': 'Live'}
+            # Publishing is thread-safe, e.g. from an on_commit hook in a sync worker thread
+            thread = threading.Thread(target=broker.publish, args=(self.user.pk, event))
+            thread.start()
+            thread.join()
+            chunk = await asyncio.wait_for(pending, 1)
+            self.assertEqual(json.loads(chunk.split('data: ')[1]), event)
+
+            # A stale event with an id already sent is skipped, so the next chunk is a keep-alive
+            broker.publish(self.user.pk, event)
+            with mock.patch('core.notifications.NOTIFICATION_STREAM_HEARTBEAT', 0.01):
+                self.assertEqual(await asyncio.wait_for(anext(stream), 1), ': keep-alive\n\n')
+        finally:
+            await stream.aclose()
+
+    async def test_closed_stream_unsubscribes(self):
+        stream = await self.open_stream()
+        self.assertEqual(broker.subscriber_count(), 1)
+
+        await stream.aclose()
+
+        self.assertEqual(broker.subscriber_count(), 0)
+
+    def test_event_format(self):
+        event = notification_event(self.notifications[1])
+
+        self.assertEqual(
+            format_event(event), f"id: {event['id']}\nevent: notification\ndata: {json.dumps(event)}\n\n"
+        )
+        self.assertEqual(event['title'], 'Notice 1')
+
+
+@override_settings(AUDIT_LOG_WRITER='sync')
+class NotificationStreamServerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='maker', role='compliance_maker')
+
+    def test_stream_is_refused_under_wsgi(self):
+        # The test client goes through the WSGI request handler
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('notification_stream'))
+
+        self.assertEqual(response.status_code, 501)
+        self.assertFalse(response.streaming)
+
+    def test_dashboard_only_opens_the_stream_under_asgi(self):
+        self.client.force_login(self.user)
+        self.assertNotContains(self.client.get(reverse('compliance_dashboard')), 'EventSource')
+
+        async_client = AsyncClient()
+        async_client.cookies = self.client.cookies
+        response = async_to_sync(async_client.get)(reverse('compliance_dashboard'))
+
+        self.assertContains(response, 'EventSource')
@@ -0,0 +1,91 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from core.models import Department, Notification, NotificationTemplate, Regulation, User
+from core.notifications import EVENT_REGULATION_ACTION_REQUIRED, fan_out_notifications
+
+
+class FanOutNotificationTests(TestCase):
+    def setUp(self):
+        self.risk = Department.objects.create(name='Risk')
+        self.finance = Department.objects.create(name='Finance')
+        self.regulation = Regulation.objects.create(name='Capital', reference='REG-2026-001', description='Rules')
+        self.regulation.assigned_departments.set([self.risk, self.finance])
+        self.users = []
+        for number in range(5):
+            user = User.objects.create(username=f'user{number}', role='compliance_maker')
+            user.departments.add(self.risk)
+            self.users.append(user)
+        # In both assigned departments, but notified once
+        self.users[0].departments.add(self.finance)
+        inactive = User.objects.create(username='inactive', role='compliance_maker', is_active=False)
+        inactive.departments.add(self.risk)
+        User.objects.create(username='elsewhere', role='compliance_maker').departments.add(
+            Department.objects.create(name='Audit')
+        )
+
+    def fan_out(self, **kwargs):
+        return fan_out_notifications(self.regulation, EVENT_REGULATION_ACTION_REQUIRED, **kwargs)
+
+    def test_active_users_of_assigned_departments_are_notified_once(self):
+        self.assertEqual(self.fan_out(chunk_size=2), 5)
+
+        self.assertEqual(
+            sorted(Notification.objects.values_list('recipient_id', flat=True)), [user.pk for user in self.users]
+        )
+        notification = Notification.objects.first()
+        self.assertEqual(notification.title, 'Action required: REG-2026-001')
+        self.assertEqual(notification.related_regulation, self.regulation)
+
+    def test_active_template_is_used(self):
+        NotificationTemplate.objects.create(
+            name='Old', subject='Unused', body='Unused', event_type=EVENT_REGULATION_ACTION_REQUIRED, active=False
+        )
+        NotificationTemplate.objects.create(
+            name='Current', subject='{{ regulation.name }} & you', body='See {{ regulation.reference }}',
+            event_type=EVENT_REGULATION_ACTION_REQUIRED,
+        )
+
+        self.fan_out()
+
+        # Stored unescaped; templates escape notifications when they display them
+        self.assertEqual(
+            set(Notification.objects.values_list('title', 'message')), {('Capital & you', 'See REG-2026-001')}
+        )
+
+    def test_unread_counters_are_incremented(self):
+        self.fan_out()
+        self.fan_out()
+
+        self.assertEqual(
+            set(User.objects.filter(pk__in=[u.pk for u in self.users]).values_list('unread_notification_count', flat=True)),
+            {2},
+        )
+        self.assertEqual(User.objects.get(username='inactive').unread_notification_count, 0)
+
+    def test_query_count_does_not_grow_with_recipients(self):
+        # Template lookup and recipients, per chunk an INSERT and a counter UPDATE, and the savepoint
+        with self.assertNumQueries(8):
+            self.fan_out(chunk_size=3)
+
+    @mock.patch('core.notifications.broker.publish')
+    def test_recipients_are_published_to_after_commit(self, publish):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.fan_out()
+        publish.assert_not_called()
+
+        for callback in callbacks:
+            callback()
+
+        self.assertEqual(sorted(call.args[0] for call in publish.call_args_list), [user.pk for user in self.users])
+
+    def test_status_change_triggers_the_fan_out(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.regulation.status = 'action_required_from_department'
+            self.regulation.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            # Saving again without a status change notifies nobody
+            self.regulation.save()
+
+        self.assertEqual(Notification.objects.count(), 5)
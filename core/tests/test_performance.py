@@ -0,0 +1,102 @@
+import json
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core import performance
+from core.models import Regulation, User
+from core.performance import RequestTimings, explain, timed
+
+
+def server_timing_metrics(response):
+    return {metric.split(';')[0] for metric in response['Server-Timing'].split(', ')}
+
+
+@override_settings(AUDIT_LOG_WRITER='sync', SEARCH_BACKENDS=['core.search_backends.DatabaseBackend'])
+class PerformanceMiddlewareTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='maker', role='compliance_maker')
+        self.client.force_login(self.user)
+        self.regulation = Regulation.objects.create(name='Capital', reference='REG-2026-001', description='Rules')
+
+    @override_settings(SERVER_TIMING_PUBLIC=True)
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('compliance_regulation_detail', args=[self.regulation.pk]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(server_timing_metrics(response), {'sql', 'tpl', 'audit', 'total'})
+        self.assertRegex(response['Server-Timing'], r'sql;dur=[\d.]+;desc="SQL \(\d+\)"')
+
+    def test_fast_requests_are_not_logged(self):
+        with self.assertNoLogs('core.performance.slow_requests'):
+            self.client.get(reverse('compliance_regulation_detail', args=[self.regulation.pk]))
+
+    def test_server_timing_is_only_sent_to_admins(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('login')))
+
+        self.client.force_login(User.objects.create(username='admin', role='admin'))
+
+        self.assertIn('Server-Timing', self.client.get(reverse('login')))
+
+    @override_settings(SLOW_REQUEST_THRESHOLD_MS=0)
+    def test_slow_requests_are_logged_with_their_queries(self):
+        with self.assertLogs('core.performance.slow_requests', level='WARNING') as logs:
+            self.client.get(reverse('compliance_regulation_detail', args=[self.regulation.pk]))
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(
+            (record['method'], record['view'], record['status'], record['user_id']),
+            ('GET', 'compliance_regulation_detail', 200, self.user.pk),
+        )
+        self.assertGreater(record['phases']['sql']['count'], 0)
+        self.assertLessEqual(len(record['top_sql']), 5)
+        select = next(query for query in record['top_sql'] if query['sql'].startswith('SELECT'))
+        self.assertTrue(select['explain'])
+
+
+class RequestTimingsTests(SimpleTestCase):
+    def test_top_queries_groups_statements(self):
+        timings = RequestTimings()
+        timings.queries = [
+            (0.001, 'default', 'SELECT a', (1,)),
+            (0.003, 'default', 'SELECT a', (2,)),
+            (0.002, 'default', 'SELECT b', (3,)),
+        ]
+
+        top = timings.top_queries(1)
+
+        self.assertEqual(len(top), 1)
+        self.assertEqual((top[0]['sql'], top[0]['count'], top[0]['params']), ('SELECT a', 2, (2,)))
+        self.assertAlmostEqual(top[0]['total_ms'], 4.0)
+
+    def test_phases_without_calls_are_left_out(self):
+        timings = RequestTimings()
+        timings.add('es', 0.01)
+        timings.finish()
+
+        self.assertEqual(
+            [metric.split(';')[0] for metric in timings.server_timing().split(', ')], ['sql', 'es', 'total']
+        )
+
+    def test_timed_blocks_count_towards_the_current_request(self):
+        timings, wrappers = performance.start_request()
+        with timed('es'):
+            pass
+        performance.finish_request(timings, wrappers)
+        # Outside a request there is nothing to add to
+        with timed('es'):
+            pass
+
+        self.assertEqual(timings.counts['es'], 1)
+
+    def test_overridden_settings_are_read_again(self):
+        with override_settings(SLOW_REQUEST_THRESHOLD_MS=5, PERFORMANCE_INSTRUMENTATION=False):
+            self.assertEqual(
+                (performance.SLOW_REQUEST_THRESHOLD_MS, performance.PERFORMANCE_INSTRUMENTATION), (5, False)
+            )
+
+        self.assertEqual(performance.SLOW_REQUEST_THRESHOLD_MS, 1000)
+
+    def test_only_single_selects_are_explained(self):
+        self.assertIsNone(explain('default', 'UPDATE core_regulation SET name = %s', ('x',)))
+        self.assertIsNone(explain('default', 'SELECT 1', None))
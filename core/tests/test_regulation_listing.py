@@ -0,0 +1,91 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Department, Regulation, User
+from core.search_backends import DatabaseBackend, decode_cursor, encode_cursor
+from core.search_cache import search_result_cache
+
+
+def create_regulations(count):
+    regulations = [
+        Regulation.objects.create(name=f'Regulation {number}', reference=f'REG-2026-{number:03d}', description='Rules')
+        for number in range(1, count + 1)
+    ]
+    # Spread the update times out so the expected order does not depend on the clock
+    now = timezone.now()
+    for offset, regulation in enumerate(regulations):
+        Regulation.objects.filter(pk=regulation.pk).update(last_updated=now - timedelta(minutes=offset))
+    return regulations
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.backend = DatabaseBackend()
+        self.regulations = create_regulations(7)
+
+    def walk(self, filters=None, size=3):
+        ids, after = [], None
+        while True:
+            page = self.backend.page(filters, after=after, size=size)
+            ids.extend(page.ids)
+            if not page.next_cursor:
+                return ids
+            after = page.next_cursor
+
+    def test_pages_cover_every_regulation_once_newest_first(self):
+        self.assertEqual(self.walk(), [r.pk for r in self.regulations])
+
+    def test_ties_on_last_updated_are_broken_by_id(self):
+        Regulation.objects.update(last_updated=timezone.now())
+
+        self.assertEqual(self.walk(), sorted((r.pk for r in self.regulations), reverse=True))
+
+    def test_last_page_has_no_cursor(self):
+        page = self.backend.page(size=7)
+
+        self.assertEqual(len(page.ids), 7)
+        self.assertIsNone(page.next_cursor)
+
+    def test_filters_apply_to_every_page(self):
+        department = Department.objects.create(name='Risk')
+        for regulation in self.regulations[::2]:
+            regulation.assigned_departments.add(department)
+
+        self.assertEqual(self.walk({'department': str(department.pk)}, size=2), [r.pk for r in self.regulations[::2]])
+
+    def test_cursor_round_trip(self):
+        last_updated = timezone.now()
+
+        self.assertEqual(decode_cursor(encode_cursor(last_updated, 42)), (last_updated, 42))
+
+    def test_invalid_cursor_starts_from_the_top(self):
+        self.assertIsNone(decode_cursor('not-a-cursor'))
+        self.assertEqual(self.backend.page(after='not-a-cursor', size=2).ids, [r.pk for r in self.regulations[:2]])
+
+
+@override_settings(AUDIT_LOG_WRITER='sync', SEARCH_BACKENDS=['core.search_backends.DatabaseBackend'])
+class RegulationListViewTests(TestCase):
+    def setUp(self):
+        self.regulations = create_regulations(3)
+        self.client.force_login(User.objects.create_user('maker', password='pw', role='compliance_maker'))
+        search_result_cache.clear()
+        self.addCleanup(search_result_cache.clear)
+
+    def test_first_page(self):
+        response = self.client.get(reverse('compliance_regulations'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['is_first_page'])
+        self.assertEqual(response.context['regulations'], self.regulations)
+        self.assertIsNone(response.context['next_cursor'])
+
+    def test_page_after_a_cursor(self):
+        cursor = DatabaseBackend().page(size=1).next_cursor
+
+        response = self.client.get(reverse('compliance_regulations'), {'after': cursor})
+
+        self.assertFalse(response.context['is_first_page'])
+        self.assertEqual(response.context['regulations'], self.regulations[1:])
@@ -0,0 +1,58 @@
+from django.test import TestCase
+from django.utils import timezone
+
+from core.forms import RegulationEditForm, RegulationForm
+from core.models import Department, Regulation
+from core.references import format_reference
+
+
+class RegulationReferenceTests(TestCase):
+    def setUp(self):
+        self.year = timezone.localdate().year
+        self.department = Department.objects.create(name='Risk')
+
+    def test_regulations_created_without_a_reference_get_consecutive_ones(self):
+        first = Regulation.objects.create(name='Capital', description='Rules')
+        second = Regulation.objects.create(name='Liquidity', description='Rules')
+
+        self.assertEqual(
+            [first.reference, second.reference],
+            [format_reference('REG', self.year, 1), format_reference('REG', self.year, 2)],
+        )
+
+    def test_references_typed_in_by_hand_are_skipped(self):
+        Regulation.objects.create(name='Capital', reference=format_reference('REG', self.year, 1), description='Rules')
+
+        regulation = Regulation.objects.create(name='Liquidity', description='Rules')
+
+        self.assertEqual(regulation.reference, format_reference('REG', self.year, 2))
+
+    def test_create_form_starts_empty_with_the_next_reference_as_placeholder(self):
+        Regulation.objects.create(name='Capital', description='Rules')
+
+        field = str(RegulationForm()['reference'])
+
+        self.assertNotIn('value=', field)
+        self.assertIn(f'placeholder="{format_reference("REG", self.year, 2)}"', field)
+
+    def test_create_form_without_a_reference_allocates_one(self):
+        form = RegulationForm({
+            'name': 'Capital', 'reference': '', 'description': 'Rules', 'type': 'regulation', 'status': 'draft',
+            'assigned_departments': [self.department.pk],
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+
+        regulation = form.save()
+
+        self.assertEqual(regulation.reference, format_reference('REG', self.year, 1))
+
+    def test_edit_form_requires_a_reference(self):
+        regulation = Regulation.objects.create(name='Capital', description='Rules')
+
+        form = RegulationEditForm({
+            'name': 'Capital', 'reference': '', 'description': 'Rules', 'type': 'regulation', 'status': 'draft',
+            'assigned_departments': [self.department.pk],
+        }, instance=regulation)
+
+        self.assertFalse(form.is_valid())
+        self.assertIn('reference', form.errors)
@@ -0,0 +1,62 @@
+from collections import Counter
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from core.models import Article, ComplianceStatus, Department, DepartmentComplianceRollup, Regulation
+from core.rollups import apply_rollup_deltas, current_rollup_counts, verify_compliance_rollup
+
+
+class ComplianceRollupTests(TestCase):
+    def setUp(self):
+        self.department = Department.objects.create(name='Risk')
+        self.regulation = Regulation.objects.create(name='Capital', reference='REG-2026-001', description='Rules')
+        self.articles = [
+            Article.objects.create(regulation=self.regulation, reference=str(number), title='T', content='C')
+            for number in range(1, 4)
+        ]
+
+    def counts(self):
+        return {status: count for (_, _, status), count in current_rollup_counts().items()}
+
+    def test_saving_statuses_updates_counts(self):
+        for article in self.articles[:2]:
+            ComplianceStatus.objects.create(article=article, department=self.department, status='compliant')
+        ComplianceStatus.objects.create(article=self.articles[2], department=self.department, status='non_compliant')
+
+        self.assertEqual(self.counts(), {'compliant': 2, 'non_compliant': 1})
+
+    def test_changing_a_status_moves_it_between_counts(self):
+        status = ComplianceStatus.objects.create(article=self.articles[0], department=self.department, status='compliant')
+
+        status.status = 'partially_compliant'
+        status.save()
+
+        self.assertEqual(self.counts(), {'partially_compliant': 1})
+        self.assertEqual(verify_compliance_rollup(), [])
+
+    def test_deleting_statuses_and_articles(self):
+        for article in self.articles:
+            ComplianceStatus.objects.create(article=article, department=self.department, status='compliant')
+
+        ComplianceStatus.objects.filter(article=self.articles[0]).get().delete()
+        self.articles[1].delete()
+
+        self.assertEqual(self.counts(), {'compliant': 1})
+        self.assertEqual(verify_compliance_rollup(), [])
+
+    def test_negative_delta_never_creates_a_row(self):
+        apply_rollup_deltas(Counter({(self.department.id, self.regulation.id, 'compliant'): -1}))
+
+        self.assertFalse(DepartmentComplianceRollup.objects.exists())
+
+    def test_rebuild_command_repairs_drift(self):
+        ComplianceStatus.objects.create(article=self.articles[0], department=self.department, status='compliant')
+        DepartmentComplianceRollup.objects.update(count=5)
+        self.assertEqual(len(verify_compliance_rollup()), 1)
+
+        call_command('rebuild_compliance_rollup', stdout=StringIO())
+
+        self.assertEqual(self.counts(), {'compliant': 1})
+        self.assertEqual(verify_compliance_rollup(), [])
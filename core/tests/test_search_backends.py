@@ -0,0 +1,131 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from core import elasticsearch_config
+from core.models import Article, Regulation
+from core.search_backends import (
+    BaseSearchBackend, DatabaseBackend, ElasticsearchBackend, SQLiteFTSBackend, _call_backends, _failing_backends
+)
+
+
+class FailingBackend(BaseSearchBackend):
+    def search(self, query, filters=None, limit=None):
+        raise ConnectionError('cluster down')
+
+
+class ElasticsearchHealthTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(elasticsearch_config, 'es')
+        self.es = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.ping = self.es.options.return_value.ping
+        for name, value in [('healthy', None), ('retry_at', 0.0)]:
+            self.addCleanup(setattr, ElasticsearchBackend, name, getattr(ElasticsearchBackend, name))
+            setattr(ElasticsearchBackend, name, value)
+
+    def test_failed_ping_is_remembered(self):
+        self.ping.return_value = False
+
+        with self.assertLogs('core.search_backends', level='WARNING'):
+            self.assertFalse(ElasticsearchBackend().is_available())
+        self.assertFalse(ElasticsearchBackend().is_available())
+
+        self.ping.assert_called_once()
+
+    def test_cluster_is_pinged_again_after_the_interval(self):
+        self.ping.return_value = False
+        with self.assertLogs('core.search_backends', level='WARNING'):
+            ElasticsearchBackend().is_available()
+
+        self.ping.return_value = True
+        ElasticsearchBackend.retry_at = 0.0
+
+        self.assertTrue(ElasticsearchBackend().is_available())
+        self.assertTrue(ElasticsearchBackend().is_available())
+        self.assertEqual(self.ping.call_count, 2)
+
+    def test_failed_search_takes_the_cluster_out(self):
+        self.ping.return_value = True
+        backend = ElasticsearchBackend()
+        self.assertTrue(backend.is_available())
+
+        with self.assertLogs('core.search_backends', level='WARNING'):
+            backend.report_failure(ConnectionError('cluster down'))
+
+        self.assertFalse(backend.is_available())
+        self.ping.assert_called_once()
+
+    def test_unconfigured_client(self):
+        elasticsearch_config.es = None
+
+        self.assertFalse(ElasticsearchBackend().is_available())
+
+
+@override_settings(SEARCH_BACKENDS=[
+    'core.tests.test_search_backends.FailingBackend', 'core.search_backends.DatabaseBackend',
+])
+class FallbackTests(TestCase):
+    def setUp(self):
+        Regulation.objects.create(name='Capital requirements', reference='REG-2026-001', description='Banks')
+        self.addCleanup(_failing_backends.clear)
+
+    def test_falls_back_to_the_next_backend(self):
+        with self.assertLogs('core.search_backends', level='WARNING'):
+            results = _call_backends('search', 'capital')
+
+        self.assertEqual([doc['reference'] for doc in results], ['REG-2026-001'])
+
+    def test_traceback_is_logged_once_per_outage(self):
+        with self.assertLogs('core.search_backends', level='WARNING') as first:
+            _call_backends('search', 'capital')
+        with self.assertLogs('core.search_backends', level='WARNING') as second:
+            _call_backends('search', 'capital')
+
+        self.assertEqual(first.records[0].levelname, 'ERROR')
+        self.assertIsNotNone(first.records[0].exc_info)
+        self.assertEqual(second.records[0].levelname, 'WARNING')
+        self.assertIsNone(second.records[0].exc_info)
+        self.assertIn('cluster down', second.records[0].getMessage())
+
+
+class SQLiteFTSBackendTests(TestCase):
+    def setUp(self):
+        self.backend = SQLiteFTSBackend()
+        self.capital = Regulation.objects.create(
+            name='Capital requirements', reference='REG-2026-001', description='Minimum capital for banks',
+            status='fully_approved',
+        )
+        self.liquidity = Regulation.objects.create(
+            name='Liquidity coverage', reference='REG-2026-002', description='Liquidity buffers', status='draft'
+        )
+        Article.objects.create(regulation=self.liquidity, reference='1', title='Buffers', content='Capital treatment of reserves')
+
+    def references(self, query, filters=None):
+        return [doc['reference'] for doc in self.backend.search(query, filters)]
+
+    def test_name_matches_rank_above_article_matches(self):
+        self.assertEqual(self.references('capital'), ['REG-2026-001', 'REG-2026-002'])
+
+    def test_words_match_as_prefixes(self):
+        self.assertEqual(self.references('liquid cover'), ['REG-2026-002'])
+
+    def test_triggers_follow_edits(self):
+        self.capital.name = 'Leverage ratio'
+        self.capital.save()
+        Article.objects.filter(regulation=self.liquidity).delete()
+
+        self.assertEqual(self.references('leverage'), ['REG-2026-001'])
+        self.assertEqual(self.references('reserves'), [])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.references('"capital* ('), ['REG-2026-001', 'REG-2026-002'])
+        self.assertEqual(SQLiteFTSBackend.match_expression('a-b "c"'), '"a"* "b"* "c"*')
+
+    def test_filters(self):
+        self.assertEqual(self.references('capital', {'status': 'draft'}), ['REG-2026-002'])
+
+    def test_database_backend_agrees(self):
+        self.assertEqual(
+            sorted(doc['reference'] for doc in DatabaseBackend().search('capital')), ['REG-2026-001', 'REG-2026-002']
+        )
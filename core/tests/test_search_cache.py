@@ -0,0 +1,111 @@
+from unittest import mock
+
+from django.db.models import F
+from django.test import TestCase, override_settings
+
+from core import db_routing
+from core.db_routing import use_replica
+from core.models import Regulation, SearchIndexGeneration
+from core.search_backends import DatabaseBackend, search_regulations
+from core.search_cache import (
+    SearchResultCache, bump_index_generation, get_index_generation, normalize_filters, search_result_cache,
+)
+
+
+class IndexGenerationTests(TestCase):
+    def test_generation_starts_at_zero_and_is_bumped(self):
+        self.assertEqual(get_index_generation(), 0)
+
+        self.assertEqual(bump_index_generation(), 1)
+        self.assertEqual(bump_index_generation(), 2)
+        self.assertEqual(SearchIndexGeneration.objects.get().value, 2)
+
+    def test_committed_regulation_changes_bump_the_generation(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Regulation.objects.create(name='Capital', reference='REG-2026-001', description='Rules')
+
+        self.assertGreater(get_index_generation(), 0)
+
+
+class SearchResultCacheTests(TestCase):
+    def setUp(self):
+        self.compute = mock.Mock(side_effect=lambda: object())
+
+    def test_hit_until_the_generation_changes(self):
+        cache = SearchResultCache()
+        first = cache.get_or_call('key', self.compute)
+
+        self.assertIs(cache.get_or_call('key', self.compute), first)
+        # Another process bumping the shared counter invalidates this one's entries too
+        bump_index_generation()
+        SearchIndexGeneration.objects.update(value=F('value') + 1)
+
+        self.assertIsNot(cache.get_or_call('key', self.compute), first)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_entries_expire(self):
+        cache = SearchResultCache(ttl=0)
+        cache.get_or_call('key', self.compute)
+        cache.get_or_call('key', self.compute)
+
+        self.assertEqual(self.compute.call_count, 2)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = SearchResultCache(max_entries=2)
+        for key in ['a', 'b', 'a', 'c']:
+            cache.get_or_call(key, self.compute)
+
+        self.assertEqual(list(cache._entries), ['a', 'c'])
+        self.assertEqual(cache.evictions, 1)
+
+    def test_disabled_cache_always_computes(self):
+        cache = SearchResultCache(max_entries=0)
+        cache.get_or_call('key', self.compute)
+        cache.get_or_call('key', self.compute)
+
+        self.assertEqual(self.compute.call_count, 2)
+        self.assertEqual(cache._entries, {})
+
+    def test_equivalent_filters_share_a_key(self):
+        self.assertEqual(
+            normalize_filters({'status': 'draft', 'type': '', 'created_by': 3}),
+            normalize_filters({'created_by': '3', 'status': 'draft'}),
+        )
+
+
+@override_settings(SEARCH_BACKENDS=['core.search_backends.DatabaseBackend'])
+@mock.patch.object(db_routing, 'DATABASE_REPLICAS', ['replica'])
+class ReplicaSearchCacheTests(TestCase):
+    def setUp(self):
+        search_result_cache.clear()
+        self.addCleanup(search_result_cache.clear)
+        self.addCleanup(db_routing.finish_request)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.regulation = Regulation.objects.create(name='Capital', reference='REG-2026-001', description='Rules')
+
+    def test_pinned_writer_sees_their_change_despite_a_lagging_replica(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Regulation.objects.filter(pk=self.regulation.pk).update(name='Liquidity')
+            bump_index_generation()
+
+        def lagging_search(query, filters=None, limit=None):
+            # The replica has not received the rename yet
+            with use_replica() as alias:
+                self.assertEqual(alias, 'replica')
+                return []
+
+        db_routing.start_request()
+        with mock.patch.object(DatabaseBackend, 'search', side_effect=lagging_search):
+            self.assertEqual(search_regulations('Liquidity'), [])
+        db_routing.finish_request()
+
+        db_routing.start_request(pinned=True)
+        self.assertEqual([document['id'] for document in search_regulations('Liquidity')], [self.regulation.pk])
+
+    def test_results_read_from_the_primary_are_cached(self):
+        db_routing.start_request(pinned=True)
+        first = search_regulations('Capital')
+        hits = search_result_cache.hits
+
+        self.assertIs(search_regulations('Capital'), first)
+        self.assertEqual(search_result_cache.hits, hits + 1)
@@ -0,0 +1,109 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from core.indexing import process_outbox_batch, retry_dead_outbox_entries
+from core.models import Regulation, SearchIndexOutbox
+
+
+def rejection(regulation_id):
+    return {'index': {'_id': str(regulation_id), 'status': 400, 'error': {'type': 'mapper_parsing_exception'}}}
+
+
+@mock.patch('core.elasticsearch_config.bulk_delete_regulations', return_value=(0, []))
+@mock.patch('core.elasticsearch_config.bulk_index_regulations')
+class SearchOutboxTests(TransactionTestCase):
+    def setUp(self):
+        self.good = Regulation.objects.create(name='Good', reference='REG-2026-001', description='Rules')
+        self.bad = Regulation.objects.create(name='Bad', reference='REG-2026-002', description='Rules')
+        # Start from a known queue rather than whatever the signals queued
+        SearchIndexOutbox.objects.all().delete()
+
+    def enqueue(self, *regulation_ids):
+        SearchIndexOutbox.objects.bulk_create([SearchIndexOutbox(regulation_id=pk) for pk in regulation_ids])
+
+    def test_accepted_entries_are_deleted(self, bulk_index, bulk_delete):
+        bulk_index.side_effect = lambda batch, index, chunk_size: (len(batch), [])
+        self.enqueue(self.good.pk, self.good.pk, 999999)
+
+        processed, result = process_outbox_batch()
+
+        self.assertEqual((processed, result.indexed), (3, 1))
+        # Repeated entries are coalesced, and regulations that are gone are removed from the index
+        self.assertEqual([r.pk for r in bulk_index.call_args.args[0]], [self.good.pk])
+        bulk_delete.assert_called_once_with({999999})
+        self.assertFalse(SearchIndexOutbox.objects.exists())
+
+    def test_elasticsearch_is_called_outside_the_claiming_transaction(self, bulk_index, bulk_delete):
+        def index(batch, index, chunk_size):
+            self.assertFalse(connection.in_atomic_block)
+            # Claimed entries are not handed to another worker meanwhile
+            self.assertEqual(process_outbox_batch(), (0, mock.ANY))
+            return len(batch), []
+        bulk_index.side_effect = index
+        self.enqueue(self.good.pk)
+
+        self.assertEqual(process_outbox_batch()[0], 1)
+        self.assertFalse(SearchIndexOutbox.objects.exists())
+
+    def test_rejected_document_does_not_hold_up_the_others(self, bulk_index, bulk_delete):
+        bulk_index.return_value = (1, [rejection(self.bad.pk)])
+        self.enqueue(self.bad.pk, self.good.pk)
+
+        with self.assertLogs('core.indexing', level='WARNING'):
+            processed, result = process_outbox_batch()
+
+        self.assertEqual((processed, result.indexed, result.failed), (2, 1, 1))
+        entry = SearchIndexOutbox.objects.get()
+        self.assertEqual((entry.regulation_id, entry.attempts), (self.bad.pk, 1))
+        self.assertIn('mapper_parsing_exception', entry.last_error)
+        self.assertGreater(entry.available_at, timezone.now())
+        # Not retried before its backoff is over
+        self.assertEqual(process_outbox_batch()[0], 0)
+
+    @mock.patch('core.indexing.OUTBOX_RETRY_DELAY', 0)
+    @mock.patch('core.indexing.OUTBOX_MAX_ATTEMPTS', 2)
+    def test_entry_is_dead_lettered_after_repeated_rejections(self, bulk_index, bulk_delete):
+        bulk_index.return_value = (0, [rejection(self.bad.pk)])
+        self.enqueue(self.bad.pk)
+
+        with self.assertLogs('core.indexing', level='WARNING') as logs:
+            process_outbox_batch()
+            SearchIndexOutbox.objects.update(available_at=timezone.now() - timedelta(seconds=1))
+            process_outbox_batch()
+
+        self.assertIn('Dead-lettering', logs.output[-1])
+        self.assertEqual(SearchIndexOutbox.objects.get().attempts, 2)
+        SearchIndexOutbox.objects.update(available_at=None)
+        self.assertEqual(process_outbox_batch()[0], 0)
+
+        self.assertEqual(retry_dead_outbox_entries(), 1)
+        bulk_index.return_value = (1, [])
+        self.assertEqual(process_outbox_batch()[0], 1)
+        self.assertFalse(SearchIndexOutbox.objects.exists())
+
+    def test_unreachable_cluster_releases_entries_untouched(self, bulk_index, bulk_delete):
+        bulk_index.side_effect = ConnectionError('down')
+        self.enqueue(self.good.pk)
+
+        with self.assertRaises(ConnectionError):
+            process_outbox_batch(max_retries=0)
+
+        entry = SearchIndexOutbox.objects.get()
+        self.assertEqual((entry.attempts, entry.available_at), (0, None))
+
+    @mock.patch('core.indexing.OUTBOX_MAX_ATTEMPTS', 1)
+    def test_command_reports_dead_letters(self, bulk_index, bulk_delete):
+        bulk_index.return_value = (0, [rejection(self.bad.pk)])
+        self.enqueue(self.bad.pk)
+        out = StringIO()
+
+        with self.assertLogs('core.indexing', level='ERROR'):
+            call_command('process_search_outbox', stdout=out)
+
+        self.assertIn('1 outbox entries were rejected too often and are dead-lettered', out.getvalue())
@@ -0,0 +1,91 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from core import synthetic_data
+from core.models import Article, AuditLog, ComplianceStatus, Department, Regulation, User
+from core.rollups import verify_compliance_rollup
+from core.synthetic_data import LoadDataPlan, generate
+
+
+def small_plan(seed=1):
+    return LoadDataPlan(
+        seed=seed, departments=3, users=5, regulations=10, articles=30, statuses=40, audit_logs=20, chunk_size=4
+    )
+
+
+def snapshot():
+    """The generated rows, without the parts that depend on when they were generated."""
+    return {
+        'departments': list(Department.objects.order_by('pk').values_list('pk', 'name')),
+        'users': list(User.objects.order_by('pk').values_list('pk', 'username', 'role')),
+        'regulations': list(
+            Regulation.objects.order_by('pk').values_list('pk', 'reference', 'name', 'type', 'status')
+        ),
+        'articles': list(Article.objects.order_by('pk').values_list('pk', 'regulation_id', 'reference', 'title')),
+        'statuses': sorted(ComplianceStatus.objects.values_list('article_id', 'department_id', 'status')),
+        'audit_logs': list(AuditLog.objects.order_by('pk').values_list('pk', 'user_id', 'action_type', 'action_details')),
+    }
+
+
+def delete_generated_data():
+    AuditLog.objects.all().delete()
+    Regulation.objects.all().delete()
+    User.objects.all().delete()
+    Department.objects.all().delete()
+
+
+class SyntheticDataTests(TestCase):
+    def test_counts_follow_the_plan(self):
+        result = generate(small_plan())
+
+        self.assertEqual(result.counts['departments'], Department.objects.count())
+        self.assertEqual(Department.objects.count(), 3)
+        self.assertEqual(User.objects.count(), 5)
+        self.assertEqual(Regulation.objects.count(), 10)
+        self.assertEqual(result.counts['articles'], Article.objects.count())
+        self.assertEqual(result.counts['statuses'], ComplianceStatus.objects.count())
+        self.assertEqual(AuditLog.objects.count(), 20)
+        self.assertEqual(verify_compliance_rollup(), [])
+
+    def test_same_seed_gives_the_same_data(self):
+        generate(small_plan())
+        first = snapshot()
+        delete_generated_data()
+
+        generate(small_plan())
+
+        self.assertEqual(snapshot(), first)
+
+    def test_chunk_order_does_not_matter(self):
+        # Worker processes finish their chunks in any order
+        generate(small_plan())
+        first = snapshot()
+        delete_generated_data()
+        run_chunks = synthetic_data.run_chunks
+
+        def run_reversed(tasks, *args):
+            run_chunks(list(reversed(tasks)), *args)
+
+        with mock.patch('core.synthetic_data.run_chunks', run_reversed):
+            generate(small_plan())
+
+        self.assertEqual(snapshot(), first)
+
+    def test_other_seed_gives_other_data(self):
+        generate(small_plan())
+        first = snapshot()
+        delete_generated_data()
+
+        generate(small_plan(seed=2))
+
+        self.assertNotEqual(snapshot()['regulations'], first['regulations'])
+
+    def test_command_rejects_invalid_counts(self):
+        with self.assertRaises(CommandError):
+            call_command('generate_load_data', regulations=-1, stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('generate_load_data', departments=0, regulations=1, stdout=StringIO())
@@ -0,0 +1,87 @@
+from django.core.cache import caches
+from django.test import TestCase
+
+from core.models import SystemSetting, SystemSettingsVersion
+from core.system_settings import SystemSettings, bump_settings_version, get_settings_version, system_settings
+
+
+class SystemSettingsTests(TestCase):
+    def setUp(self):
+        self.settings = SystemSettings(max_age=60)
+        for key, value in [
+            ('reminder_days', '7'), ('threshold', '0.5'), ('notify', 'Yes'), ('emails', 'a@x.com, ,b@x.com'),
+            ('limits', '{"max": 3}'), ('broken', 'seven'), ('compliance_cycle', 'monthly'),
+        ]:
+            SystemSetting.objects.create(setting_key=key, value=value)
+
+    def test_typed_getters(self):
+        self.assertEqual(self.settings.get_int('reminder_days'), 7)
+        self.assertEqual(self.settings.get_float('threshold'), 0.5)
+        self.assertIs(self.settings.get_bool('notify'), True)
+        self.assertEqual(self.settings.get_list('emails'), ['a@x.com', 'b@x.com'])
+        self.assertEqual(self.settings.get_json('limits'), {'max': 3})
+        self.assertEqual(self.settings.compliance_cycle(), 'monthly')
+
+    def test_missing_or_malformed_values_fall_back_to_the_default(self):
+        self.assertEqual(self.settings.get_int('broken', 5), 5)
+        self.assertEqual(self.settings.get_int('missing', 5), 5)
+        self.assertIs(self.settings.get_bool('broken', True), True)
+        self.assertEqual(self.settings.get_list('missing'), [])
+        self.assertIsNone(self.settings.get_json('broken'))
+
+    def test_unknown_compliance_cycle_uses_the_default(self):
+        SystemSetting.objects.filter(setting_key='compliance_cycle').update(value='weekly')
+
+        self.assertEqual(self.settings.compliance_cycle(), 'quarterly')
+
+    def test_values_are_read_once(self):
+        self.settings.get('reminder_days')
+
+        with self.assertNumQueries(0):
+            for _ in range(10):
+                self.settings.get_int('reminder_days')
+
+    def test_version_bump_reloads_on_the_next_check(self):
+        self.settings.get('reminder_days')
+        SystemSetting.objects.filter(setting_key='reminder_days').update(value='14')
+        self.settings.check()
+        self.assertEqual(self.settings.get_int('reminder_days'), 7)
+
+        # Another process saved a setting
+        bump_settings_version()
+        self.settings.check()
+
+        self.assertEqual(self.settings.get_int('reminder_days'), 14)
+
+    def test_version_is_shared_through_the_database(self):
+        self.assertEqual(get_settings_version(), 0)
+
+        bump_settings_version()
+        bump_settings_version()
+        # Another worker's cache knows nothing of the bump
+        caches['default'].clear()
+
+        self.assertEqual(SystemSettingsVersion.objects.get().value, 2)
+        self.assertEqual(get_settings_version(), 2)
+
+    def test_check_costs_one_query_when_nothing_changed(self):
+        self.settings.get('reminder_days')
+
+        with self.assertNumQueries(1):
+            self.settings.check()
+
+    def test_values_older_than_max_age_are_reloaded(self):
+        settings = SystemSettings(max_age=0)
+        settings.get('reminder_days')
+        SystemSetting.objects.filter(setting_key='reminder_days').update(value='14')
+
+        self.assertEqual(settings.get_int('reminder_days'), 14)
+
+    def test_saving_a_setting_invalidates_after_commit(self):
+        self.addCleanup(system_settings.invalidate)
+        system_settings.invalidate()
+        self.assertEqual(system_settings.get('reminder_days'), '7')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SystemSetting.objects.filter(setting_key='reminder_days').get().delete()
+        self.assertIsNone(system_settings.get('reminder_days'))
@@ -0,0 +1,159 @@
+import gzip
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Notification, User
+from core.notifications import mark_notifications_read, recount_unread_notifications
+
+
+class UnreadCounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('maker', password='pw', role='compliance_maker')
+        self.notifications = [
+            Notification.objects.create(recipient=self.user, title=f'Notice {number}', message='Body')
+            for number in range(3)
+        ]
+
+    def unread_count(self):
+        self.user.refresh_from_db(fields=['unread_notification_count'])
+        return self.user.unread_notification_count
+
+    def test_counter_follows_saves_and_deletes(self):
+        self.assertEqual(self.unread_count(), 3)
+
+        notification = self.notifications[0]
+        notification.read = True
+        notification.save()
+        self.assertEqual(self.unread_count(), 2)
+        # Saving again without a change leaves the counter alone
+        notification.save()
+        self.assertEqual(self.unread_count(), 2)
+
+        self.notifications[1].delete()
+        notification.delete()
+        self.assertEqual(self.unread_count(), 1)
+
+    def test_mark_some_and_all_read(self):
+        self.assertEqual(mark_notifications_read(self.user, [self.notifications[0].pk]), 1)
+        # Already read: nothing is subtracted twice
+        self.assertEqual(mark_notifications_read(self.user, [self.notifications[0].pk]), 0)
+        self.assertEqual(self.unread_count(), 2)
+
+        self.assertEqual(mark_notifications_read(self.user), 2)
+        self.assertEqual(self.unread_count(), 0)
+
+    def test_other_users_notifications_are_not_marked(self):
+        other = User.objects.create_user('other', password='pw', role='compliance_maker')
+
+        self.assertEqual(mark_notifications_read(other, [self.notifications[0].pk]), 0)
+        self.assertEqual(self.unread_count(), 3)
+
+    def test_recount_repairs_drift(self):
+        User.objects.filter(pk=self.user.pk).update(unread_notification_count=42)
+        Notification.objects.filter(pk=self.notifications[0].pk).update(read=True)
+
+        recount_unread_notifications()
+
+        self.assertEqual(self.unread_count(), 2)
+
+
+@override_settings(AUDIT_LOG_WRITER='sync')
+class UnreadCounterAtomicityTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='maker', role='compliance_maker')
+
+    @mock.patch('core.signals.adjust_unread_counts', side_effect=DatabaseError('counter update failed'))
+    def test_failed_counter_update_rolls_back_the_insert(self, adjust):
+        with self.assertRaises(DatabaseError):
+            Notification.objects.create(recipient=self.user, title='Notice', message='Body')
+
+        self.assertFalse(Notification.objects.exists())
+
+    def test_failed_counter_update_rolls_back_the_delete(self):
+        notification = Notification.objects.create(recipient=self.user, title='Notice', message='Body')
+
+        with mock.patch('core.signals.adjust_unread_counts', side_effect=DatabaseError('counter update failed')):
+            with self.assertRaises(DatabaseError):
+                notification.delete()
+
+        self.assertTrue(Notification.objects.filter(pk=notification.pk).exists())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.unread_notification_count, 1)
+
+
+@override_settings(AUDIT_LOG_WRITER='sync')
+class MarkReadViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('maker', password='pw', role='compliance_maker')
+        self.notifications = [
+            Notification.objects.create(recipient=self.user, title=f'Notice {number}', message='Body')
+            for number in range(3)
+        ]
+        self.client.force_login(self.user)
+
+    def test_mark_selected(self):
+        response = self.client.post(reverse('mark_notifications_read'), {'ids': [n.pk for n in self.notifications[:2]]})
+
+        self.assertEqual(response.json(), {'success': True, 'updated': 2, 'unread_count': 1})
+
+    def test_mark_all(self):
+        response = self.client.post(reverse('mark_notifications_read'), {'all': '1'})
+
+        self.assertEqual(response.json()['unread_count'], 0)
+
+    def test_invalid_id(self):
+        response = self.client.post(reverse('mark_notifications_read'), {'ids': ['x']})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_single_notification_of_another_user(self):
+        other = User.objects.create_user('other', password='pw', role='compliance_maker')
+        notification = Notification.objects.create(recipient=other, title='Private', message='Body')
+
+        response = self.client.post(reverse('mark_notification_read', args=[notification.pk]))
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Notification.objects.get(pk=notification.pk).read)
+
+
+class PruneNotificationsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('maker', password='pw', role='compliance_maker')
+        old = timezone.now() - timedelta(days=100)
+        self.old_read = Notification.objects.create(recipient=self.user, title='Old read', message='B', read=True)
+        self.old_unread = Notification.objects.create(recipient=self.user, title='Old unread', message='B')
+        self.recent_read = Notification.objects.create(recipient=self.user, title='Recent read', message='B', read=True)
+        Notification.objects.filter(pk__in=[self.old_read.pk, self.old_unread.pk]).update(created_at=old)
+
+    def test_only_old_read_notifications_are_archived_and_removed(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        archive = os.path.join(directory.name, 'notifications.ndjson.gz')
+
+        call_command('prune_notifications', days=90, archive=archive, stdout=StringIO())
+
+        self.assertEqual(
+            set(Notification.objects.values_list('title', flat=True)), {'Old unread', 'Recent read'}
+        )
+        with gzip.open(archive, 'rt', encoding='utf-8') as lines:
+            self.assertEqual([json.loads(line)['id'] for line in lines], [self.old_read.pk])
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.unread_notification_count, 1)
+
+    def test_dry_run_removes_nothing(self):
+        out = StringIO()
+
+        call_command('prune_notifications', days=90, dry_run=True, stdout=out)
+
+        self.assertIn('1 read notifications', out.getvalue())
+        self.assertEqual(Notification.objects.count(), 3)
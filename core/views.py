@@ -1,11 +1,14 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.http import HttpResponse, JsonResponse
-from django.db.models import Count, Q
-from django.core.paginator import Paginator
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from django.db import transaction
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 import csv
 import json
 from datetime import datetime, timedelta
@@ -17,7 +20,22 @@ from .models import (
     NotificationTemplate, SystemSetting
 )
 from .forms import RegulationForm, RegulationEditForm, ArticleForm, ArticleFormSet
-from .elasticsearch_config import search_regulations, create_regulation_index
+from .elasticsearch_config import create_regulation_index
+from .search_backends import (
+    REGULATION_FILTER_PARAMS, filter_regulations, page_regulations, search_regulations
+)
+from .search_cache import search_result_cache
+from .db_routing import replica_reads
+from . import metrics
+from .system_settings import system_settings
+from .compliance_matrix import STATUS_LABELS, ComplianceMatrix
+from .compliance_submissions import submit_compliance_statuses
+from .notifications import mark_notifications_read, notification_event_stream
+from .audit_archive import AuditQuery, iter_audit_records
+from .exports import (
+    EXPORT_CHUNK_SIZE, iter_csv, iter_ndjson, regulation_record,
+    streaming_export_response, wants_gzip
+)
 
 def is_admin(user):
     return user.is_authenticated and (user.is_superuser or user.role == 'admin')
@@ -25,9 +43,14 @@ def is_admin(user):
 def is_compliance_user(user):
     return user.is_authenticated and user.role in ['compliance_maker', 'compliance_checker']
 
+def get_regulation_filters(request):
+    """Collect the regulation filter parameters from the query string."""
+    return {param: request.GET.get(param) for param in REGULATION_FILTER_PARAMS}
+
 # Admin Views
 @login_required
 @user_passes_test(is_admin)
+@replica_reads
 def admin_dashboard(request):
     # Get counts for various models
     user_count = User.objects.count()
@@ -44,19 +67,25 @@ def admin_dashboard(request):
     # Get recent notifications
     recent_notifications = Notification.objects.order_by('-created_at')[:5]
     
-    # Get departments with compliance status counts
+    # Get departments with compliance status counts from the rollup table in one query
+    def rollup_count(status):
+        return Coalesce(
+            Sum('compliance_rollups__count', filter=Q(compliance_rollups__status=status)), 0
+        )
+    
+    departments = Department.objects.annotate(
+        compliant=rollup_count('compliant'),
+        partially_compliant=rollup_count('partially_compliant'),
+        non_compliant=rollup_count('non_compliant'),
+    )
     departments_compliance = []
-    for dept in Department.objects.all():
-        compliant = ComplianceStatus.objects.filter(department=dept, status='compliant').count()
-        partially = ComplianceStatus.objects.filter(department=dept, status='partially_compliant').count()
-        non_compliant = ComplianceStatus.objects.filter(department=dept, status='non_compliant').count()
-        
+    for dept in departments:
         departments_compliance.append({
             'department': dept,
-            'compliant': compliant,
-            'partially_compliant': partially,
-            'non_compliant': non_compliant,
-            'total': compliant + partially + non_compliant
+            'compliant': dept.compliant,
+            'partially_compliant': dept.partially_compliant,
+            'non_compliant': dept.non_compliant,
+            'total': dept.compliant + dept.partially_compliant + dept.non_compliant
         })
     
     context = {
@@ -68,82 +97,138 @@ def admin_dashboard(request):
         'recent_logs': recent_logs,
         'recent_notifications': recent_notifications,
         'departments_compliance': departments_compliance,
+        'compliance_cycle': dict(SystemSetting.COMPLIANCE_CYCLE_CHOICES)[system_settings.compliance_cycle()],
     }
     
     return render(request, 'admin/dashboard.html', context)
 
 @login_required
 @user_passes_test(is_admin)
+def search_cache_stats(request):
+    """Hit/miss counters of this worker's search result cache, for sizing SEARCH_CACHE_MAX_ENTRIES."""
+    return JsonResponse(search_result_cache.stats())
+
+def metrics_view(request):
+    """
+    Prometheus metrics of every worker process, in the text exposition format.
+    
+    Served to logged-in admins, and to scrapers that send METRICS_TOKEN as a
+    bearer token or connect from METRICS_ALLOWED_IPS.
+    """
+    if not metrics.scraper_allowed(request) and not is_admin(request.user):
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@login_required
+@user_passes_test(is_admin)
+@replica_reads
 def export_audit_logs(request):
+    """
+    Export audit log entries as CSV, newest first.
+    
+    Entries moved to the audit archive are included unless ?archive=0 is
+    given; only archive segments whose index can match the filters are read.
+    """
     # Get date range from request
     start_date_str = request.GET.get('start_date')
     end_date_str = request.GET.get('end_date')
     user_id = request.GET.get('user_id')
     action_type = request.GET.get('action_type')
-    
-    # Start with all logs
-    logs = AuditLog.objects.all()
+    target_model = request.GET.get('target_model')
+    target_id = request.GET.get('target_id')
     
     # Apply filters
+    filters = {}
     if start_date_str and end_date_str:
         try:
-            start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-            end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
+            start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
+            end_date = datetime.strptime(end_date_str, '%Y-%m-%d')
             # Add one day to include end_date in range
-            end_date = end_date + timedelta(days=1)
-            logs = logs.filter(timestamp__range=[start_date, end_date])
+            filters['start'] = timezone.make_aware(start_date)
+            filters['end'] = timezone.make_aware(end_date + timedelta(days=1))
         except ValueError:
             pass
     
     if user_id:
-        logs = logs.filter(user_id=user_id)
+        try:
+            filters['user_id'] = int(user_id)
+        except ValueError:
+            pass
     
     if action_type:
-        logs = logs.filter(action_type=action_type)
-    
-    # Order by timestamp descending
-    logs = logs.order_by('-timestamp')
-    
-    # Create CSV response
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="audit_logs.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['User', 'Action Type', 'Action Details', 'Timestamp', 'IP Address'])
-    
-    for log in logs:
-        writer.writerow([
-            log.user.username if log.user else 'System',
-            log.action_type,
-            log.action_details,
-            log.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-            log.ip_address or 'N/A'
-        ])
+        filters['action_type'] = action_type
+    
+    # e.g. ?target_model=regulation&target_id=42 for everything that touched one regulation
+    if target_model:
+        filters['target_model'] = target_model
+        if target_id and target_id.isdigit():
+            filters['target_id'] = int(target_id)
+    query = AuditQuery(**filters)
+    
+    # Stream plain tuples from the database and the archive so memory stays flat
+    records = iter_audit_records(
+        query, include_archive=request.GET.get('archive') != '0', chunk_size=EXPORT_CHUNK_SIZE
+    )
+    rows = (
+        (
+            record['user__username'] or 'System',
+            record['action_type'],
+            record['action_details'],
+            record['timestamp'].strftime('%Y-%m-%d %H:%M:%S'),
+            record['ip_address'] or 'N/A',
+            record.get('url_name') or '',
+            record.get('method') or '',
+            f"{record['target_model']}:{record['target_id']}" if record.get('target_model') else '',
+        )
+        for record in records
+    )
     
-    return response
+    chunks = iter_csv(
+        ['User', 'Action Type', 'Action Details', 'Timestamp', 'IP Address', 'URL Name', 'Method', 'Target'], rows
+    )
+    return streaming_export_response(chunks, 'audit_logs.csv', 'text/csv', compress=wants_gzip(request))
 
 @login_required
 @user_passes_test(is_admin)
+@replica_reads
 def export_regulations(request):
-    # Create CSV response
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="regulations.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['Name', 'Description', 'Status', 'Date Created', 'Last Updated', 'Created By', 'Assigned Departments'])
-    
-    for reg in Regulation.objects.all():
-        writer.writerow([
-            reg.name,
-            reg.description,
-            reg.status,
-            reg.date_created.strftime('%Y-%m-%d'),
-            reg.last_updated.strftime('%Y-%m-%d'),
-            reg.created_by.username if reg.created_by else 'N/A',
-            ', '.join([dept.name for dept in reg.assigned_departments.all()])
-        ])
+    """
+    Stream regulations as CSV, NDJSON, or NDJSON with articles inlined.
+    
+    Accepts the same filter parameters as compliance_regulations, plus
+    ?format=csv|ndjson|articles and ?compress=gzip.
+    """
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson', 'articles'):
+        return HttpResponse(f'Unsupported export format: {export_format}', status=400)
+    
+    regulations = filter_regulations(Regulation.objects.all(), get_regulation_filters(request))
+    # Creators are joined in and departments (and articles) are prefetched once per chunk
+    regulations = regulations.select_related('created_by').prefetch_related('assigned_departments')
+    if export_format == 'articles':
+        regulations = regulations.prefetch_related('articles')
+    regulations = regulations.order_by('id').iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    
+    if export_format == 'csv':
+        rows = (
+            [
+                reg.name,
+                reg.description,
+                reg.status,
+                reg.date_created.strftime('%Y-%m-%d'),
+                reg.last_updated.strftime('%Y-%m-%d'),
+                reg.created_by.username if reg.created_by else 'N/A',
+                ', '.join([dept.name for dept in reg.assigned_departments.all()])
+            ]
+            for reg in regulations
+        )
+        chunks = iter_csv(['Name', 'Description', 'Status', 'Date Created', 'Last Updated', 'Created By', 'Assigned Departments'], rows)
+        return streaming_export_response(chunks, 'regulations.csv', 'text/csv', compress=wants_gzip(request))
     
-    return response
+    include_articles = export_format == 'articles'
+    records = (regulation_record(reg, include_articles=include_articles) for reg in regulations)
+    filename = 'regulations_with_articles.ndjson' if include_articles else 'regulations.ndjson'
+    return streaming_export_response(iter_ndjson(records), filename, 'application/x-ndjson', compress=wants_gzip(request))
 
 # Notification related views
 @login_required
@@ -159,18 +244,70 @@ def get_notifications(request):
             'created_at': notification.created_at.strftime('%Y-%m-%d %H:%M'),
         })
     
-    return JsonResponse({'notifications': data})
+    return JsonResponse({'notifications': data, 'unread_count': request.user.unread_notification_count})
+
+def serves_streams(request):
+    """Whether the request came in over ASGI, which can stream a response as it is produced."""
+    # Under WSGI an endless async stream would be buffered whole and never reach the browser
+    return isinstance(request, ASGIRequest)
+
+@login_required
+async def notification_stream(request):
+    """
+    Server-Sent Events stream of the user's new notifications.
+    
+    Resumes after the Last-Event-ID header (sent by the browser when it
+    reconnects) or the last_event_id query parameter. Only served over ASGI;
+    under WSGI it answers 501 and the dashboard does not open it.
+    """
+    if not serves_streams(request):
+        return HttpResponse(
+            'The notification stream needs the ASGI server', status=501, content_type='text/plain'
+        )
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    user = await request.auser()
+    response = StreamingHttpResponse(
+        notification_event_stream(user.pk, last_event_id), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies such as nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 @login_required
 @csrf_exempt
 def mark_notification_read(request, notification_id):
     if request.method == 'POST':
-        notification = get_object_or_404(Notification, id=notification_id, recipient=request.user)
-        notification.read = True
-        notification.save()
+        if not mark_notifications_read(request.user, [notification_id]):
+            # Already read, or not the user's notification
+            get_object_or_404(Notification, id=notification_id, recipient=request.user)
         return JsonResponse({'success': True})
     return JsonResponse({'success': False}, status=400)
 
+@login_required
+@require_POST
+def mark_notifications_read_view(request):
+    """
+    Mark several notifications read with a single UPDATE.
+    
+    POST ids=<id>&ids=<id>... for specific notifications, or all=1 for every
+    unread notification of the user.
+    """
+    if request.POST.get('all'):
+        updated = mark_notifications_read(request.user)
+    else:
+        try:
+            ids = [int(notification_id) for notification_id in request.POST.getlist('ids')]
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'Invalid notification id'}, status=400)
+        updated = mark_notifications_read(request.user, ids)
+    unread_count = User.objects.filter(pk=request.user.pk).values_list('unread_notification_count', flat=True).first()
+    return JsonResponse({'success': True, 'updated': updated, 'unread_count': unread_count})
+
 # Compliance Portal Views
 def login_redirect_view(request):
     """Redirect users based on their role after login."""
@@ -199,11 +336,13 @@ def login_redirect_view(request):
 @user_passes_test(is_compliance_user)
 def compliance_dashboard(request):
     """Dashboard view for compliance users (makers and checkers)."""
-    # Get the user's unread notifications
-    unread_notifications = Notification.objects.filter(recipient=request.user, read=False).order_by('-created_at')
+    # Get the user's most recent unread notifications; the total comes from the counter
+    unread_notifications = Notification.objects.filter(recipient=request.user, read=False).order_by('-created_at')[:20]
     
     context = {
-        'unread_notifications': unread_notifications
+        'unread_notifications': unread_notifications,
+        'unread_count': request.user.unread_notification_count,
+        'notification_stream': serves_streams(request),
     }
     
     # Add more role-specific data here in the future
@@ -213,48 +352,12 @@ def compliance_dashboard(request):
 @login_required
 @user_passes_test(is_compliance_user)
 def compliance_regulations(request):
-    regulations = Regulation.objects.all().order_by('-last_updated')
-    
-    # Get filter parameters
-    reference = request.GET.get('reference')
-    title = request.GET.get('title')
-    status = request.GET.get('status')
-    created_by = request.GET.get('created_by')
-    department = request.GET.get('department')
-    
-    # Date range filters
-    issue_date_from = request.GET.get('issue_date_from')
-    issue_date_to = request.GET.get('issue_date_to')
-    effective_date_from = request.GET.get('effective_date_from')
-    effective_date_to = request.GET.get('effective_date_to')
-    expiry_date_from = request.GET.get('expiry_date_from')
-    expiry_date_to = request.GET.get('expiry_date_to')
-    
-    # Apply filters
-    if reference:
-        regulations = regulations.filter(reference__icontains=reference)
-    if title:
-        regulations = regulations.filter(name__icontains=title)
-    if status:
-        regulations = regulations.filter(status=status)
-    if created_by:
-        regulations = regulations.filter(created_by_id=created_by)
-    if department:
-        regulations = regulations.filter(assigned_departments__id=department)
-        
-    # Apply date range filters
-    if issue_date_from:
-        regulations = regulations.filter(issue_date__gte=issue_date_from)
-    if issue_date_to:
-        regulations = regulations.filter(issue_date__lte=issue_date_to)
-    if effective_date_from:
-        regulations = regulations.filter(effective_date__gte=effective_date_from)
-    if effective_date_to:
-        regulations = regulations.filter(effective_date__lte=effective_date_to)
-    if expiry_date_from:
-        regulations = regulations.filter(expiry_date__gte=expiry_date_from)
-    if expiry_date_to:
-        regulations = regulations.filter(expiry_date__lte=expiry_date_to)
+    filters = get_regulation_filters(request)
+    after = request.GET.get('after')
+    page = page_regulations(filters, after=after)
+    # Hydrate only the rows on this page, keeping the order chosen by the backend
+    regulations = Regulation.objects.filter(id__in=page.ids).select_related('created_by').in_bulk()
+    regulations = [regulations[regulation_id] for regulation_id in page.ids if regulation_id in regulations]
     
     # Get choices for dropdowns
     status_choices = Regulation.STATUS_CHOICES
@@ -263,21 +366,23 @@ def compliance_regulations(request):
     
     context = {
         'regulations': regulations,
+        'next_cursor': page.next_cursor,
+        'is_first_page': not after,
         'status_choices': status_choices,
         'users': users,
         'departments': departments,
         # Pass filter values back to template
-        'reference_filter': reference,
-        'title_filter': title,
-        'status_filter': status,
-        'created_by_filter': created_by,
-        'department_filter': department,
-        'issue_date_from': issue_date_from,
-        'issue_date_to': issue_date_to,
-        'effective_date_from': effective_date_from,
-        'effective_date_to': effective_date_to,
-        'expiry_date_from': expiry_date_from,
-        'expiry_date_to': expiry_date_to,
+        'reference_filter': filters['reference'],
+        'title_filter': filters['title'],
+        'status_filter': filters['status'],
+        'created_by_filter': filters['created_by'],
+        'department_filter': filters['department'],
+        'issue_date_from': filters['issue_date_from'],
+        'issue_date_to': filters['issue_date_to'],
+        'effective_date_from': filters['effective_date_from'],
+        'effective_date_to': filters['effective_date_to'],
+        'expiry_date_from': filters['expiry_date_from'],
+        'expiry_date_to': filters['expiry_date_to'],
     }
     
     return render(request, 'compliance/regulations.html', context)
@@ -285,13 +390,45 @@ def compliance_regulations(request):
 @login_required
 @user_passes_test(is_compliance_user)
 def compliance_regulation_detail(request, regulation_id):
-    """View for displaying regulation details."""
-    regulation = get_object_or_404(Regulation, id=regulation_id)
+    """View for displaying regulation details and its compliance matrix."""
+    regulation = get_object_or_404(Regulation.objects.select_related('created_by'), id=regulation_id)
+    matrix = ComplianceMatrix.for_regulation(regulation)
     context = {
-        'regulation': regulation
+        'regulation': regulation,
+        'rows': matrix.rows(),
+        'columns': matrix.columns(),
+        'total': matrix.total_summary(),
+        'status_labels': list(STATUS_LABELS.items()) + [('not_assessed', 'Not assessed')],
     }
     return render(request, 'compliance/regulation_detail.html', context)
 
+@login_required
+@require_POST
+def submit_compliance_statuses_view(request, department_id):
+    """
+    Insert or update many of a department's compliance statuses in one transaction.
+    
+    POST a JSON body {"statuses": [{"article": <id>, "status": <status>, "comments": <text>}, ...]}.
+    Either all statuses are saved or none is and the response lists the errors.
+    """
+    department = get_object_or_404(Department, id=department_id)
+    user = request.user
+    is_member = user.role in ['dept_maker', 'dept_checker'] and user.departments.filter(id=department.id).exists()
+    if not (is_admin(user) or is_member):
+        return JsonResponse({'success': False, 'error': 'Not a member of this department'}, status=403)
+    
+    try:
+        entries = json.loads(request.body)['statuses']
+    except (ValueError, KeyError, TypeError):
+        entries = None
+    if not isinstance(entries, list):
+        return JsonResponse({'success': False, 'error': 'Expected a JSON object with a "statuses" list'}, status=400)
+    
+    result = submit_compliance_statuses(user, department, entries)
+    if result.errors:
+        return JsonResponse({'success': False, 'errors': result.errors}, status=400)
+    return JsonResponse({'success': True, 'created': result.created, 'updated': result.updated})
+
 @login_required
 @user_passes_test(lambda u: u.role == 'compliance_maker')
 def create_regulation(request):
@@ -300,25 +437,29 @@ def create_regulation(request):
         formset = ArticleFormSet(request.POST, prefix='articles')
         
         if form.is_valid() and formset.is_valid():
-            regulation = form.save(commit=False)
-            regulation.created_by = request.user
-            regulation.save()
-            form.save_m2m()  # Save the many-to-many relationships
-            
-            # Save the articles if any are provided
-            articles = formset.save(commit=False)
-            for article in articles:
-                if article.title or article.content:  # Only save if there's content
-                    article.regulation = regulation
-                    article.save()
-            
-            # Create audit log entry
-            AuditLog.objects.create(
-                user=request.user,
-                action_type='create',
-                action_details=f'Created new regulation: {regulation.name}',
-                ip_address=request.META.get('REMOTE_ADDR')
-            )
+            # Save the regulation, its departments and articles and the search index outbox entries together
+            with transaction.atomic():
+                regulation = form.save(commit=False)
+                regulation.created_by = request.user
+                regulation.save()
+                form.save_m2m()  # Save the many-to-many relationships
+                
+                # Save the articles if any are provided
+                articles = formset.save(commit=False)
+                for article in articles:
+                    if article.title or article.content:  # Only save if there's content
+                        article.regulation = regulation
+                        article.save()
+                
+                # Create audit log entry
+                AuditLog.objects.create(
+                    user=request.user,
+                    action_type='create',
+                    action_details=f'Created new regulation: {regulation.name}',
+                    ip_address=request.META.get('REMOTE_ADDR'),
+                    target_model='regulation',
+                    target_id=regulation.id
+                )
             
             messages.success(request, 'Regulation created successfully!')
             return redirect('compliance_regulations')
@@ -355,18 +496,21 @@ def edit_regulation(request, regulation_id):
     if request.method == 'POST':
         form = RegulationEditForm(request.POST, instance=regulation)
         if form.is_valid():
-            regulation = form.save(commit=False)
-            regulation.last_updated = timezone.now()
-            regulation.save()
-            form.save_m2m()  # Save the many-to-many relationships
-            
-            # Log the edit
-            AuditLog.objects.create(
-                user=request.user,
-                action_type='update',
-                action_details=f"Edited regulation: {regulation.name}",
-                ip_address=request.META.get('REMOTE_ADDR')
-            )
+            with transaction.atomic():
+                regulation = form.save(commit=False)
+                regulation.last_updated = timezone.now()
+                regulation.save()
+                form.save_m2m()  # Save the many-to-many relationships
+                
+                # Log the edit
+                AuditLog.objects.create(
+                    user=request.user,
+                    action_type='update',
+                    action_details=f"Edited regulation: {regulation.name}",
+                    ip_address=request.META.get('REMOTE_ADDR'),
+                    target_model='regulation',
+                    target_id=regulation.id
+                )
             
             messages.success(request, 'Regulation updated successfully!')
             return redirect('compliance_regulation_detail', regulation_id=regulation.id)
@@ -396,7 +540,9 @@ def delete_regulation(request, regulation_id):
             user=request.user,
             action_type='delete',
             action_details=f'Deleted regulation: {regulation.name} (Reference: {regulation.reference})',
-            ip_address=request.META.get('REMOTE_ADDR')
+            ip_address=request.META.get('REMOTE_ADDR'),
+            target_model='regulation',
+            target_id=regulation.id
         )
         
         # Delete the regulation
@@ -446,7 +592,7 @@ def regulation_list(request):
             # Try Elasticsearch first
             search_results = search_regulations(search_query)
             if search_results:
-                regulation_ids = [hit['_source']['id'] for hit in search_results]
+                regulation_ids = [hit['id'] for hit in search_results]
                 regulations = regulations.filter(id__in=regulation_ids)
             else:
                 # Fallback to database search if Elasticsearch fails